@@ -0,0 +1,216 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import USER_FILE, FileLock, hash_pw, load_users, save_users, users_stat
+
+# scrypt cost (about 70 ms at the default); hashes made with a lower N, with
+# PBKDF2 or with the old unsalted SHA-256 are upgraded at the next login
+SCRYPT_N = int(os.environ.get("TMS_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+# used where hashlib has no scrypt (Python built without OpenSSL 1.1)
+PBKDF2_ITERATIONS = 600000
+SESSION_TTL = 8 * 60 * 60
+KDF_WORKERS = 2
+
+
+# ---------------- Password hashes ----------------
+def _scrypt(password, salt, n, r, p, dklen=32):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=dklen,
+                          maxmem=128 * r * (n + p) + 1024 * 1024)
+
+
+def hash_password(password):
+    # "scrypt$N$r$p$salt$key" (or "pbkdf2_sha256$iterations$salt$key"), hex
+    salt = os.urandom(16)
+    if hasattr(hashlib, "scrypt"):
+        key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${key.hex()}"
+    key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${key.hex()}"
+
+
+def verify_password(password, stored):
+    parts = (stored or "").split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = (int(x) for x in parts[1:4])
+            expected = bytes.fromhex(parts[5])
+            key = _scrypt(password, bytes.fromhex(parts[4]), n, r, p, len(expected))
+        elif parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            expected = bytes.fromhex(parts[3])
+            key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(parts[2]),
+                                      int(parts[1]), len(expected))
+        elif len(parts) == 1:
+            return hmac.compare_digest(hash_pw(password), stored or "")
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(key, expected)
+
+
+def needs_rehash(stored):
+    parts = stored.split("$")
+    if parts[0] == "scrypt":
+        return int(parts[1]) < SCRYPT_N
+    if parts[0] == "pbkdf2_sha256":
+        return hasattr(hashlib, "scrypt") or int(parts[1]) < PBKDF2_ITERATIONS
+    return True
+
+
+_no_user = None
+
+
+def _no_user_hash():
+    # checked against when the user does not exist, so that costs the same;
+    # made on first use, not at import
+    global _no_user
+    if _no_user is None:
+        _no_user = hash_password(secrets.token_hex(8))
+    return _no_user
+
+
+# ---------------- User directory ----------------
+class UserDirectory:
+    """The user records of users.json (or the sqlite users table), cached
+    and read again only when the file changes.
+
+    Writes re-read the file under its lock first, so users another instance
+    registered in the meantime are kept.
+    """
+
+    def __init__(self, path=USER_FILE):
+        self.path = path
+        self._users = None
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def users(self):
+        with self._lock:
+            stat = users_stat(self.path)
+            if self._users is None or stat != self._stat:
+                # stat first: a write landing during the read shows up next time
+                self._stat = stat
+                self._users = load_users(self.path)
+            return self._users
+
+    def get(self, username):
+        return self.users().get(username)
+
+    def password_hash(self, username):
+        # the stored hash, None for an unknown user
+        record = self.get(username)
+        return None if record is None else record.get("password", "")
+
+    def put(self, username, record):
+        with self._lock, FileLock(self.path):
+            users = load_users(self.path)
+            users[username] = record
+            save_users(users, self.path)
+            self._users = users
+            self._stat = users_stat(self.path)
+
+    def authenticate(self, username, password):
+        # True if the password is right, upgrading an old hash on the way;
+        # runs the KDF, so call it through verify_async
+        record = self.get(username)
+        if record is None:
+            verify_password(password, _no_user_hash())
+            return False
+        stored = record.get("password", "")
+        if not verify_password(password, stored):
+            return False
+        if needs_rehash(stored):
+            self.put(username, dict(record, password=hash_password(password)))
+        return True
+
+
+_pool = None
+
+
+def kdf_pool():
+    # hashlib releases the GIL while hashing, so threads are enough
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="kdf")
+    return _pool
+
+
+def verify_async(directory, username, password):
+    # a Future of directory.authenticate's answer
+    return kdf_pool().submit(directory.authenticate, username, password)
+
+
+def hash_async(password):
+    return kdf_pool().submit(hash_password, password)
+
+
+# ---------------- Sessions ----------------
+class Sessions:
+    """Bearer tokens handed out after a login, so later requests skip the
+    KDF. Each lasts ``ttl`` seconds from its last use.
+
+    Basic credentials that were verified once are remembered the same way,
+    under an HMAC with a key that never leaves this process, for clients
+    that send them with every request. The HMAC covers the user's stored
+    hash too, so a password change or a deleted user (by any process) ends
+    the remembered login.
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._tokens = {}
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._tokens[token] = [user, time.monotonic() + self.ttl]
+            self._expire()
+        return token
+
+    def user(self, token):
+        # the token's user, or None if it is unknown or expired
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if entry[1] < now:
+                del self._tokens[token]
+                return None
+            entry[1] = now + self.ttl
+            return entry[0]
+
+    def revoke(self, token):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+    def _credential_key(self, username, password, stored):
+        message = f"{username}\0{password}\0{stored}".encode("utf-8")
+        return "basic:" + hmac.new(self._key, message, "sha256").hexdigest()
+
+    def verified(self, username, password, stored):
+        # stored is the user's current password hash, None if there is no such user
+        if stored is None:
+            return False
+        return self.user(self._credential_key(username, password, stored)) == username
+
+    def remember(self, username, password, stored):
+        if stored is None:
+            return
+        with self._lock:
+            self._tokens[self._credential_key(username, password, stored)] = [username, time.monotonic() + self.ttl]
+            self._expire()
+
+    def _expire(self):
+        now = time.monotonic()
+        for token in [t for t, (_, expires) in self._tokens.items() if expires < now]:
+            del self._tokens[token]
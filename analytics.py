@@ -0,0 +1,291 @@
+import csv
+import os
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # analytics needs NumPy; the rest of the app does not
+    np = None
+
+from archive import Archive, archive_dir
+from columnar import COMPLETED, EPOCH, NONE_TIME, PRIORITIES, PRIORITY_CODE, ColumnarReader, _seconds
+from reports import REPORTS_DIR
+
+PERCENTILES = (50, 75, 90, 95, 99)
+DAY = 86400
+EPOCH_DAY = EPOCH.date().toordinal()
+# 1970-01-01 was a Thursday; shifting by this makes weeks start on Monday
+_WEEK_SHIFT = 3
+
+
+class AnalyticsUnavailable(Exception):
+    pass
+
+
+def require_numpy():
+    if np is None:
+        raise AnalyticsUnavailable("Analytics needs NumPy (pip install numpy).")
+
+
+class TaskArrays:
+    """The fields analytics reads, one NumPy array per field.
+
+    Times are int64 seconds since EPOCH with NONE_TIME for unset (the
+    columnar file's encoding, so a .tmsc file loads with no conversion),
+    deadlines are day ordinals with 0 for unset and owners are indexes into
+    ``users``.
+    """
+
+    def __init__(self, users, user, priority, completed, created, end, deadline):
+        self.users = users
+        self.user = user
+        self.priority = priority
+        self.completed = completed
+        self.created = created
+        self.end = end
+        self.deadline = deadline
+
+    def __len__(self):
+        return len(self.user)
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        require_numpy()
+        codes = {}
+        owners = [codes.setdefault(t.created_by or "", len(codes)) for t in tasks]
+        return cls(
+            list(codes),
+            np.array(owners, dtype=np.int32),
+            np.array([PRIORITY_CODE[t.priority] for t in tasks], dtype=np.int8),
+            np.array([t.completed for t in tasks], dtype=bool),
+            np.array([_seconds(t.created_at) for t in tasks], dtype=np.int64),
+            np.array([_seconds(t.end_time) for t in tasks], dtype=np.int64),
+            np.array([t.deadline.toordinal() if t.deadline else 0 for t in tasks], dtype=np.int32),
+        )
+
+    @classmethod
+    def from_columnar(cls, path):
+        # straight from the mapped columns; only owner names are decoded
+        require_numpy()
+        with ColumnarReader(path) as reader:
+            column = lambda name, dtype: np.frombuffer(reader.column(name), dtype=dtype).copy()
+            users = [u or "" for u in reader.table("users").all()]
+            owner = column("created_by", np.uint32)
+            missing = owner == 0xFFFFFFFF
+            if missing.any():
+                users.append("")
+                owner[missing] = len(users) - 1
+            return cls(
+                users,
+                owner.astype(np.int32),
+                column("priority", np.uint8).astype(np.int8),
+                (column("flags", np.uint8) & COMPLETED) != 0,
+                column("created_at", np.int64),
+                column("end_time", np.int64),
+                column("deadline", np.int32),
+            )
+
+    @classmethod
+    def concat(cls, parts):
+        # the rows of all parts in one TaskArrays, owner indexes remapped
+        codes = {}
+        owners = []
+        for part in parts:
+            remap = np.array([codes.setdefault(u, len(codes)) for u in part.users], dtype=np.int32)
+            owners.append(remap[part.user])
+        join = lambda name: np.concatenate([getattr(p, name) for p in parts])
+        return cls(list(codes), np.concatenate(owners), join("priority"), join("completed"),
+                   join("created"), join("end"), join("deadline"))
+
+    def for_user(self, user):
+        # the same rule as TaskStore.for_user: guest sees everything
+        if user == "guest":
+            return self
+        if user not in self.users:
+            keep = np.zeros(len(self), dtype=bool)
+        else:
+            keep = self.user == self.users.index(user)
+        return TaskArrays(self.users, self.user[keep], self.priority[keep], self.completed[keep],
+                          self.created[keep], self.end[keep], self.deadline[keep])
+
+
+# ---------------- Metrics ----------------
+def _finished(a):
+    # completed tasks with a usable creation and end time
+    return a.completed & (a.created != NONE_TIME) & (a.end != NONE_TIME) & (a.end >= a.created)
+
+
+def completion_percentiles(a, percentiles=PERCENTILES):
+    # {"count", "mean", "p50", ...}; durations in seconds
+    done = _finished(a)
+    seconds = (a.end - a.created)[done]
+    out = {"count": int(seconds.size), "mean": None}
+    out.update({f"p{q}": None for q in percentiles})
+    if seconds.size:
+        out["mean"] = float(seconds.mean())
+        for q, value in zip(percentiles, np.percentile(seconds, percentiles)):
+            out[f"p{q}"] = float(value)
+    return out
+
+
+def weekly_throughput(a):
+    # [(monday, completed that week)] from the first to the last week with a
+    # completion, empty weeks included
+    done = a.completed & (a.end != NONE_TIME)
+    weeks = (a.end[done] // DAY + _WEEK_SHIFT) // 7
+    if not weeks.size:
+        return []
+    first = int(weeks.min())
+    counts = np.bincount(weeks - first)
+    return [(date.fromordinal(EPOCH_DAY + (first + i) * 7 - _WEEK_SHIFT), int(n)) for i, n in enumerate(counts)]
+
+
+def _deadline_outcomes(a, today):
+    # boolean masks over tasks with a deadline: finished on or before it,
+    # finished after it, and still open with it passed (due today counts,
+    # like the overdue row colour)
+    has = a.deadline != 0
+    end_day = a.end // DAY + EPOCH_DAY
+    closed = has & a.completed & (a.end != NONE_TIME)
+    on_time = closed & (end_day <= a.deadline)
+    late = closed & (end_day > a.deadline)
+    overdue = has & ~a.completed & (a.deadline <= today.toordinal())
+    return has, on_time, late, overdue
+
+
+def _rate(part, whole):
+    return float(part) / float(whole) if whole else None
+
+
+def deadline_rates(a, today):
+    # per priority: tasks with a deadline, completed on time, completed late,
+    # open and overdue, and the on-time share of the completed ones
+    has, on_time, late, overdue = _deadline_outcomes(a, today)
+    n = len(PRIORITIES)
+    count = lambda mask: np.bincount(a.priority[mask], minlength=n)
+    totals, on, lt, od = count(has), count(on_time), count(late), count(overdue)
+    rows = []
+    for i, priority in enumerate(PRIORITIES):
+        rows.append({
+            "priority": priority.value,
+            "with_deadline": int(totals[i]),
+            "on_time": int(on[i]),
+            "late": int(lt[i]),
+            "overdue": int(od[i]),
+            "on_time_rate": _rate(on[i], on[i] + lt[i]),
+            "overdue_rate": _rate(lt[i] + od[i], totals[i]),
+        })
+    return rows
+
+
+def _group_medians(groups, values, n):
+    # median of values per group code, NaN for empty groups
+    order = np.lexsort((values, groups))
+    ordered = values[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=n)
+    starts = np.cumsum(counts) - counts
+    medians = np.full(n, np.nan)
+    has = counts > 0
+    low = starts[has] + (counts[has] - 1) // 2
+    high = starts[has] + counts[has] // 2
+    medians[has] = (ordered[low] + ordered[high]) / 2
+    return medians
+
+
+def user_comparison(a, today):
+    # per owner: totals, completion rate, median completion time (seconds),
+    # on-time rate and open overdue tasks; busiest owners first
+    n = len(a.users)
+    count = lambda mask=None: np.bincount(a.user if mask is None else a.user[mask], minlength=n)
+    totals = count()
+    completed = count(a.completed)
+    done = _finished(a)
+    medians = _group_medians(a.user[done], (a.end - a.created)[done], n)
+    _, on_time, late, overdue = _deadline_outcomes(a, today)
+    on, lt, od = count(on_time), count(late), count(overdue)
+    rows = []
+    for i in np.argsort(-totals, kind="stable"):
+        if not totals[i]:
+            continue
+        rows.append({
+            "user": a.users[i],
+            "total": int(totals[i]),
+            "completed": int(completed[i]),
+            "completion_rate": _rate(completed[i], totals[i]),
+            "median_completion": None if np.isnan(medians[i]) else float(medians[i]),
+            "on_time_rate": _rate(on[i], on[i] + lt[i]),
+            "overdue": int(od[i]),
+        })
+    return rows
+
+
+def analyze(a, today=None):
+    today = today or date.today()
+    return {
+        "tasks": len(a),
+        "completion": completion_percentiles(a),
+        "weekly": weekly_throughput(a),
+        "priorities": deadline_rates(a, today),
+        "users": user_comparison(a, today),
+    }
+
+
+def load_arrays(source):
+    # TaskArrays from a TaskStore, or from a .json / .tmsc file path, with
+    # the tasks archived next to it
+    if not isinstance(source, str):
+        return TaskArrays.from_tasks(source.for_user("guest", archived=True))
+    archived = Archive(archive_dir(source)).for_user("guest")
+    if source.endswith(".tmsc"):
+        with ColumnarReader(source) as reader:
+            ids = set(reader.table("ids").all())
+        live = TaskArrays.from_columnar(source)
+        return TaskArrays.concat([live, TaskArrays.from_tasks([t for t in archived if t.id not in ids])])
+    from models import Task
+    from storage import load_tasks
+    tasks = [Task.from_dict(d) for d in load_tasks(source)]
+    ids = {t.id for t in tasks}
+    return TaskArrays.from_tasks(tasks + [t for t in archived if t.id not in ids])
+
+
+# ---------------- Export ----------------
+def duration_text(seconds):
+    if seconds is None:
+        return ""
+    return str(timedelta(seconds=int(seconds)))
+
+
+def percent_text(rate):
+    return "" if rate is None else f"{rate * 100:.1f}%"
+
+
+def analytics_filename(user, day, reports_dir=REPORTS_DIR):
+    return os.path.join(reports_dir, f"analytics_{user}_{day.isoformat()}.csv")
+
+
+def write_analytics(filename, user, result):
+    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["User", user])
+        writer.writerow(["Tasks", result["tasks"]])
+        writer.writerow([])
+        completion = result["completion"]
+        writer.writerow(["Completion Time", "Value"])
+        writer.writerow(["Completed with times", completion["count"]])
+        writer.writerow(["Mean", duration_text(completion["mean"])])
+        for q in PERCENTILES:
+            writer.writerow([f"p{q}", duration_text(completion[f"p{q}"])])
+        writer.writerow([])
+        writer.writerow(["Priority", "With Deadline", "On Time", "Late", "Open Overdue", "On-time Rate", "Overdue Rate"])
+        for r in result["priorities"]:
+            writer.writerow([r["priority"], r["with_deadline"], r["on_time"], r["late"], r["overdue"],
+                             percent_text(r["on_time_rate"]), percent_text(r["overdue_rate"])])
+        writer.writerow([])
+        writer.writerow(["User", "Tasks", "Completed", "Completion Rate", "Median Completion", "On-time Rate", "Open Overdue"])
+        for r in result["users"]:
+            writer.writerow([r["user"], r["total"], r["completed"], percent_text(r["completion_rate"]),
+                             duration_text(r["median_completion"]), percent_text(r["on_time_rate"]), r["overdue"]])
+        writer.writerow([])
+        writer.writerow(["Week Of", "Completed"])
+        for monday, count in result["weekly"]:
+            writer.writerow([monday.isoformat(), count])
@@ -1,43 +1,39 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-import hashlib
-import csv
-
-TASK_FILE = "tasks.json"
-USER_FILE = "users.json"
-REPORTS_DIR = "reports"
-
-def load_tasks():
-    if not os.path.exists(TASK_FILE):
-        return []
-    with open(TASK_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-def save_tasks(tasks):
-    with open(TASK_FILE, "w") as f:
-        json.dump(tasks, f, indent=4)
-
-def load_users():
-    if not os.path.exists(USER_FILE):
-        return {}
-    with open(USER_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f, indent=4)
-
-def hash_pw(password):
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+import argparse
+
+from storage import TASK_FILE, USER_FILE, BackgroundSaver
+from accounts import UserDirectory, hash_async, verify_async
+from models import Priority, new_task
+from task_store import TaskStore, visible_to
+from reminders import ReminderScheduler, reminder_note
+from notification_panel import NotificationPanel
+from task_table import TaskTable
+from search import SearchIndex
+from views import ARCHIVED_VIEW, SORT_KEYS, VIEW_NAMES, TaskViews
+from recurrence import REPEAT_CHOICES, is_occurrence, make_series, parse_rule, split_occurrence_id
+from archive import ARCHIVE_AFTER_DAYS
+from metrics import METRICS_INTERVAL, REPORT_SECONDS, REPORTS_WRITTEN, profiled, write_prometheus
+
+# how often to look for edits other instances saved to the shared tasks.json
+SYNC_POLL_MS = 2000
+# how often to check whether the day changed, which moves the window of
+# recurring occurrences along (whatever the storage)
+WINDOW_POLL_MS = 60 * 1000
+# while tasks load in the background: how often to check on them, and how
+# many rows to show from the start of the file in the meantime
+LOAD_POLL_MS = 50
+FIRST_SCREEN_ROWS = 40
+# how often to collect what the reminder daemon pushed
+REMINDER_POLL_MS = 500
+# how often to check on a password hash running off the UI thread
+KDF_POLL_MS = 20
+
+def _dialog_time(value):
+    # the edit dialogs take minutes, not seconds
+    return value.strftime("%Y-%m-%d %H:%M") if value is not None else ""
 
 class TaskManagerApp:
     def __init__(self, root):
@@ -45,13 +41,70 @@ class TaskManagerApp:
         self.root.title("Time Management System - Login")
         self.root.geometry("420x220")
         self.current_user = None
-        self.ensure_reports_dir()
+        # the login screen shows while the tasks load on another thread
+        self.store = TaskStore(load=False)
+        self.store.load_in_background()
+        # edits are written by a background thread shortly after they happen
+        self.saver = BackgroundSaver(self.store)
+        self.search = SearchIndex(self.store)
+        self.views = TaskViews(self.store)
+        self.reminders = None
+        self.reminder_client = None
+        self.notifications = NotificationPanel(self.root)
+        self._reminder_job = None
+        self.context_menu = None
+        self.directory = UserDirectory()
+        self._poll_job = None
+        self._window_job = None
+        self._metrics_job = None
+        self._load_job = self.root.after(LOAD_POLL_MS, self.check_loaded)
         self.build_login_ui()
+        if self.store.shared:
+            self.poll_changes()
+        self._window_job = self.root.after(WINDOW_POLL_MS, self.roll_window)
+        self.write_metrics()
 
     def ensure_reports_dir(self):
+        from reports import REPORTS_DIR
         if not os.path.exists(REPORTS_DIR):
             os.makedirs(REPORTS_DIR)
 
+    # ---------------- Loading ----------------
+    def check_loaded(self):
+        try:
+            done = self.store.finish_loading()
+        except Exception as e:
+            self._load_failed(e)
+            return
+        if not done:
+            self._load_job = self.root.after(LOAD_POLL_MS, self.check_loaded)
+            return
+        self._load_job = None
+        if self.current_user is not None:
+            self.root.title(f"Time Management System - {self.current_user}")
+            self.refresh_tasks()
+
+    def wait_for_tasks(self):
+        # for actions that need every task: finish the load now
+        try:
+            self.store.finish_loading(wait=True)
+        except Exception as e:
+            self._load_failed(e)
+            return False
+        return True
+
+    def _load_failed(self, error):
+        # never carry on with an empty store: the next save would write it
+        messagebox.showerror("Error", f"Could not load tasks: {error}")
+        self.root.destroy()
+
+    def when_done(self, future, callback):
+        # calls callback(result) on the Tk loop once a kdf_pool job finishes
+        if future.done():
+            callback(future.result())
+        else:
+            self.root.after(KDF_POLL_MS, self.when_done, future, callback)
+
     # ---------------- Login / Registration ----------------
     def build_login_ui(self):
         for w in self.root.winfo_children():
@@ -69,16 +122,17 @@ class TaskManagerApp:
 
         btn_frame = tk.Frame(frame)
         btn_frame.grid(row=2, column=0, columnspan=2, pady=10)
-        tk.Button(btn_frame, text="Login", width=12, command=self.login).pack(side=tk.LEFT, padx=5)
-        tk.Button(btn_frame, text="Register", width=12, command=self.register).pack(side=tk.LEFT, padx=5)
+        self.login_btn = tk.Button(btn_frame, text="Login", width=12, command=self.login)
+        self.login_btn.pack(side=tk.LEFT, padx=5)
+        self.register_btn = tk.Button(btn_frame, text="Register", width=12, command=self.register)
+        self.register_btn.pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Guest", width=12, command=self.login_as_guest).pack(side=tk.LEFT, padx=5)
 
     def register(self):
-        users = load_users()
         username = simpledialog.askstring("Register", "Enter new username:", parent=self.root)
         if not username:
             return
-        if username in users:
+        if self.directory.get(username) is not None:
             messagebox.showerror("Error", "Username already exists.")
             return
         pw = simpledialog.askstring("Register", "Enter password:", show="*", parent=self.root)
@@ -88,23 +142,36 @@ class TaskManagerApp:
         if pw != pw2:
             messagebox.showerror("Error", "Passwords do not match.")
             return
-        users[username] = {"password": hash_pw(pw)}
-        save_users(users)
-        messagebox.showinfo("Success", "User registered. You can now login.")
+        self.register_btn.config(state=tk.DISABLED)
+
+        def registered(hashed):
+            self.directory.put(username, {"password": hashed})
+            if self.register_btn.winfo_exists():
+                self.register_btn.config(state=tk.NORMAL)
+            messagebox.showinfo("Success", "User registered. You can now login.")
+
+        self.when_done(hash_async(pw), registered)
 
     def login(self):
-        users = load_users()
         username = self.login_user.get().strip()
         pw = self.login_pw.get()
         if not username or not pw:
             messagebox.showerror("Error", "Enter username and password.")
             return
-        user = users.get(username)
-        if not user or user.get("password") != hash_pw(pw):
-            messagebox.showerror("Error", "Invalid credentials.")
-            return
-        self.current_user = username
-        self.build_main_ui()
+        # the check takes tens of milliseconds; the window stays responsive
+        self.login_btn.config(state=tk.DISABLED, text="Checking...")
+
+        def checked(ok):
+            if not self.login_btn.winfo_exists():
+                return
+            if not ok:
+                self.login_btn.config(state=tk.NORMAL, text="Login")
+                messagebox.showerror("Error", "Invalid credentials.")
+                return
+            self.current_user = username
+            self.build_main_ui()
+
+        self.when_done(verify_async(self.directory, username, pw), checked)
 
     def login_as_guest(self):
         self.current_user = "guest"
@@ -117,8 +184,6 @@ class TaskManagerApp:
         for w in self.root.winfo_children():
             w.destroy()
 
-        self.tasks = load_tasks()
-
         style = ttk.Style()
         style.theme_use("default")
         style.configure("Treeview.Heading", font=("Arial", 12, "bold"), background="#00796b", foreground="white")
@@ -139,16 +204,33 @@ class TaskManagerApp:
         tk.Label(form_frame, text="Priority:", font=("Arial", 12, "bold"), bg="#b2dfdb").grid(row=0, column=4, padx=5, pady=5)
         self.priority_var = tk.StringVar(value="Medium")
         self.priority_menu = ttk.Combobox(form_frame, textvariable=self.priority_var,
-                                          values=["High", "Medium", "Low"], state="readonly", width=10, font=("Arial", 12))
+                                          values=[p.value for p in Priority], state="readonly", width=10, font=("Arial", 12))
         self.priority_menu.grid(row=0, column=5, padx=5, pady=5)
 
         self.add_btn = tk.Button(form_frame, text="Add Task", font=("Arial", 12, "bold"), bg="#00796b", fg="white", command=self.add_task)
         self.add_btn.grid(row=0, column=6, padx=5, pady=5)
 
+        tk.Label(form_frame, text="Search:", font=("Arial", 12, "bold"), bg="#b2dfdb").grid(row=1, column=0, padx=5, pady=5)
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(form_frame, textvariable=self.search_var, font=("Arial", 12), bg="#e0f2f1")
+        self.search_entry.grid(row=1, column=1, columnspan=3, sticky="we", padx=5, pady=5)
+        self.search_var.trace_add("write", lambda *args: self.refresh_tasks())
+
+        tk.Label(form_frame, text="View:", font=("Arial", 12, "bold"), bg="#b2dfdb").grid(row=1, column=4, padx=5, pady=5)
+        self.view_var = tk.StringVar(value=VIEW_NAMES[0])
+        view_menu = ttk.Combobox(form_frame, textvariable=self.view_var, values=VIEW_NAMES + (ARCHIVED_VIEW,), state="readonly", width=18, font=("Arial", 12))
+        view_menu.grid(row=1, column=5, columnspan=2, sticky="w", padx=5, pady=5)
+        view_menu.bind("<<ComboboxSelected>>", lambda e: self.refresh_tasks())
+
+        tk.Label(form_frame, text="Repeat:", font=("Arial", 12, "bold"), bg="#b2dfdb").grid(row=2, column=0, padx=5, pady=5)
+        self.repeat_var = tk.StringVar(value=REPEAT_CHOICES[0])
+        ttk.Combobox(form_frame, textvariable=self.repeat_var, values=REPEAT_CHOICES, state="readonly", width=16,
+                     font=("Arial", 12)).grid(row=2, column=1, sticky="w", padx=5, pady=5)
+
         tree_frame = tk.Frame(self.root, bg="#80cbc4", bd=2, relief="groove")
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
-        self.tree = ttk.Treeview(tree_frame, columns=("Title","Deadline", "Priority", "Status", "Progress", "End Time", "Reminder"), show="headings", selectmode="browse")
+        self.tree = ttk.Treeview(tree_frame, columns=("Title","Deadline", "Priority", "Status", "Progress", "End Time", "Reminder"), show="headings", selectmode="extended")
         self.tree.heading("Title", text="Title")
         self.tree.heading("Deadline", text="Deadline")
         self.tree.heading("Priority", text="Priority")
@@ -165,22 +247,21 @@ class TaskManagerApp:
         self.tree.column("Reminder", width=160)
         self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.tree.bind("<Double-1>", self.toggle_complete)
-
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        # ctrl/shift-click select several rows; the task buttons act on all of them
+        self.tree.bind("<Control-a>", self.select_all)
+        # click a heading to sort by it, again to reverse, a third time for file order
+        self.sort_column = None
+        self.sort_reverse = False
+        self._heading_text = {col: self.tree.heading(col, "text") for col in SORT_KEYS}
+        for col in SORT_KEYS:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
+
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree.configure(yscroll=scrollbar.set)
-
-        # --- Context menu for task actions (right-click) ---
-        self.context_menu = tk.Menu(self.root, tearoff=0)
-        self.context_menu.add_command(label="Mark Completed", command=self.mark_completed)
-        self.context_menu.add_command(label="Set Description", command=self.set_description)
-        self.context_menu.add_command(label="Set Reminder", command=self.set_reminder_manual)
-        self.context_menu.add_command(label="Set Progress", command=self.set_progress)
-        self.context_menu.add_command(label="Set End Time", command=self.set_end_time)
-        self.context_menu.add_separator()
-        self.context_menu.add_command(label="Delete Task", command=self.delete_task)
+        self.table = TaskTable(self.tree, scrollbar, rowheight=28)
 
         # show context menu on right-click; also select the item under mouse
+        self.context_menu = None
         self.tree.bind("<Button-3>", self._on_right_click)
 
         btn_frame = tk.Frame(self.root, bg="#e0f7fa", padx=5, pady=5)
@@ -191,262 +272,319 @@ class TaskManagerApp:
         tk.Button(btn_frame, text="Set Description", command=self.set_description, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Set Reminder", command=self.set_reminder_manual, width=12).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Set Progress", command=self.set_progress, width=12).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Batch...", command=self.show_batch, width=10).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Generate Monthly Report", command=self.generate_monthly_report, width=20).pack(side=tk.RIGHT, padx=5)
         tk.Button(btn_frame, text="Logout", command=self.logout, width=10).pack(side=tk.RIGHT, padx=5)
+        tk.Button(btn_frame, text="Diagnostics", command=self.show_diagnostics, width=10).pack(side=tk.RIGHT, padx=5)
+        tk.Button(btn_frame, text="Analytics", command=self.show_dashboard, width=10).pack(side=tk.RIGHT, padx=5)
+
+        # reminders: pushed by the reminder daemon when one is running (it
+        # only sees this instance's edits through a shared tasks.json), else
+        # one local timer armed for the next due reminder
+        self.stop_reminders()
+        if self.store.shared:
+            from reminder_daemon import ReminderClient
+            self.reminder_client = ReminderClient.connect(self.current_user)
+        if self.reminder_client is not None:
+            self._reminder_job = self.root.after(REMINDER_POLL_MS, self.poll_reminders)
+        else:
+            self.start_local_reminders()
+        if self.store.loaded:
+            self.refresh_tasks()
+        else:
+            # the start of the file until the rest is in (see check_loaded)
+            self.root.title(f"Time Management System - {self.current_user} (loading tasks...)")
+            self.table.render(self.store.peek(self.current_user, FIRST_SCREEN_ROWS))
 
-        # reminders
-        self.reminder_interval_ms = 60 * 1000  # 1 minute checks
-        self.schedule_next_reminder()
-        self.refresh_tasks()
+    def _on_right_click(self, event):
+        row = self.tree.identify_row(event.y)
+        if not row:
+            return
+        # keep a multi-selection the click falls inside
+        if row not in self.tree.selection():
+            self.tree.selection_set(row)
+        if self.context_menu is None:
+            # built on first use; most sessions never open it
+            self.context_menu = tk.Menu(self.root, tearoff=0)
+            self.context_menu.add_command(label="Mark Completed", command=self.mark_completed)
+            self.context_menu.add_command(label="Set Description", command=self.set_description)
+            self.context_menu.add_command(label="Set Reminder", command=self.set_reminder_manual)
+            self.context_menu.add_command(label="Set Progress", command=self.set_progress)
+            self.context_menu.add_command(label="Set End Time", command=self.set_end_time)
+            self.context_menu.add_separator()
+            self.context_menu.add_command(label="Delete Task", command=self.delete_task)
+        try:
+            self.context_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.context_menu.grab_release()
 
     # ---------------- Task operations ----------------
+    @profiled
     def add_task(self):
         title = self.title_entry.get().strip()
         deadline = self.deadline_entry.get().strip()
         priority = self.priority_var.get()
-        if not title or not deadline:
-            messagebox.showerror("Error", "Please enter title and deadline.")
+        if not self.wait_for_tasks():
             return
         try:
-            dl_date = datetime.strptime(deadline, "%Y-%m-%d")
-        except ValueError:
-            messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD.")
+            task = new_task(title, deadline, priority, "", self.current_user)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
-        desc = simpledialog.askstring("Description", "Enter task description (optional):", parent=self.root) or ""
-        # compute automatic reminder: last day before deadline at 09:00 if possible, else 1 minute from now
-        reminder_time = (dl_date - timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
-        if reminder_time < datetime.now():
-            reminder_time = datetime.now() + timedelta(minutes=1)
-        reminder_iso = reminder_time.strftime("%Y-%m-%d %H:%M:%S")
-        task = {
-            "title": title,
-            "description": desc,
-            "deadline": deadline,
-            "priority": priority,
-            "completed": False,
-            "progress": 0,
-            "end_time": "",
-            "reminder_time": reminder_iso,
-            "notified": False,
-            "created_by": self.current_user,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        tasks = load_tasks()
-        tasks.append(task)
-        save_tasks(tasks)
+        repeat = self.repeat_var.get()
+        if repeat != REPEAT_CHOICES[0]:
+            if repeat == "Custom...":
+                repeat = simpledialog.askstring("Repeat", "Repeat rule, e.g. 'every 2 weeks on mon,thu until 2026-12-31':", parent=self.root)
+                if repeat is None:
+                    return
+            try:
+                make_series(task, parse_rule(repeat))
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+        task.description = simpledialog.askstring("Description", "Enter task description (optional):", parent=self.root) or ""
+        self.store.add(task)
+        self.saver.schedule()
         self.title_entry.delete(0, tk.END)
         self.deadline_entry.delete(0, tk.END)
+        self.repeat_var.set(REPEAT_CHOICES[0])
         self.refresh_tasks()
 
-
-
+    @profiled
     def refresh_tasks(self):
-        self.tasks = load_tasks()
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        for idx, t in enumerate(self.tasks):
-            # show only tasks for current user and guest can see all
-            if self.current_user != "guest" and t.get("created_by") != self.current_user:
-                continue
-            status = "✔" if t.get("completed") else "❌"
-            prog = t.get("progress", 0)
-            end_time = t.get("end_time", "")
-            reminder = t.get("reminder_time", "")
-            self.tree.insert("", "end", iid=idx, values=(t.get("title",""), t.get("deadline",""), t.get("priority",""), status, prog, end_time, reminder))
-            # tags
-            if t.get("completed"):
-                self.tree.item(idx, tags=("completed",))
-            elif t.get("priority") == "High":
-                self.tree.item(idx, tags=("high",))
-            try:
-                dl = datetime.strptime(t.get("deadline",""), "%Y-%m-%d")
-                if not t.get("completed") and dl < datetime.now():
-                    self.tree.item(idx, tags=("overdue",))
-            except:
-                pass
-        self.tree.tag_configure("completed", foreground="gray")
-        self.tree.tag_configure("high", background="#ffebee")
-        self.tree.tag_configure("overdue", background="#ffccbc")
-
-    def mark_completed(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task.")
-            return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        if idx < 0 or idx >= len(tasks):
+        # the search box and the view narrow the user's tasks, the sorted
+        # heading orders them; until the tasks are loaded the first rows stay
+        if not self.store.loaded:
             return
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only modify your tasks.")
+        view = self.view_var.get()
+        if view == ARCHIVED_VIEW:
+            tasks = self.search.search_archived(self.search_var.get(), self.current_user)
+            if self.sort_column is not None:
+                tasks.sort(key=SORT_KEYS[self.sort_column], reverse=self.sort_reverse)
+            self.table.render(tasks)
             return
-        task["completed"] = True
-        task["progress"] = 100
-        task["end_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_tasks(tasks)
+        only = self.search.matching_ids(self.search_var.get())
+        tasks = self.views.tasks(self.current_user, None if view == VIEW_NAMES[0] else view,
+                                 self.sort_column, self.sort_reverse, only)
+        self.table.render(tasks)
+
+    def sort_by(self, column):
+        if column != self.sort_column:
+            self.sort_column, self.sort_reverse = column, False
+        elif not self.sort_reverse:
+            self.sort_reverse = True
+        else:
+            self.sort_column, self.sort_reverse = None, False
+        for col, text in self._heading_text.items():
+            if col == self.sort_column:
+                text += " ▼" if self.sort_reverse else " ▲"
+            self.tree.heading(col, text=text)
         self.refresh_tasks()
 
-    def delete_task(self):
+    def _selected_tasks(self, action="modify"):
+        # the selected tasks, if the current user may change every one of them
+        if not self.wait_for_tasks():
+            return []
         selected = self.tree.selection()
         if not selected:
             messagebox.showinfo("Info", "Select a task.")
+            return []
+        tasks = [self.store.get(task_id) for task_id in selected]
+        if None in tasks and self.view_var.get() == ARCHIVED_VIEW:
+            messagebox.showinfo("Info", "Archived tasks cannot be changed.")
+            return []
+        if None in tasks:
+            messagebox.showerror("Error", "Task not found.")
+            return []
+        if not all(visible_to(t, self.current_user) for t in tasks):
+            messagebox.showerror("Error", f"You can only {action} your tasks.")
+            return []
+        return tasks
+
+    def _selected_task(self, action="modify"):
+        # returns (task_id, task) for the first selected row if the current user may change it
+        tasks = self._selected_tasks(action)
+        if not tasks:
+            return None, None
+        return tasks[0].id, tasks[0]
+
+    def _apply(self, tasks, **changes):
+        # the same change to every task as one store step, one save and one redraw
+        self.store.update_many([t.id for t in tasks], **changes)
+        self.saver.schedule()
+        self.refresh_tasks()
+
+    @profiled
+    def toggle_complete(self, event=None):
+        task_id, task = self._selected_task()
+        if task is None:
             return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only delete your tasks.")
+        if task.completed:
+            self.store.update(task_id, completed=False, progress=0, end_time=None)
+        else:
+            self.store.update(task_id, completed=True, progress=100, end_time=datetime.now())
+        self.saver.schedule()
+        self.refresh_tasks()
+
+    @profiled
+    def mark_completed(self):
+        tasks = self._selected_tasks()
+        if not tasks:
+            return
+        self._apply(tasks, completed=True, progress=100, end_time=datetime.now().replace(microsecond=0))
+
+    @profiled
+    def delete_task(self):
+        tasks = self._selected_tasks("delete")
+        if not tasks:
             return
-        if messagebox.askyesno("Confirm", f"Delete '{task.get('title')}'?"):
-            tasks.pop(idx)
-            save_tasks(tasks)
+        if len(tasks) > 1:
+            if not messagebox.askyesno("Confirm", f"Delete {len(tasks)} selected tasks?"):
+                return
+            self.store.delete_many([t.id for t in tasks])
+            self.saver.schedule()
             self.refresh_tasks()
+            return
+        task_id, task = tasks[0].id, tasks[0]
+        series = split_occurrence_id(task_id) if is_occurrence(task) else None
+        if series is not None and series[0] in {s.id for s in self.store.series()}:
+            answer = messagebox.askyesnocancel("Confirm", f"'{task.title}' repeats. Delete every occurrence?\n\n"
+                                               "Yes: the whole series. No: just this one.")
+            if answer is None:
+                return
+            self.store.delete(series[0] if answer else task_id)
+        elif messagebox.askyesno("Confirm", f"Delete '{task.title}'?"):
+            self.store.delete(task_id)
+        else:
+            return
+        self.saver.schedule()
+        self.refresh_tasks()
 
+    @profiled
     def set_end_time(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task.")
-            return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only modify your tasks.")
+        tasks = self._selected_tasks()
+        if not tasks:
             return
-        ans = simpledialog.askstring("End Time", "Enter end time (YYYY-MM-DD HH:MM) or blank to clear:", initialvalue=task.get("end_time",""), parent=self.root)
+        ans = simpledialog.askstring("End Time", "Enter end time (YYYY-MM-DD HH:MM) or blank to clear:", initialvalue=_dialog_time(tasks[0].end_time), parent=self.root)
         if ans is None:
             return
         ans = ans.strip()
         if ans == "":
-            task["end_time"] = ""
+            self._apply(tasks, end_time=None)
         else:
             try:
                 dt = datetime.strptime(ans, "%Y-%m-%d %H:%M")
-                task["end_time"] = dt.strftime("%Y-%m-%d %H:%M:%S")
-                task["completed"] = True
-                task["progress"] = 100
             except ValueError:
                 messagebox.showerror("Error", "Invalid format.")
                 return
-        save_tasks(tasks)
-        self.refresh_tasks()
+            self._apply(tasks, end_time=dt, completed=True, progress=100)
 
+    @profiled
     def set_description(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task.")
-            return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only modify your tasks.")
+        tasks = self._selected_tasks()
+        if not tasks:
             return
-        ans = simpledialog.askstring("Description", "Enter description:", initialvalue=task.get("description",""), parent=self.root)
+        ans = simpledialog.askstring("Description", "Enter description:", initialvalue=tasks[0].description, parent=self.root)
         if ans is None:
             return
-        task["description"] = ans
-        save_tasks(tasks)
-        self.refresh_tasks()
+        self._apply(tasks, description=ans)
 
+    @profiled
     def set_reminder_manual(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task.")
-            return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only modify your tasks.")
+        tasks = self._selected_tasks()
+        if not tasks:
             return
-        ans = simpledialog.askstring("Set Reminder", "Enter reminder datetime (YYYY-MM-DD HH:MM) or blank to clear:", initialvalue=task.get("reminder_time",""), parent=self.root)
+        ans = simpledialog.askstring("Set Reminder", "Enter reminder datetime (YYYY-MM-DD HH:MM) or blank to clear:", initialvalue=_dialog_time(tasks[0].reminder_time), parent=self.root)
         if ans is None:
             return
         ans = ans.strip()
         if ans == "":
-            task["reminder_time"] = ""
-            task["notified"] = False
+            self._apply(tasks, reminder_time=None, notified=False)
         else:
             try:
                 dt = datetime.strptime(ans, "%Y-%m-%d %H:%M")
-                task["reminder_time"] = dt.strftime("%Y-%m-%d %H:%M:%S")
-                task["notified"] = False
             except ValueError:
                 messagebox.showerror("Error", "Invalid format.")
                 return
-        save_tasks(tasks)
-        self.refresh_tasks()
+            self._apply(tasks, reminder_time=dt, notified=False)
 
+    @profiled
     def set_progress(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task.")
-            return
-        idx = int(selected[0])
-        tasks = load_tasks()
-        task = tasks[idx]
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only modify your tasks.")
-            return
-        try:
-            ans = simpledialog.askinteger("Progress", "Enter progress percent (0-100):", minvalue=0, maxvalue=100, initialvalue=task.get("progress",0), parent=self.root)
-        except:
+        tasks = self._selected_tasks()
+        if not tasks:
             return
+        ans = simpledialog.askinteger("Progress", "Enter progress percent (0-100):", minvalue=0, maxvalue=100, initialvalue=tasks[0].progress, parent=self.root)
         if ans is None:
             return
-        task["progress"] = int(ans)
-        if task["progress"] >= 100:
-            task["progress"] = 100
-            task["completed"] = True
-            task["end_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        progress = int(ans)
+        if progress >= 100:
+            self._apply(tasks, progress=100, completed=True, end_time=datetime.now())
         else:
-            task["completed"] = False
-            task["end_time"] = ""
-        save_tasks(tasks)
-        self.refresh_tasks()
+            self._apply(tasks, progress=progress, completed=False, end_time=None)
+
+    def select_all(self, event=None):
+        # every row the Treeview holds; over VIRTUAL_THRESHOLD rows that is
+        # the rows on screen, so use Batch... for larger sets
+        self.tree.selection_set(self.tree.get_children())
+        return "break"
+
+    def show_batch(self):
+        from batch import BatchDialog
+        if self.wait_for_tasks():
+            BatchDialog(self.root, self.views, self.current_user, self.apply_batch)
+
+    @profiled
+    def apply_batch(self, tasks, changes):
+        # from the batch dialog: the same ownership check as a selection
+        if not all(visible_to(t, self.current_user) for t in tasks):
+            messagebox.showerror("Error", "You can only modify your tasks.")
+            return
+        if changes is None:
+            self.store.delete_many([t.id for t in tasks])
+            self.saver.schedule()
+            self.refresh_tasks()
+        else:
+            self._apply(tasks, **changes)
 
     # ---------------- Reminder system ----------------
-    def check_reminders(self):
-        tasks = load_tasks()
-        now = datetime.now()
-        for idx, t in enumerate(tasks):
-            # skip if not this user's task unless guest
-            if self.current_user != "guest" and t.get("created_by") != self.current_user:
-                continue
-            if t.get("completed"):
-                continue
-            rt = t.get("reminder_time", "")
-            if not rt:
-                continue
-            try:
-                rt_dt = datetime.strptime(rt, "%Y-%m-%d %H:%M:%S")
-            except:
-                try:
-                    rt_dt = datetime.strptime(rt, "%Y-%m-%d %H:%M")
-                except:
-                    continue
-            if not t.get("notified", False) and rt_dt <= now:
-                # show notification
-                msg = f"Reminder: {t.get('title')}\nDue: {t.get('deadline')}\nPriority: {t.get('priority')}\n\n{t.get('description','')}"
-                try:
-                    messagebox.showinfo("Task Reminder", msg)
-                except:
-                    pass
-                # mark notified to avoid repeat
-                t["notified"] = True
-                tasks[idx] = t
-        save_tasks(tasks)
-
-    def schedule_next_reminder(self):
-        self.root.after(self.reminder_interval_ms, self._reminder_callback)
-
-    def _reminder_callback(self):
-        self.check_reminders()
-        self.schedule_next_reminder()
+    def start_local_reminders(self):
+        self.reminders = ReminderScheduler(self.store, self.current_user, self.root.after, self.root.after_cancel, self.notify_reminders)
+        self.reminders.start()
+
+    @profiled
+    def notify_reminders(self, tasks):
+        # one batch in the panel rather than a blocking dialog per reminder
+        self.notifications.add([reminder_note(t) for t in tasks])
+        for t in tasks:
+            # mark notified to avoid repeat
+            self.store.update(t.id, notified=True)
+        self.saver.schedule()
+
+    def poll_reminders(self):
+        # the daemon marks its reminders notified itself; this only shows them
+        client = self.reminder_client
+        self.notifications.add(client.take())
+        client.ack()
+        if client.closed:
+            # the daemon went away: fire this user's reminders here from now on
+            self.stop_reminders()
+            self.start_local_reminders()
+            return
+        self._reminder_job = self.root.after(REMINDER_POLL_MS, self.poll_reminders)
+
+    def stop_reminders(self):
+        if self.reminders is not None:
+            self.reminders.stop()
+            self.reminders = None
+        if self._reminder_job is not None:
+            self.root.after_cancel(self._reminder_job)
+            self._reminder_job = None
+        if self.reminder_client is not None:
+            self.reminder_client.close()
+            self.reminder_client = None
 
     # ---------------- Reports ----------------
+    @profiled
     def generate_monthly_report(self):
         # ask month and year
         year = simpledialog.askinteger("Report Year", "Enter year (YYYY):", parent=self.root, minvalue=2000, maxvalue=2100)
@@ -455,126 +593,226 @@ class TaskManagerApp:
         month = simpledialog.askinteger("Report Month", "Enter month (1-12):", parent=self.root, minvalue=1, maxvalue=12)
         if month is None:
             return
-        tasks = load_tasks()
-        # filter tasks created_by current user unless guest
-        user_tasks = [t for t in tasks if (self.current_user == "guest" or t.get("created_by") == self.current_user)]
-        # tasks completed in that month
-        completed = []
-        for t in user_tasks:
-            et = t.get("end_time","")
-            if not et:
-                continue
-            try:
-                etd = datetime.strptime(et, "%Y-%m-%d %H:%M:%S")
-            except:
-                continue
-            if etd.year == year and etd.month == month:
-                completed.append(t)
-        total = len(user_tasks)
-        completed_count = len(completed)
-        pending = total - completed_count
-        avg_completion = ""
-        if completed_count:
-            total_seconds = 0
-            count = 0
-            for t in completed:
-                try:
-                    created = datetime.strptime(t.get("created_at"), "%Y-%m-%d %H:%M:%S")
-                    ended = datetime.strptime(t.get("end_time"), "%Y-%m-%d %H:%M:%S")
-                    total_seconds += (ended - created).total_seconds()
-                    count += 1
-                except:
-                    pass
-            if count:
-                avg = total_seconds / count
-                avg_completion = str(timedelta(seconds=int(avg)))
-        filename = os.path.join(REPORTS_DIR, f"report_{self.current_user}_{year}_{month:02d}.csv")
-        with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["User", self.current_user])
-            writer.writerow(["Year", year])
-            writer.writerow(["Month", month])
-            writer.writerow(["Total Tasks", total])
-            writer.writerow(["Completed", completed_count])
-            writer.writerow(["Pending", pending])
-            writer.writerow(["Average Completion Time", avg_completion])
-            writer.writerow([])
-            writer.writerow(["Title","Description","Deadline","Priority","Progress","Created At","End Time"])
-            for t in user_tasks:
-                writer.writerow([t.get("title",""), t.get("description",""), t.get("deadline",""), t.get("priority",""), t.get("progress",""), t.get("created_at",""), t.get("end_time","")])
+        from reports import monthly_report, report_filename, write_report
+        if not self.wait_for_tasks():
+            return
+        self.ensure_reports_dir()
+        with REPORT_SECONDS.time():
+            summary, rows = monthly_report(self.store, self.current_user, year, month)
+            filename = report_filename(self.current_user, year, month)
+            write_report(filename, self.current_user, year, month, summary, rows)
+        REPORTS_WRITTEN.inc()
         messagebox.showinfo("Report Generated", f"Saved to {filename}")
 
-    def logout(self):
-        self.current_user = None
-        self.root.title("Time Management System - Login")
-        self.build_login_ui()
-    
-    # def refresh_tasks(self):
-    #     self.tasks = load_tasks()
-    #     for row in self.tree.get_children():
-    #         self.tree.delete(row)
-
-    #     for t in self.tasks:
-    #         if self.current_user != "guest" and t.get("created_by") != self.current_user:
-    #             continue
-
-    #         task_id = t.get("id")
-    #         status = "✔" if t.get("completed") else "❌"
-    #         prog = t.get("progress", 0)
-    #         end_time = t.get("end_time", "")
-    #         reminder = t.get("reminder_time", "")
-
-    #         # Insert first, then safely tag
-    #         self.tree.insert("", "end", iid=task_id, values=(
-    #             t.get("title", ""), t.get("deadline", ""), t.get("priority", ""), status, prog, end_time, reminder))
-
-    #         tags = []
-    #         if t.get("completed"):
-    #             tags.append("completed")
-    #         elif t.get("priority") == "High":
-    #             tags.append("high")
-
-    #         try:
-    #             dl = datetime.strptime(t.get("deadline", ""), "%Y-%m-%d")
-    #             if not t.get("completed") and dl < datetime.now():
-    #                 tags.append("overdue")
-    #         except:
-    #             pass
-
-    #         if tags:
-    #             self.tree.item(task_id, tags=tuple(tags))
-
-    #     # Configure tag colors after all insertions
-    #     self.tree.tag_configure("completed", foreground="gray")
-    #     self.tree.tag_configure("high", background="#ffebee")
-    #     self.tree.tag_configure("overdue", background="#ffccbc")
-
-    def delete_task(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showinfo("Info", "Select a task to delete.")
+    def show_dashboard(self):
+        from analytics import AnalyticsUnavailable
+        from dashboard import DashboardWindow
+        if not self.wait_for_tasks():
             return
+        try:
+            DashboardWindow(self.root, self.store, self.current_user)
+        except AnalyticsUnavailable as e:
+            messagebox.showerror("Analytics", str(e))
+
+    # ---------------- Other instances ----------------
+    def poll_changes(self):
+        changed = self.store.pull()
+        if changed and self.current_user is not None:
+            self.refresh_tasks()
+        conflicts = self.store.take_conflicts()
+        if conflicts:
+            messagebox.showwarning("Edit Conflict", "\n".join(c.describe() for c in conflicts))
+        self._poll_job = self.root.after(SYNC_POLL_MS, self.poll_changes)
+
+    # ---------------- Recurring tasks ----------------
+    def roll_window(self):
+        if self.store.roll_window() and self.current_user is not None:
+            self.refresh_tasks()
+        self._window_job = self.root.after(WINDOW_POLL_MS, self.roll_window)
 
-        task_id = selected[0]
-        tasks = load_tasks()
-        task = next((t for t in tasks if t.get("id") == task_id), None)
+    # ---------------- Diagnostics ----------------
+    def show_diagnostics(self):
+        from diagnostics import DiagnosticsWindow
+        DiagnosticsWindow(self.root)
 
-        if not task:
-            messagebox.showerror("Error", "Task not found.")
-            return
+    def write_metrics(self):
+        try:
+            write_prometheus()
+        except OSError:
+            pass
+        self._metrics_job = self.root.after(METRICS_INTERVAL * 1000, self.write_metrics)
+
+    def on_close(self):
+        for job in (self._poll_job, self._window_job, self._metrics_job, self._load_job):
+            if job is not None:
+                self.root.after_cancel(job)
+        self.stop_reminders()
+        try:
+            write_prometheus()
+        except OSError:
+            pass
+        self.saver.close()
+        if ARCHIVE_AFTER_DAYS and self.store.loaded:
+            try:
+                self.store.archive_completed(ARCHIVE_AFTER_DAYS)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not archive completed tasks: {e}")
+        self.store.close()
+        self.root.destroy()
 
-        if task.get("created_by") != self.current_user and self.current_user != "guest":
-            messagebox.showerror("Error", "You can only delete your own tasks.")
-            return
+    def logout(self):
+        self.stop_reminders()
+        self.saver.flush()
+        self.current_user = None
+        self.root.title("Time Management System - Login")
+        self.build_login_ui()
 
-        if messagebox.askyesno("Confirm", f"Are you sure you want to delete '{task.get('title')}'?"):
-            tasks = [t for t in tasks if t.get("id") != task_id]
-            save_tasks(tasks)
-            self.refresh_tasks()
-            messagebox.showinfo("Deleted", f"Task '{task.get('title')}' deleted successfully.")
 
+def _year_month(value):
+    try:
+        dt = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected YYYY-MM")
+    return dt.year, dt.month
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time Management System")
+    commands = parser.add_subparsers(dest="command")
+    migrate = commands.add_parser("migrate", help="import tasks.json and users.json into the SQLite database")
+    migrate.add_argument("--tasks", default=TASK_FILE)
+    migrate.add_argument("--users", default=USER_FILE)
+    migrate.add_argument("--db", default="tasks.db")
+    convert = commands.add_parser("convert", help="convert tasks between JSON and the columnar .tmsc format")
+    convert.add_argument("source", help="a .json or .tmsc file; the other format is written")
+    convert.add_argument("dest")
+    analytics = commands.add_parser("analytics", help="write the productivity analytics CSV")
+    analytics.add_argument("--tasks", default=TASK_FILE, help="a .json or .tmsc task file")
+    analytics.add_argument("--user", default="guest", help="whose tasks; guest for everyone's")
+    analytics.add_argument("--output", help="CSV path (default: in the reports folder)")
+    report = commands.add_parser("report", help="write monthly CSV reports for many users and months")
+    report.add_argument("--from", dest="start", required=True, type=_year_month, help="first month, YYYY-MM")
+    report.add_argument("--to", dest="end", required=True, type=_year_month, help="last month, YYYY-MM")
+    report.add_argument("--user", action="append", help="limit to this user (repeatable)")
+    report.add_argument("--workers", type=int, default=None)
+    report.add_argument("--force", action="store_true", help="rewrite reports even if nothing changed")
+    serve = commands.add_parser("serve", help="run the HTTP API used by static/app.js")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--allow-guest", action="store_true", help="treat unauthenticated requests as guest")
+    importer = commands.add_parser("import", help="bulk import tasks from a CSV or JSONL file")
+    importer.add_argument("file")
+    importer.add_argument("--format", choices=("csv", "jsonl"))
+    importer.add_argument("--user", default="guest", help="owner for records without created_by")
+    importer.add_argument("--batch-size", type=int, default=5000)
+    archiver = commands.add_parser("archive", help="move long-completed tasks into the monthly archive")
+    archiver.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                          help="archive tasks completed more than this many days ago")
+    remind = commands.add_parser("remind", help="run the reminder daemon that pushes every user's reminders to their GUIs")
+    remind.add_argument("--socket", help="default: $TMS_REMINDER_SOCKET or reminders.sock")
+    exporter = commands.add_parser("export", help="export tasks to a CSV or JSONL file")
+    exporter.add_argument("file")
+    exporter.add_argument("--format", choices=("csv", "jsonl"))
+    exporter.add_argument("--user", default="guest", help="only this user's tasks")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        from sqlite_store import migrate as migrate_to_sqlite
+        n_tasks, n_users = migrate_to_sqlite(args.tasks, args.users, args.db)
+        print(f"Imported {n_tasks} tasks and {n_users} users into {args.db}")
+        return
+    if args.command == "convert":
+        from columnar import columnar_to_json, json_to_columnar
+        if args.source.endswith(".tmsc"):
+            count = columnar_to_json(args.source, args.dest)
+        else:
+            count = json_to_columnar(args.source, args.dest)
+        print(f"Converted {count} tasks from {args.source} to {args.dest}")
+        return
+    if args.command == "analytics":
+        from analytics import AnalyticsUnavailable, analytics_filename, analyze, load_arrays, write_analytics
+        try:
+            result = analyze(load_arrays(args.tasks).for_user(args.user))
+        except AnalyticsUnavailable as e:
+            parser.exit(1, f"{e}\n")
+        output = args.output
+        if output is None:
+            from reports import REPORTS_DIR
+            os.makedirs(REPORTS_DIR, exist_ok=True)
+            output = analytics_filename(args.user, datetime.now().date())
+        write_analytics(output, args.user, result)
+        print(f"Analyzed {result['tasks']} tasks; saved to {output}")
+        return
+    if args.command == "report":
+        from reports import REPORTS_DIR, generate_reports
+        written = generate_reports(TaskStore(load=False), args.start, args.end, users=args.user, workers=args.workers, force=args.force)
+        print(f"Wrote {len(written)} reports to {REPORTS_DIR}")
+        return
+    if args.command == "import":
+        from transfer import import_tasks
+        store = TaskStore()
+        errors = []
+        imported, skipped = import_tasks(store, args.file, args.format, args.user, args.batch_size, errors)
+        store.close()
+        for line in errors[:20]:
+            print(line)
+        print(f"Imported {imported} tasks, skipped {skipped}")
+        return
+    if args.command == "archive":
+        store = TaskStore()
+        moved = store.archive_completed(args.days)
+        store.close()
+        print(f"Archived {moved} tasks to {store.archive.directory}")
+        return
+    if args.command == "export":
+        from transfer import export_tasks
+        store = TaskStore()
+        count = export_tasks(store.for_user(args.user, archived=True), args.file, args.format)
+        store.close()
+        print(f"Exported {count} tasks to {args.file}")
+        return
+    if args.command == "remind":
+        import asyncio
+        import socket
+        from reminder_daemon import NOT_SHARED, REMINDER_SOCKET, daemon_running, run_daemon
+        args.socket = args.socket or REMINDER_SOCKET
+        if not hasattr(socket, "AF_UNIX"):
+            parser.exit(1, "The reminder daemon needs Unix domain sockets.\n")
+        if daemon_running(args.socket):
+            parser.exit(1, f"A reminder daemon is already listening on {args.socket}\n")
+        store = TaskStore(load=False)
+        if not store.shared:
+            store.backend.close()
+            parser.exit(1, NOT_SHARED + "\n")
+        store.reload()
+        saver = BackgroundSaver(store)
+        try:
+            asyncio.run(run_daemon(store, saver, args.socket))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            saver.close()
+            store.close()
+        return
+    if args.command == "serve":
+        import asyncio
+        from server import serve as serve_api
+        store = TaskStore()
+        saver = BackgroundSaver(store)
+        try:
+            asyncio.run(serve_api(store, saver, args.host, args.port, allow_guest=args.allow_guest))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            saver.close()
+            store.close()
+        return
 
-if __name__ == "__main__":
     root = tk.Tk()
     app = TaskManagerApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
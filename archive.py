@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import re
+from datetime import date, timedelta
+
+from models import Task
+from storage import FileLock, atomic_write_bytes, atomic_write_json, file_stat
+
+ARCHIVE_DIR = "archive"
+# completed tasks whose end_time is older than this many days are moved to
+# the archive when the app closes; 0 turns that off
+ARCHIVE_AFTER_DAYS = int(os.environ.get("TMS_ARCHIVE_DAYS", "90"))
+
+_PARTITION = re.compile(r"tasks-(\d{4}-\d{2})\.json\.gz$")
+
+
+def archive_dir(task_path):
+    # the archive sits next to the task file it was moved out of
+    return os.path.join(os.path.dirname(task_path), ARCHIVE_DIR)
+
+
+def month_of(task):
+    return f"{task.end_time.year:04d}-{task.end_time.month:02d}"
+
+
+def archive_cutoff(days, today=None):
+    # tasks that ended before this date are archived
+    today = today or date.today()
+    return today - timedelta(days=days)
+
+
+class Archive:
+    """Completed tasks moved out of the task file, in one gzip-compressed
+    JSON partition per month of their end_time (``tasks-YYYY-MM.json.gz``).
+
+    ``index.json`` holds how many tasks each user has in each month, which
+    is all a total needs. A partition is only read when a query asks for its
+    month, and is kept in memory until its file changes. Archived tasks are
+    read-only.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._index = {}
+        self._index_stat = None
+        # month -> (file stat, tasks)
+        self._partitions = {}
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"tasks-{month}.json.gz")
+
+    def _index_path(self):
+        return os.path.join(self.directory, "index.json")
+
+    # ---------------- Reading ----------------
+    def counts(self):
+        # {YYYY-MM: {user: archived tasks}}
+        stat = file_stat(self._index_path())
+        if stat != self._index_stat:
+            self._index_stat = stat
+            self._index = {}
+            if stat is not None:
+                with open(self._index_path(), "r") as f:
+                    try:
+                        self._index = json.load(f).get("months", {})
+                    except json.JSONDecodeError:
+                        self._index = self._rebuild_index()
+        return self._index
+
+    def months(self):
+        return sorted(self.counts())
+
+    def count(self, user="guest"):
+        if user == "guest":
+            return sum(n for users in self.counts().values() for n in users.values())
+        return sum(users.get(user, 0) for users in self.counts().values())
+
+    def tasks(self, month):
+        # the tasks archived for one YYYY-MM, [] if there are none
+        path = self._path(month)
+        stat = file_stat(path)
+        cached = self._partitions.get(month)
+        if cached is not None and cached[0] == stat:
+            return cached[1]
+        tasks = []
+        if stat is not None:
+            with open(path, "rb") as f:
+                tasks = [Task.from_dict(d) for d in json.loads(gzip.decompress(f.read()))]
+        self._partitions[month] = (stat, tasks)
+        return tasks
+
+    def for_user(self, user, months=None):
+        # archived tasks the user may see, oldest month first
+        found = []
+        for month in months if months is not None else self.months():
+            if user == "guest":
+                found.extend(self.tasks(month))
+            elif self.counts().get(month, {}).get(user):
+                found.extend(t for t in self.tasks(month) if t.created_by == user)
+        return found
+
+    def completed_in_month(self, user, year, month):
+        return self.for_user(user, [f"{year:04d}-{month:02d}"])
+
+    # ---------------- Writing ----------------
+    def add(self, tasks):
+        # merges tasks (completed, with an end_time) into their partitions;
+        # a task archived again replaces its earlier copy
+        by_month = {}
+        for task in tasks:
+            by_month.setdefault(month_of(task), []).append(task)
+        if not by_month:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # several app instances may archive into the same directory
+        with FileLock(self._index_path()):
+            index = dict(self.counts())
+            for month, added in by_month.items():
+                merged = {t.id: t for t in self.tasks(month)}
+                merged.update((t.id, t) for t in added)
+                data = json.dumps([t.to_dict() for t in merged.values()]).encode("utf-8")
+                atomic_write_bytes(gzip.compress(data), self._path(month))
+                users = {}
+                for t in merged.values():
+                    users[t.created_by] = users.get(t.created_by, 0) + 1
+                index[month] = users
+            atomic_write_json({"months": index}, self._index_path())
+
+    def _rebuild_index(self):
+        # from the partitions themselves, when index.json is unreadable
+        index = {}
+        for name in os.listdir(self.directory):
+            match = _PARTITION.match(name)
+            if match is None:
+                continue
+            users = index[match.group(1)] = {}
+            for t in self.tasks(match.group(1)):
+                users[t.created_by] = users.get(t.created_by, 0) + 1
+        return index
@@ -0,0 +1,36 @@
+import asyncio
+
+from metrics import METRICS_INTERVAL, write_prometheus
+
+# Loops the long-running asyncio processes (server.py, reminder_daemon.py)
+# run next to their sockets.
+
+SYNC_POLL_SECONDS = 2.0
+# how often to check whether the day changed (see TaskStore.roll_window)
+WINDOW_POLL_SECONDS = 60.0
+
+
+async def watch_store(store, interval=SYNC_POLL_SECONDS):
+    # picks up edits other instances save to a shared tasks.json; the
+    # store's listeners see each changed task
+    while True:
+        await asyncio.sleep(interval)
+        store.pull()
+        store.take_conflicts()
+
+
+async def roll_window(store, interval=WINDOW_POLL_SECONDS):
+    # moves the recurring occurrences along when the day changes, whatever
+    # the storage
+    while True:
+        await asyncio.sleep(interval)
+        store.roll_window()
+
+
+async def write_metrics(interval=METRICS_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            write_prometheus()
+        except OSError:
+            pass
@@ -0,0 +1,107 @@
+import tkinter as tk
+from datetime import datetime
+from tkinter import messagebox, ttk
+
+from models import Priority
+from views import VIEW_NAMES
+
+ANY = "Any"
+STATUSES = (ANY, "Open", "Completed")
+ACTIONS = ("Mark completed", "Reopen", "Set progress", "Clear reminder", "Delete")
+
+
+def matching_tasks(views, user, view, priority=ANY, status=ANY, today=None):
+    # the user's tasks in a saved view, narrowed by priority and status
+    tasks = views.tasks(user, None if view == VIEW_NAMES[0] else view, today=today)
+    if priority != ANY:
+        tasks = [t for t in tasks if t.priority.value == priority]
+    if status != ANY:
+        completed = status == "Completed"
+        tasks = [t for t in tasks if t.completed == completed]
+    return tasks
+
+
+def action_changes(action, progress=0, now=None):
+    # the field changes an action makes to every task, with the same
+    # follow-on rules as the single-task buttons; None for Delete
+    now = now or datetime.now()
+    if action == "Mark completed":
+        return {"completed": True, "progress": 100, "end_time": now}
+    if action == "Reopen":
+        return {"completed": False, "progress": 0, "end_time": None}
+    if action == "Set progress":
+        if progress >= 100:
+            return {"progress": 100, "completed": True, "end_time": now}
+        return {"progress": progress, "completed": False, "end_time": None}
+    if action == "Clear reminder":
+        return {"reminder_time": None, "notified": False}
+    if action == "Delete":
+        return None
+    raise ValueError(f"Unknown action: {action}")
+
+
+class BatchDialog:
+    """Applies one action to every task matching a filter, e.g. "Mark
+    completed" on the Low priority tasks in the Overdue view.
+
+    The match count updates as the filter changes. ``on_apply(tasks,
+    changes)`` does the work, changes being None for a delete.
+    """
+
+    def __init__(self, root, views, user, on_apply):
+        self.views = views
+        self.user = user
+        self.on_apply = on_apply
+        self.tasks = []
+        self.top = tk.Toplevel(root)
+        self.top.title("Batch Update")
+        self.top.transient(root)
+
+        form = tk.Frame(self.top, padx=10, pady=10)
+        form.pack(fill=tk.BOTH, expand=True)
+        self.view_var = tk.StringVar(value=VIEW_NAMES[0])
+        self.priority_var = tk.StringVar(value=ANY)
+        self.status_var = tk.StringVar(value=ANY)
+        self.action_var = tk.StringVar(value=ACTIONS[0])
+        self.progress_var = tk.IntVar(value=0)
+        rows = (("View:", self.view_var, VIEW_NAMES),
+                ("Priority:", self.priority_var, (ANY,) + tuple(p.value for p in Priority)),
+                ("Status:", self.status_var, STATUSES),
+                ("Action:", self.action_var, ACTIONS))
+        for row, (label, var, values) in enumerate(rows):
+            tk.Label(form, text=label).grid(row=row, column=0, sticky="w", pady=2)
+            box = ttk.Combobox(form, textvariable=var, values=values, state="readonly", width=20)
+            box.grid(row=row, column=1, sticky="w", pady=2)
+            box.bind("<<ComboboxSelected>>", lambda e: self.update_count())
+        tk.Label(form, text="Progress %:").grid(row=len(rows), column=0, sticky="w", pady=2)
+        tk.Spinbox(form, from_=0, to=100, textvariable=self.progress_var, width=6).grid(row=len(rows), column=1,
+                                                                                      sticky="w", pady=2)
+        self.count = tk.Label(form, text="", anchor="w")
+        self.count.grid(row=len(rows) + 1, column=0, columnspan=2, sticky="we", pady=5)
+
+        btn_frame = tk.Frame(self.top, padx=10, pady=5)
+        btn_frame.pack(fill=tk.X)
+        tk.Button(btn_frame, text="Apply", command=self.apply, width=10).pack(side=tk.LEFT)
+        tk.Button(btn_frame, text="Close", command=self.top.destroy, width=10).pack(side=tk.RIGHT)
+        self.update_count()
+
+    def update_count(self):
+        self.tasks = matching_tasks(self.views, self.user, self.view_var.get(), self.priority_var.get(),
+                                    self.status_var.get())
+        self.count.config(text=f"{len(self.tasks)} tasks match.")
+
+    def apply(self):
+        self.update_count()
+        if not self.tasks:
+            messagebox.showinfo("Info", "No tasks match.", parent=self.top)
+            return
+        action = self.action_var.get()
+        try:
+            progress = max(0, min(100, int(self.progress_var.get())))
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Progress must be a number from 0 to 100.", parent=self.top)
+            return
+        if not messagebox.askyesno("Confirm", f"{action} for {len(self.tasks)} tasks?", parent=self.top):
+            return
+        self.on_apply(self.tasks, action_changes(action, progress))
+        self.update_count()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import analytics
+from datagen import generate_tasks, user_names
+from reminders import ReminderScheduler
+from reports import monthly_report
+from storage import JsonTaskFile, atomic_write_json, load_tasks, save_tasks
+from task_store import TaskStore
+from task_table import task_row
+
+# headless timings of the paths the GUI runs on every load, refresh,
+# reminder check and report, over synthetic datasets of growing size
+BENCH_SIZES = (10000, 100000)
+BASELINE_FILE = "bench_baseline.json"
+# a benchmark regresses when it is this much slower than the baseline
+REGRESSION_TOLERANCE = 0.25
+# ...and at least this many seconds slower, so timer noise on the tiny
+# benchmarks is not reported
+NOISE_FLOOR = 0.002
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_size(count, users, completed_ratio, repeat, workdir, seed=0):
+    # {benchmark: seconds} for one dataset size
+    now = datetime.now().replace(microsecond=0)
+    today = now.date()
+    tasks = generate_tasks(count, users, completed_ratio, seed, now)
+    path = os.path.join(workdir, f"tasks_{count}.json")
+    save_tasks(tasks, path)
+    store = TaskStore(path, JsonTaskFile(path))
+    # the first generated user owns the most tasks
+    user = user_names(users)[0]
+    scheduler = ReminderScheduler(store, "guest", lambda ms, cb: None, lambda handle: None, lambda due: None)
+    results = {
+        "save_tasks": best_of(lambda: save_tasks(tasks, path), repeat),
+        "load_tasks": best_of(lambda: load_tasks(path), repeat),
+        "load_store": best_of(lambda: TaskStore(path, JsonTaskFile(path)), repeat),
+        "rows_guest": best_of(lambda: [task_row(t, today) for t in store.for_user("guest")], repeat),
+        "rows_user": best_of(lambda: [task_row(t, today) for t in store.for_user(user)], repeat),
+        "reminder_rebuild": best_of(scheduler._rebuild, repeat),
+        "report_guest": best_of(lambda: monthly_report(store, "guest", today.year, today.month), repeat),
+        "report_user": best_of(lambda: monthly_report(store, user, today.year, today.month), repeat),
+    }
+    if analytics.np is not None:
+        arrays = analytics.TaskArrays.from_tasks(store.all())
+        results["analytics"] = best_of(lambda: analytics.analyze(arrays, today), repeat)
+    os.remove(path)
+    return results
+
+
+def run(sizes=BENCH_SIZES, users=100, completed_ratio=0.5, repeat=3, progress=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in sizes:
+            if progress:
+                progress(f"{count} tasks...")
+            for name, seconds in run_size(count, users, completed_ratio, repeat, workdir).items():
+                results.setdefault(name, {})[str(count)] = seconds
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": date.today().isoformat(),
+            "users": users,
+            "completed_ratio": completed_ratio,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def scaling_table(report):
+    # one line per benchmark: time at each size and microseconds per task,
+    # so non-linear growth stands out
+    results = report["results"]
+    sizes = sorted({int(n) for times in results.values() for n in times})
+    lines = ["benchmark".ljust(18) + "".join(f"{n:>12}" for n in sizes) + "   us/task at each size"]
+    for name, times in results.items():
+        cells = "".join(f"{times[str(n)] * 1000:>10.1f}ms" if str(n) in times else " " * 12 for n in sizes)
+        per_task = " ".join(f"{times[str(n)] / n * 1e6:.2f}" for n in sizes if str(n) in times)
+        lines.append(name.ljust(18) + cells + "   " + per_task)
+    return "\n".join(lines)
+
+
+def regressions(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    # (benchmark, size, baseline seconds, new seconds) for everything that
+    # got slower than the tolerance allows
+    found = []
+    for name, times in report["results"].items():
+        for size, seconds in times.items():
+            old = baseline.get("results", {}).get(name, {}).get(size)
+            if old and seconds > old * (1 + tolerance) and seconds - old > NOISE_FLOOR:
+                found.append((name, int(size), old, seconds))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the task, reminder and report paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCH_SIZES))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--completed", type=float, default=0.5, help="fraction of completed tasks")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the best is kept")
+    parser.add_argument("--output", default=BASELINE_FILE, help="where to write the results")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        # read first: --output may name the same file
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    report = run(args.sizes, args.users, args.completed, args.repeat, progress=print)
+    print(scaling_table(report))
+    atomic_write_json(report, args.output, indent=2)
+    print(f"Results written to {args.output}")
+    if baseline is not None:
+        slower = regressions(report, baseline, args.tolerance)
+        for name, size, old, new in slower:
+            print(f"REGRESSION {name} at {size} tasks: {old * 1000:.1f}ms -> {new * 1000:.1f}ms")
+        if slower:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import json
+import os
+
+from storage import FileLock, atomic_write_json, file_stat
+
+
+def changes_path(task_path):
+    # kept next to the task file whose changes it records
+    return task_path + ".changes"
+
+
+class ChangeLog:
+    """When each user's tasks last changed, as stamps from a counter in
+    ``<task file>.changes``, so the batch reports can tell which files are
+    stale without looking at every task.
+
+    TaskStore marks the owner of every task it creates, changes or deletes
+    and notes them here around each save: before the data reaches the disk,
+    so a change is never saved without its stamp, and again after, for a
+    report that read the stamps in between. A user only gets a new stamp when
+    a report has read their current one since (``read`` is the clock at the
+    last report run), so edits between two runs cost a stat call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.marked = set()
+        self._data = None
+        self._stat = None
+
+    def mark(self, user):
+        self.marked.add(user or "")
+
+    def take(self):
+        marked, self.marked = self.marked, set()
+        return marked
+
+    def _load(self):
+        data = {"clock": 0, "read": 0, "users": {}}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                try:
+                    data.update(json.load(f))
+                except json.JSONDecodeError:
+                    pass
+        return data
+
+    def read(self):
+        stat = file_stat(self.path)
+        if self._data is None or stat != self._stat:
+            self._stat = stat
+            self._data = self._load()
+        return self._data
+
+    def _write(self, data):
+        atomic_write_json(data, self.path)
+        self._data = data
+        self._stat = file_stat(self.path)
+
+    def _stale(self, data, users):
+        return [u for u in users if data["users"].get(u, 0) <= data["read"]]
+
+    def note(self, users):
+        if not users or not self._stale(self.read(), users):
+            return
+        with FileLock(self.path):
+            data = self._load()
+            stale = self._stale(data, users)
+            if stale:
+                data["clock"] += 1
+                for user in stale:
+                    data["users"][user] = data["clock"]
+                self._write(data)
+
+    def stamps(self):
+        # every user's stamp, for a report run; later changes get newer ones
+        with FileLock(self.path):
+            data = self._load()
+            if data["read"] != data["clock"]:
+                data["read"] = data["clock"]
+                self._write(data)
+        return dict(data["users"])
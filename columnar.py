@@ -0,0 +1,380 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+from models import Priority, Task, parse_progress
+from storage import StorageError, atomic_write_bytes, gc_paused, load_tasks, save_tasks
+
+COLUMNAR_FILE = "tasks.tmsc"
+
+# File layout (little-endian):
+#   header     MAGIC, format version, row count, section count
+#   directory  per section: name, array typecode, offset, byte length
+#   sections   each 8-byte aligned: fixed-width columns with one value per
+#              task, and string tables as "<table>.offsets" (count + 1 byte
+#              offsets) plus "<table>.data" (the UTF-8 bytes)
+# Strings are interned per table, so an owner or a repeated title is stored
+# once and the column holds its index. Dates are ordinals (0 = unset),
+# datetimes are seconds since 1970-01-01 in the app's naive local time.
+MAGIC = b"TMSC"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHxxII")
+_SECTION = struct.Struct("<24sc7xQQ")
+
+NONE_INDEX = 0xFFFFFFFF
+NONE_TIME = -(1 << 63)
+EPOCH = datetime(1970, 1, 1)
+COMPLETED = 1
+NOTIFIED = 2
+PRIORITIES = (Priority.HIGH, Priority.MEDIUM, Priority.LOW)
+PRIORITY_CODE = {p: i for i, p in enumerate(PRIORITIES)}
+
+# column -> (typecode, string table or None)
+COLUMNS = {
+    "id": ("I", "ids"),
+    "title": ("I", "text"),
+    "description": ("I", "text"),
+    "deadline": ("i", None),
+    "priority": ("B", None),
+    "flags": ("B", None),
+    "progress": ("B", None),
+    "end_time": ("q", None),
+    "reminder_time": ("q", None),
+    "created_at": ("q", None),
+    "created_by": ("I", "users"),
+    "version": ("I", None),
+    "extra": ("I", "text"),
+}
+TIME_COLUMNS = ("end_time", "reminder_time", "created_at")
+# a progress outside the column's 0-255 is stored as 0 with the value in
+# extra, and put back when the task is read
+PROGRESS_MAX = 255
+
+
+def _seconds(value):
+    if value is None:
+        return NONE_TIME
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+# ---------------- Writing ----------------
+class _Interner:
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, value):
+        if value is None:
+            return NONE_INDEX
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.index)
+        return i
+
+    def sections(self, name):
+        offsets = array("Q", [0])
+        chunks = []
+        end = 0
+        for text in self.index:
+            data = text.encode("utf-8")
+            chunks.append(data)
+            end += len(data)
+            offsets.append(end)
+        return [(f"{name}.offsets", offsets), (f"{name}.data", array("B", b"".join(chunks)))]
+
+
+def encode_columnar(tasks):
+    # the file contents for a list of Tasks
+    tables = {"ids": _Interner(), "text": _Interner(), "users": _Interner()}
+    cols = {name: array(typecode) for name, (typecode, _) in COLUMNS.items()}
+    ids, text, users = tables["ids"], tables["text"], tables["users"]
+    for t in tasks:
+        progress, extra = t.progress, t.extra
+        if not 0 <= progress <= PROGRESS_MAX:
+            progress, extra = 0, dict(extra, progress=progress)
+        cols["id"].append(ids(t.id))
+        cols["title"].append(text(t.title))
+        cols["description"].append(text(t.description))
+        cols["deadline"].append(t.deadline.toordinal() if t.deadline is not None else 0)
+        cols["priority"].append(PRIORITY_CODE[t.priority])
+        cols["flags"].append((COMPLETED if t.completed else 0) | (NOTIFIED if t.notified else 0))
+        cols["progress"].append(progress)
+        cols["end_time"].append(_seconds(t.end_time))
+        cols["reminder_time"].append(_seconds(t.reminder_time))
+        cols["created_at"].append(_seconds(t.created_at))
+        cols["created_by"].append(users(t.created_by))
+        cols["version"].append(t.version)
+        cols["extra"].append(text(json.dumps(extra)) if extra else NONE_INDEX)
+    sections = list(cols.items())
+    for name, table in tables.items():
+        sections.extend(table.sections(name))
+    rows = len(cols["id"])
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    directory = []
+    blobs = []
+    for name, values in sections:
+        offset += -offset % 8
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        blob = values.tobytes()
+        directory.append(_SECTION.pack(name.encode("ascii"), values.typecode.encode("ascii"), offset, len(blob)))
+        blobs.append((offset, blob))
+        offset += len(blob)
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, rows, len(sections)))
+    for entry in directory:
+        out += entry
+    for start, blob in blobs:
+        out += bytes(start - len(out))
+        out += blob
+    return bytes(out)
+
+
+def write_columnar(tasks, path=COLUMNAR_FILE):
+    atomic_write_bytes(encode_columnar(tasks), path)
+
+
+# ---------------- Reading ----------------
+class StringTable:
+    """Lazily decoded view of one interned string table."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i == NONE_INDEX:
+            return None
+        s = self._cache.get(i)
+        if s is None:
+            s = self._cache[i] = str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        return s
+
+    def all(self):
+        offsets = self.offsets.tolist()
+        data = self.data
+        return [str(data[a:b], "utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def find(self, value):
+        # index of a string, or None; decodes the table as it goes
+        for i in range(len(self)):
+            if self[i] == value:
+                return i
+        return None
+
+
+class ColumnarReader:
+    """Memory-mapped columnar task file.
+
+    Columns are ``memoryview`` casts straight onto the map, so a caller that
+    only needs ``created_by`` (say, to find one user's rows) touches just
+    those pages; strings are decoded when first asked for. Use as a context
+    manager, or call ``close()``, before the file is replaced.
+    """
+
+    def __init__(self, path=COLUMNAR_FILE):
+        self.path = path
+        self._file = open(path, "rb")
+        self._views = []
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise StorageError(f"{path} is empty")
+        magic, version, self.rows, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise StorageError(f"{path} is not a version {FORMAT_VERSION} columnar task file")
+        self.sections = {}
+        for i in range(count):
+            name, typecode, offset, length = _SECTION.unpack_from(self._map, _HEADER.size + i * _SECTION.size)
+            self.sections[name.rstrip(b"\0").decode("ascii")] = (typecode.decode("ascii"), offset, length)
+        self._columns = {}
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        self._columns.clear()
+        self._tables.clear()
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _section(self, name):
+        typecode, offset, length = self.sections[name]
+        raw = memoryview(self._map)[offset:offset + length]
+        self._views.append(raw)
+        if sys.byteorder == "big" and typecode != "B":
+            values = array(typecode, raw.tobytes())
+            values.byteswap()
+            return values
+        view = raw.cast(typecode)
+        self._views.append(view)
+        return view
+
+    def column(self, name):
+        col = self._columns.get(name)
+        if col is None:
+            col = self._columns[name] = self._section(name)
+        return col
+
+    def table(self, name):
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = StringTable(self._section(f"{name}.offsets"), self._section(f"{name}.data"))
+        return table
+
+    def strings(self, column):
+        # the decoded values of a string column
+        table = self.table(COLUMNS[column][1])
+        return [table[i] for i in self.column(column)]
+
+    def rows_for_user(self, user):
+        # row numbers of one user's tasks; reads only the created_by column
+        code = self.table("users").find(user)
+        if code is None:
+            return []
+        return [row for row, owner in enumerate(self.column("created_by")) if owner == code]
+
+    def tasks(self, rows=None):
+        # Task objects for the given rows (all of them by default)
+        if rows is None:
+            pick = lambda name: self.column(name).tolist()
+            lookup = lambda table, codes: _decode(self.table(table), codes, whole=True)
+        else:
+            rows = list(rows)
+            pick = lambda name: [self.column(name)[r] for r in rows]
+            lookup = lambda table, codes: _decode(self.table(table), codes, whole=False)
+        columns = [
+            lookup("text", pick("title")),
+            lookup("text", pick("description")),
+            pick("deadline"), pick("priority"), pick("flags"), pick("progress"),
+            pick("end_time"), pick("reminder_time"), pick("created_at"),
+            lookup("users", pick("created_by")),
+            lookup("ids", pick("id")),
+            pick("version"),
+            lookup("text", pick("extra")),
+        ]
+        out = []
+        # thousands of small objects and nothing cyclic among them
+        with gc_paused():
+            for (title, description, deadline, priority, flags, progress, end_time, reminder_time,
+                 created_at, created_by, task_id, version, extra) in zip(*columns):
+                extra = json.loads(extra) if extra is not None else {}
+                if "progress" in extra and parse_progress(extra["progress"]) is not None:
+                    # out of the column's range; a value that does not
+                    # parse stays in extra, as in Task.from_dict
+                    progress = parse_progress(extra.pop("progress"))
+                out.append(Task(
+                    title=title,
+                    description=description,
+                    deadline=date.fromordinal(deadline) if deadline else None,
+                    priority=PRIORITIES[priority],
+                    completed=bool(flags & COMPLETED),
+                    progress=progress,
+                    end_time=None if end_time == NONE_TIME else EPOCH + timedelta(seconds=end_time),
+                    reminder_time=None if reminder_time == NONE_TIME else EPOCH + timedelta(seconds=reminder_time),
+                    notified=bool(flags & NOTIFIED),
+                    created_by=created_by,
+                    created_at=None if created_at == NONE_TIME else EPOCH + timedelta(seconds=created_at),
+                    id=task_id,
+                    version=version,
+                    extra=extra,
+                ))
+        return out
+
+
+def _decode(table, codes, whole):
+    # strings for a column of table indexes; a full load decodes the whole
+    # table once instead of looking each string up
+    if not whole:
+        return [table[i] for i in codes]
+    values = table.all() + [None]
+    return [values[i] if i != NONE_INDEX else None for i in codes]
+
+
+def read_columnar(path=COLUMNAR_FILE):
+    if not os.path.exists(path):
+        return []
+    with ColumnarReader(path) as reader:
+        return reader.tasks()
+
+
+# ---------------- Conversion ----------------
+def json_to_columnar(src, dst):
+    tasks = [Task.from_dict(d) for d in load_tasks(src)]
+    write_columnar(tasks, dst)
+    return len(tasks)
+
+
+def columnar_to_json(src, dst):
+    # the file cannot tell a missing id or owner from a null one; leaving
+    # them out keeps to_dict from adding "id": null to records without one
+    tasks = read_columnar(src)
+    records = []
+    for t in tasks:
+        data = t.to_dict()
+        for name in ("id", "created_by"):
+            if data[name] is None:
+                del data[name]
+        records.append(data)
+    save_tasks(records, dst)
+    return len(tasks)
+
+
+class ColumnarTaskFile:
+    """TaskStore backend keeping tasks in a columnar file (see above).
+
+    Like the JSON backend it rewrites the whole file on commit, but encoding
+    the columns is much cheaper than ``json.dumps(indent=4)`` and loading
+    skips JSON parsing and timestamp parsing entirely.
+    """
+
+    incremental = False
+
+    def __init__(self, path=COLUMNAR_FILE):
+        self.path = path
+
+    def load(self):
+        return read_columnar(self.path)
+
+    def peek(self, user, limit):
+        if not os.path.exists(self.path):
+            return []
+        with ColumnarReader(self.path) as reader:
+            rows = range(min(limit, len(reader))) if user == "guest" else reader.rows_for_user(user)[:limit]
+            return reader.tasks(rows)
+
+    def record(self, op, task, fields=None):
+        pass
+
+    def commit(self, store):
+        # encode while the store is locked, hit the disk after
+        data = encode_columnar(store.records())
+        return lambda: atomic_write_bytes(data, self.path)
+
+    def rewrite(self, store):
+        return self.commit(store)
+
+    def close(self):
+        pass
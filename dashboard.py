@@ -0,0 +1,118 @@
+import os
+import tkinter as tk
+from datetime import date
+from tkinter import ttk
+
+from analytics import (PERCENTILES, TaskArrays, analytics_filename, analyze, duration_text, percent_text,
+                       write_analytics)
+from reports import REPORTS_DIR
+
+# weeks of throughput shown; the CSV export has all of them
+CHART_WEEKS = 26
+
+
+def _table(parent, columns, widths=None, height=8):
+    tree = ttk.Treeview(parent, columns=columns, show="headings", height=height)
+    for col in columns:
+        tree.heading(col, text=col)
+        tree.column(col, width=(widths or {}).get(col, 110), anchor="w" if col == columns[0] else "e")
+    tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+    return tree
+
+
+class DashboardWindow:
+    """Productivity analytics over the tasks a user can see.
+
+    Everything is computed in one vectorized pass by analytics.analyze;
+    "Refresh" recomputes from the store, "Export CSV" writes the same
+    numbers (with every week of throughput) to the reports folder.
+    """
+
+    def __init__(self, root, store, user):
+        self.store = store
+        self.user = user
+        self.result = None
+        self.top = tk.Toplevel(root)
+        self.top.title(f"Analytics - {user}")
+        self.top.geometry("860x560")
+
+        tabs = ttk.Notebook(self.top)
+        tabs.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        pages = {}
+        for name in ("Completion", "Weekly", "Deadlines", "Users"):
+            pages[name] = tk.Frame(tabs)
+            tabs.add(pages[name], text=name)
+        self.completion = _table(pages["Completion"], ("Statistic", "Value"), {"Statistic": 220, "Value": 200})
+        self.chart = tk.Canvas(pages["Weekly"], bg="white", height=360)
+        self.chart.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.chart.bind("<Configure>", lambda e: self._draw_chart())
+        self.deadlines = _table(pages["Deadlines"], ("Priority", "With Deadline", "On Time", "Late", "Open Overdue",
+                                                     "On-time Rate", "Overdue Rate"))
+        self.users = _table(pages["Users"], ("User", "Tasks", "Completed", "Completion Rate", "Median Completion",
+                                             "On-time Rate", "Open Overdue"),
+                            {"User": 160, "Median Completion": 150}, height=16)
+
+        btn_frame = tk.Frame(self.top)
+        btn_frame.pack(fill=tk.X, padx=5, pady=5)
+        tk.Button(btn_frame, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Export CSV", command=self.export).pack(side=tk.LEFT, padx=5)
+        self.status = tk.Label(btn_frame, text="", anchor="w")
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.refresh()
+
+    def refresh(self):
+        self.result = analyze(TaskArrays.from_tasks(self.store.for_user(self.user, archived=True)))
+        r = self.result
+        for tree in (self.completion, self.deadlines, self.users):
+            tree.delete(*tree.get_children())
+        c = r["completion"]
+        self.completion.insert("", tk.END, values=("Tasks", r["tasks"]))
+        self.completion.insert("", tk.END, values=("Completed with times", c["count"]))
+        self.completion.insert("", tk.END, values=("Mean completion time", duration_text(c["mean"])))
+        for q in PERCENTILES:
+            self.completion.insert("", tk.END, values=(f"p{q} completion time", duration_text(c[f"p{q}"])))
+        for p in r["priorities"]:
+            self.deadlines.insert("", tk.END, values=(p["priority"], p["with_deadline"], p["on_time"], p["late"],
+                                                      p["overdue"], percent_text(p["on_time_rate"]),
+                                                      percent_text(p["overdue_rate"])))
+        for u in r["users"]:
+            self.users.insert("", tk.END, values=(u["user"], u["total"], u["completed"],
+                                                  percent_text(u["completion_rate"]),
+                                                  duration_text(u["median_completion"]),
+                                                  percent_text(u["on_time_rate"]), u["overdue"]))
+        self._draw_chart()
+        self.status.config(text=f"Analyzed {r['tasks']} tasks.")
+
+    def _draw_chart(self):
+        # completed tasks per week as bars, most recent CHART_WEEKS weeks
+        self.chart.delete("all")
+        weeks = self.result["weekly"][-CHART_WEEKS:] if self.result else []
+        if not weeks:
+            self.chart.create_text(20, 20, text="No completed tasks yet.", anchor="nw")
+            return
+        width = max(self.chart.winfo_width(), 200)
+        height = max(self.chart.winfo_height(), 120)
+        top, bottom, left = 20, height - 40, 40
+        peak = max(n for _, n in weeks) or 1
+        step = (width - left - 10) / len(weeks)
+        for i, (monday, count) in enumerate(weeks):
+            x = left + i * step
+            y = bottom - (bottom - top) * count / peak
+            self.chart.create_rectangle(x + 2, y, x + step - 2, bottom, fill="#00796b", outline="")
+            self.chart.create_text(x + step / 2, y - 2, text=str(count), anchor="s", font=("Arial", 8))
+            if i % max(1, len(weeks) // 8) == 0:
+                self.chart.create_text(x + step / 2, bottom + 4, text=monday.strftime("%m-%d"), anchor="n",
+                                       font=("Arial", 8))
+        self.chart.create_line(left, bottom, width - 10, bottom)
+        self.chart.create_text(left, bottom + 22, text="Completed per week (week starting)", anchor="nw",
+                               font=("Arial", 9))
+
+    def export(self):
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        filename = analytics_filename(self.user, date.today())
+        try:
+            write_analytics(filename, self.user, self.result)
+        except OSError as e:
+            self.status.config(text=f"Could not write {filename}: {e}")
+            return
+        self.status.config(text=f"Saved to {filename}")
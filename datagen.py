@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from accounts import hash_password
+from models import Priority, default_reminder, format_date, format_datetime, parse_datetime
+from storage import atomic_write_json, save_tasks
+
+# synthetic datasets for benchmarking; every generated user's password is this
+DEFAULT_PASSWORD = "123456"
+PRIORITY_WEIGHTS = ((Priority.HIGH, 2), (Priority.MEDIUM, 5), (Priority.LOW, 3))
+
+
+def user_names(count):
+    return [f"user{i:05d}" for i in range(1, count + 1)]
+
+
+def generate_tasks(count, users=100, completed_ratio=0.5, seed=0, now=None):
+    # task dicts in the tasks.json layout. Deadlines fall within half a year
+    # either side of now, owners follow a skewed distribution so a few users
+    # have many tasks, and completed tasks get an end time after creation.
+    # Ids come from the seeded generator too (12 hex digits like
+    # new_task_id), so the same seed and now give the same tasks.
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(microsecond=0)
+    names = user_names(users)
+    owner_weights = [1 / (i + 1) for i in range(users)]
+    priorities = [p.value for p, _ in PRIORITY_WEIGHTS]
+    priority_weights = [w for _, w in PRIORITY_WEIGHTS]
+    owners = rng.choices(names, owner_weights, k=count)
+    prios = rng.choices(priorities, priority_weights, k=count)
+    ids = rng.sample(range(1 << 48), count)
+    tasks = []
+    for i in range(count):
+        deadline = (now + timedelta(days=rng.randint(-180, 180))).date()
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))
+        completed = rng.random() < completed_ratio
+        end_time = None
+        progress = rng.choice((0, 0, 10, 25, 50, 75, 90))
+        if completed:
+            progress = 100
+            end_time = min(now, created + timedelta(hours=rng.randint(1, 24 * 60)))
+        reminder = default_reminder(deadline, created)
+        tasks.append({
+            "title": f"Task {i + 1}",
+            "description": rng.choice(("", "Study", "Review notes", "Write report", "Call the team")),
+            "deadline": format_date(deadline),
+            "priority": prios[i],
+            "completed": completed,
+            "progress": progress,
+            "end_time": format_datetime(end_time),
+            "reminder_time": format_datetime(reminder),
+            "notified": reminder <= now and rng.random() < 0.8,
+            "created_by": owners[i],
+            "created_at": format_datetime(created),
+            "id": f"{ids[i]:012x}",
+        })
+    return tasks
+
+
+def generate_users(count, password=DEFAULT_PASSWORD):
+    hashed = hash_password(password)
+    return {name: {"password": hashed} for name in user_names(count)}
+
+
+def write_dataset(out_dir, count, users=100, completed_ratio=0.5, seed=0, now=None):
+    os.makedirs(out_dir, exist_ok=True)
+    task_path = os.path.join(out_dir, "tasks.json")
+    user_path = os.path.join(out_dir, "users.json")
+    save_tasks(generate_tasks(count, users, completed_ratio, seed, now), task_path)
+    atomic_write_json(generate_users(users), user_path, indent=4)
+    return task_path, user_path
+
+
+def _moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}")
+    return moment
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic tasks.json/users.json pair")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--completed", type=float, default=0.5, help="fraction of completed tasks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--now", type=_moment, help="YYYY-MM-DD[ HH:MM:SS] the dates are generated around "
+                        "(default: the current time); with --seed it makes runs repeatable")
+    parser.add_argument("--out", default="dataset", help="directory to write the two files to")
+    args = parser.parse_args(argv)
+    task_path, user_path = write_dataset(args.out, args.tasks, args.users, args.completed, args.seed, args.now)
+    print(f"Wrote {args.tasks} tasks to {task_path} and {args.users} users to {user_path}")
+
+
+if __name__ == "__main__":
+    main()
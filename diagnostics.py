@@ -0,0 +1,94 @@
+import tkinter as tk
+from tkinter import ttk
+
+from metrics import METRICS_FILE, PROFILER, all_metrics, write_prometheus
+
+REFRESH_MS = 1000
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+def metric_rows(metrics):
+    # (name, labels, count, mean, p50, p95, max) per series, times in ms
+    rows = []
+    for m in metrics:
+        if m.kind == "counter":
+            if not m.values:
+                rows.append((m.name, "", 0, "", "", "", ""))
+            for key, value in sorted(m.values.items()):
+                labels = ",".join(f"{k}={v}" for k, v in key)
+                rows.append((m.name, labels, value, "", "", "", ""))
+        elif m.count:
+            rows.append((m.name, "", m.count, _ms(m.sum / m.count), _ms(m.quantile(0.5)),
+                         _ms(m.quantile(0.95)), _ms(m.max)))
+        else:
+            rows.append((m.name, "", 0, "", "", "", ""))
+    return rows
+
+
+class DiagnosticsWindow:
+    """Live view of the counters and latency histograms in metrics.py.
+
+    Histogram percentiles are bucket upper bounds, so read them as "at
+    most". "Profile Next Action" runs the next button or menu action under
+    cProfile and shows its top functions here.
+    """
+
+    def __init__(self, root):
+        self.top = tk.Toplevel(root)
+        self.top.title("Diagnostics")
+        self.top.geometry("820x520")
+        columns = ("Metric", "Labels", "Count", "Mean ms", "p50 ms", "p95 ms", "Max ms")
+        self.tree = ttk.Treeview(self.top, columns=columns, show="headings", height=12)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=260 if col == "Metric" else 80, anchor="w" if col in ("Metric", "Labels") else "e")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        btn_frame = tk.Frame(self.top)
+        btn_frame.pack(fill=tk.X, padx=5)
+        tk.Button(btn_frame, text="Profile Next Action", command=self.arm_profiler).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Write Metrics File", command=self.write_file).pack(side=tk.LEFT, padx=5)
+        self.status = tk.Label(btn_frame, text="", anchor="w")
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        self.profile_text = tk.Text(self.top, height=12, font=("Courier", 9), wrap="none")
+        self.profile_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self._shown_profile = None
+        self._job = None
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for row in metric_rows(all_metrics()):
+            self.tree.insert("", tk.END, values=row)
+        if PROFILER.last is not None and PROFILER.last is not self._shown_profile:
+            self._shown_profile = PROFILER.last
+            action, path, summary = PROFILER.last
+            self.status.config(text=f"Profiled {action}: {path}")
+            self.profile_text.delete("1.0", tk.END)
+            self.profile_text.insert(tk.END, summary)
+        self._job = self.top.after(REFRESH_MS, self.refresh)
+
+    def arm_profiler(self):
+        PROFILER.arm()
+        self.status.config(text="The next action will be profiled.")
+
+    def write_file(self):
+        if not METRICS_FILE:
+            self.status.config(text="The metrics file is turned off (TMS_METRICS_FILE).")
+            return
+        try:
+            write_prometheus()
+        except OSError as e:
+            self.status.config(text=f"Could not write metrics: {e}")
+            return
+        self.status.config(text=f"Wrote {METRICS_FILE}")
+
+    def close(self):
+        if self._job is not None:
+            self.top.after_cancel(self._job)
+        self.top.destroy()
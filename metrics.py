@@ -0,0 +1,207 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from datetime import datetime
+
+# Prometheus text file the GUI and the API server rewrite every
+# METRICS_INTERVAL seconds; set TMS_METRICS_FILE to "" to turn it off
+METRICS_FILE = os.environ.get("TMS_METRICS_FILE", "metrics.prom")
+METRICS_INTERVAL = 15
+PROFILE_DIR = "profiles"
+# seconds; covers a fast Treeview diff up to a multi-second save
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def lines(self):
+        return [f"{self.name}{_label_text(key)} {value}" for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Latency distribution in fixed buckets, plus count and sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def lines(self):
+        out = []
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            out.append(f'{self.name}_bucket{{le="{bound}"}} {seen}')
+        out.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        out.append(f"{self.name}_sum {self.sum}")
+        out.append(f"{self.name}_count {self.count}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+_metrics = {}
+
+
+def counter(name, help):
+    return _metrics.setdefault(name, Counter(name, help))
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    return _metrics.setdefault(name, Histogram(name, help, buckets))
+
+
+def all_metrics():
+    return list(_metrics.values())
+
+
+def render_prometheus():
+    out = []
+    with _lock:
+        for metric in _metrics.values():
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+    return "\n".join(out) + "\n"
+
+
+def write_prometheus(path=METRICS_FILE):
+    if not path:
+        return
+    # written directly rather than with storage's atomic writes, which
+    # count into STORAGE_WRITE/STORAGE_BYTES; the rename still keeps a
+    # scraper from reading half a file, and losing it in a crash is fine
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+# ---------------- Hot paths ----------------
+# defined once here so every module reports into the same series
+STORAGE_BYTES = counter("tms_storage_bytes_written_total", "Bytes written to disk, by file.")
+STORAGE_WRITE = histogram("tms_storage_write_seconds", "Time to write a file to disk.")
+STORAGE_LOAD = histogram("tms_storage_load_seconds", "Time to read and parse the task file.")
+STORE_SAVE = histogram("tms_store_save_seconds", "Time for one TaskStore.save, serializing included.")
+TABLE_RENDER = histogram("tms_table_render_seconds", "Time for one task table refresh.")
+TABLE_ROWS = counter("tms_table_rows_total", "Treeview rows touched by refreshes, by operation.")
+REMINDER_SCAN = histogram("tms_reminder_scan_seconds", "Time to rebuild or drain the reminder heap.")
+REMINDERS_FIRED = counter("tms_reminders_fired_total", "Reminders delivered.")
+REPORT_SECONDS = histogram("tms_report_seconds", "Time to build and write a report, or one batch of them.")
+REPORTS_WRITTEN = counter("tms_reports_written_total", "Report files written.")
+
+
+# ---------------- Profiling ----------------
+class Profiler:
+    """On-demand cProfile capture of the next profiled action.
+
+    ``arm()`` makes the next call through a ``@profiled`` function run under
+    cProfile; the stats are dumped to PROFILE_DIR and a text summary of the
+    top entries is kept in ``last`` as (action, path, summary).
+    """
+
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self.armed = False
+        self.last = None
+
+    def arm(self):
+        self.armed = True
+
+    def run(self, name, fn, *args, **kwargs):
+        if not self.armed:
+            return fn(*args, **kwargs)
+        self.armed = False
+        # imported here: only needed once someone asks for a profile
+        import cProfile
+        import io
+        import pstats
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            os.makedirs(self.out_dir, exist_ok=True)
+            path = os.path.join(self.out_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+            profile.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(25)
+            self.last = (name, path, text.getvalue())
+
+
+PROFILER = Profiler()
+
+
+def profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return PROFILER.run(fn.__name__, fn, *args, **kwargs)
+    return wrapper
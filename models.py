@@ -0,0 +1,219 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class Priority(Enum):
+    HIGH = "High"
+    MEDIUM = "Medium"
+    LOW = "Low"
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_datetime(value):
+    # accepts "YYYY-MM-DD HH:MM:SS" as written by the app and the
+    # "YYYY-MM-DD HH:MM" form typed into the dialogs
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(microsecond=0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_priority(value):
+    # the Priority for a stored value, None if it is not one (from_dict
+    # then keeps the value as written, see Task)
+    try:
+        return Priority(value)
+    except ValueError:
+        return None
+
+
+def parse_progress(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_date(value):
+    return value.isoformat() if value is not None else ""
+
+
+def format_datetime(value):
+    return value.isoformat(" ", "seconds") if value is not None else ""
+
+
+# JSON keys in the order tasks.json has always used
+FIELDS = ("title", "description", "deadline", "priority", "completed", "progress",
+          "end_time", "reminder_time", "notified", "created_by", "created_at")
+DATE_FIELDS = ("deadline",)
+DATETIME_FIELDS = ("end_time", "reminder_time", "created_at")
+# fields whose JSON value is parsed into something else
+PARSERS = dict([(name, parse_date) for name in DATE_FIELDS] + [(name, parse_datetime) for name in DATETIME_FIELDS],
+               priority=parse_priority, progress=parse_progress)
+# what those fields hold when their value is missing or does not parse
+UNSET = {"priority": Priority.MEDIUM, "progress": 0}
+# bookkeeping keys that are not task content; version counts the edits
+# written for a task so instances sharing a file can tell who changed what
+META_FIELDS = ("id", "version")
+
+
+@dataclass(slots=True, eq=False)
+class Task:
+    """One task, parsed once when it is loaded.
+
+    Timestamps are ``datetime``/``date`` objects (or None when unset) and the
+    priority is a ``Priority``; ``to_dict`` writes the original JSON layout
+    back out. Keys the model does not know about are carried in ``extra``,
+    and so is a value that does not parse (a deadline of "26/10/2025"), under
+    its own key: the field reads as unset and the value is written back as
+    it was.
+    """
+
+    title: str = ""
+    description: str = ""
+    deadline: date = None
+    priority: Priority = Priority.MEDIUM
+    completed: bool = False
+    progress: int = 0
+    end_time: datetime = None
+    reminder_time: datetime = None
+    notified: bool = False
+    created_by: str = None
+    created_at: datetime = None
+    id: str = None
+    version: int = 0
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data):
+        get = data.get
+        task = cls(
+            title=get("title") or "",
+            description=get("description") or "",
+            deadline=parse_date(get("deadline")),
+            priority=parse_priority(get("priority")),
+            completed=bool(get("completed")),
+            progress=parse_progress(get("progress")),
+            end_time=parse_datetime(get("end_time")),
+            reminder_time=parse_datetime(get("reminder_time")),
+            notified=bool(get("notified")),
+            created_by=get("created_by"),
+            created_at=parse_datetime(get("created_at")),
+            id=get("id"),
+            version=int(get("version") or 0),
+        )
+        extra = {k: v for k, v in data.items() if k not in FIELDS and k not in META_FIELDS}
+        if None in (task.deadline, task.priority, task.progress, task.end_time, task.reminder_time, task.created_at):
+            for name in PARSERS:
+                if getattr(task, name) is None:
+                    value = get(name)
+                    if value not in (None, ""):
+                        extra[name] = value
+            for name, value in UNSET.items():
+                if getattr(task, name) is None:
+                    setattr(task, name, value)
+        task.extra = extra
+        return task
+
+    def to_dict(self):
+        data = {
+            "title": self.title,
+            "description": self.description,
+            "deadline": format_date(self.deadline),
+            "priority": self.priority.value,
+            "completed": self.completed,
+            "progress": self.progress,
+            "end_time": format_datetime(self.end_time),
+            "reminder_time": format_datetime(self.reminder_time),
+            "notified": self.notified,
+            "created_by": self.created_by,
+            "created_at": format_datetime(self.created_at),
+            "id": self.id,
+        }
+        if self.version:
+            data["version"] = self.version
+        data.update(self.extra)
+        return data
+
+    def set(self, name, value):
+        # typed assignment for one field; unknown names land in extra
+        if name in PARSERS:
+            parsed = PARSERS[name](value)
+            if parsed is None and value not in (None, ""):
+                # kept as written; the field itself reads as unset
+                self.extra[name] = value
+            else:
+                self.extra.pop(name, None)
+            if parsed is None:
+                parsed = UNSET.get(name)
+            setattr(self, name, parsed)
+            return
+        if name in ("completed", "notified"):
+            value = bool(value)
+        elif name == "version":
+            value = int(value or 0)
+        elif name not in FIELDS and name not in META_FIELDS:
+            self.extra[name] = value
+            return
+        setattr(self, name, value)
+
+    def field_dict(self, names):
+        # JSON values for just the given fields, for journal/SQL updates
+        data = self.to_dict()
+        return {name: data.get(name) for name in names}
+
+
+def default_reminder(deadline, now=None):
+    # last day before the deadline at 09:00 if that is still ahead, else 1 minute from now
+    now = now or datetime.now()
+    reminder = datetime.combine(deadline - timedelta(days=1), time(9, 0))
+    if reminder < now:
+        reminder = now + timedelta(minutes=1)
+    return reminder.replace(microsecond=0)
+
+
+def new_task(title, deadline, priority, description, created_by, now=None):
+    # builds a task from the fields of the add form, raising ValueError with
+    # the message to show when they are not valid
+    title = (title or "").strip()
+    deadline = (deadline or "").strip()
+    if not title or not deadline:
+        raise ValueError("Please enter title and deadline.")
+    try:
+        dl_date = datetime.strptime(deadline, DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+    if priority not in [p.value for p in Priority]:
+        raise ValueError("Priority must be High, Medium or Low.")
+    now = (now or datetime.now()).replace(microsecond=0)
+    return Task(
+        title=title,
+        description=description or "",
+        deadline=dl_date,
+        priority=Priority(priority),
+        reminder_time=default_reminder(dl_date, now),
+        created_by=created_by,
+        created_at=now,
+    )
@@ -0,0 +1,71 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class NotificationPanel:
+    """Fired reminders, listed in a window that neither blocks the main one
+    nor takes the focus.
+
+    Reminders that arrive together are added in one update. Closing the
+    window hides it; the next reminder brings it back with everything not
+    yet cleared.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.top = None
+        self.tree = None
+        self.detail = None
+        self._descriptions = {}
+
+    def _build(self):
+        self.top = tk.Toplevel(self.root)
+        self.top.geometry("560x280")
+        self.top.transient(self.root)
+        self.top.protocol("WM_DELETE_WINDOW", self.top.withdraw)
+        columns = ("Reminder", "Title", "Due", "Priority")
+        self.tree = ttk.Treeview(self.top, columns=columns, show="headings", height=8)
+        widths = {"Reminder": 140, "Title": 220, "Due": 90, "Priority": 70}
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=widths[col], anchor="w")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self._show_detail())
+        self.detail = tk.Label(self.top, text="", anchor="w", justify="left", wraplength=540)
+        self.detail.pack(fill=tk.X, padx=5)
+        btn_frame = tk.Frame(self.top)
+        btn_frame.pack(fill=tk.X, padx=5, pady=5)
+        tk.Button(btn_frame, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Hide", command=self.top.withdraw).pack(side=tk.RIGHT, padx=5)
+        self._descriptions = {}
+
+    def add(self, notes):
+        # notes as made by reminders.reminder_note, newest shown first
+        if not notes:
+            return
+        if self.top is None or not self.top.winfo_exists():
+            self._build()
+        for note in notes:
+            if self.tree.exists(note["id"]):
+                continue
+            self.tree.insert("", 0, iid=note["id"], values=(note["reminder_time"], note["title"],
+                                                           note["deadline"], note["priority"]))
+            self._descriptions[note["id"]] = note["description"]
+        self.top.title(f"Reminders ({len(self.tree.get_children())})")
+        self.top.deiconify()
+        self.root.bell()
+
+    def _show_detail(self):
+        selected = self.tree.selection()
+        self.detail.config(text=self._descriptions.get(selected[0], "") if selected else "")
+
+    def clear(self):
+        self.tree.delete(*self.tree.get_children())
+        self._descriptions = {}
+        self.detail.config(text="")
+        self.top.title("Reminders")
+
+    def close(self):
+        if self.top is not None and self.top.winfo_exists():
+            self.top.destroy()
+        self.top = None
@@ -0,0 +1,244 @@
+import calendar
+import re
+from datetime import date, datetime, time, timedelta
+
+from models import Task, format_date, parse_date
+
+# A series is stored once, as a task whose extra holds RECURRENCE_KEY (the
+# rule). Its deadline is the first occurrence and its other fields are the
+# template for every occurrence. Occurrences are expanded from the rule when
+# needed; one is only stored when it is completed or edited (an override,
+# with SERIES_KEY and OCCURRENCE_KEY in extra) or deleted (the same, plus
+# SKIPPED_KEY).
+RECURRENCE_KEY = "recurrence"
+SERIES_KEY = "series"
+OCCURRENCE_KEY = "occurrence"
+SKIPPED_KEY = "skipped"
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+REPEAT_CHOICES = ("Does not repeat", "Daily", "Weekly", "Monthly", "Custom...")
+
+# the occurrences TaskStore keeps expanded: a week back, so a missed one
+# still shows as overdue, to two weeks ahead
+PAST_DAYS = 7
+AHEAD_DAYS = 14
+
+
+class Recurrence:
+    """When a series repeats: every ``interval`` days, weeks or months from
+    its first date, on ``weekdays`` (0 = Monday) for weekly rules, ending
+    after ``until`` or ``count`` occurrences if set. ``notified_through`` is
+    the last occurrence whose reminder has fired."""
+
+    def __init__(self, freq="daily", interval=1, weekdays=(), until=None, count=0, notified_through=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Repeat must be one of {', '.join(FREQUENCIES)}.")
+        self.freq = freq
+        self.interval = max(1, int(interval))
+        self.weekdays = tuple(sorted(set(weekdays)))
+        self.until = until
+        self.count = max(0, int(count or 0))
+        self.notified_through = notified_through
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            freq=data.get("freq", "daily"),
+            interval=data.get("interval") or 1,
+            weekdays=[WEEKDAYS.index(d) for d in data.get("weekdays", ()) if d in WEEKDAYS],
+            until=parse_date(data.get("until")),
+            count=data.get("count") or 0,
+            notified_through=parse_date(data.get("notified_through")),
+        )
+
+    def to_dict(self):
+        data = {"freq": self.freq, "interval": self.interval}
+        if self.weekdays:
+            data["weekdays"] = [WEEKDAYS[d] for d in self.weekdays]
+        if self.until is not None:
+            data["until"] = format_date(self.until)
+        if self.count:
+            data["count"] = self.count
+        if self.notified_through is not None:
+            data["notified_through"] = format_date(self.notified_through)
+        return data
+
+    def describe(self):
+        unit = {"daily": "day", "weekly": "week", "monthly": "month"}[self.freq]
+        text = f"every {unit}" if self.interval == 1 else f"every {self.interval} {unit}s"
+        if self.weekdays:
+            text += " on " + ", ".join(WEEKDAYS[d].title() for d in self.weekdays)
+        if self.until is not None:
+            text += f" until {format_date(self.until)}"
+        if self.count:
+            text += f", {self.count} times"
+        return text
+
+    def dates(self, start, since=None):
+        # occurrence dates from since (default: the first) onwards, lazily
+        # and possibly forever. Starts by jumping straight to since, so the
+        # cost does not depend on how long the series has been running.
+        since = max(since or start, start)
+        for n, day in self._candidates(start, since):
+            if self.count and n >= self.count:
+                return
+            if self.until is not None and day > self.until:
+                return
+            if day >= since:
+                yield day
+
+    def _candidates(self, start, since):
+        # (occurrence number, date) from about since on
+        if self.freq == "daily":
+            k = -(-(since - start).days // self.interval)
+            while True:
+                yield k, start + timedelta(days=k * self.interval)
+                k += 1
+        elif self.freq == "weekly":
+            days = self.weekdays or (start.weekday(),)
+            monday = start - timedelta(days=start.weekday())
+            # weekdays before the start in the first week are not occurrences
+            missed = sum(1 for d in days if d < start.weekday())
+            block = (since - monday).days // (7 * self.interval)
+            n = max(block * len(days) - missed, 0)
+            while True:
+                week = monday + timedelta(weeks=block * self.interval)
+                for d in days:
+                    day = week + timedelta(days=d)
+                    if day >= start:
+                        yield n, day
+                        n += 1
+                block += 1
+        else:
+            months = (since.year - start.year) * 12 + since.month - start.month
+            k = max(months // self.interval - 1, 0)
+            while True:
+                index = start.month - 1 + k * self.interval
+                year, month = start.year + index // 12, index % 12 + 1
+                # the 31st falls on the last day of shorter months
+                yield k, date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+                k += 1
+
+    def between(self, start, low, high):
+        # occurrence dates in [low, high]
+        for day in self.dates(start, low):
+            if day > high:
+                return
+            yield day
+
+
+_RULE = re.compile(r"every\s+(?:(\d+)\s+)?(day|week|month)s?"
+                   r"(?:\s+on\s+([a-z,\s]+?))?(?:\s+until\s+(\d{4}-\d{2}-\d{2}))?(?:\s+for\s+(\d+)\s+times?)?$")
+
+
+def parse_rule(text):
+    # a Recurrence from "daily", "weekly", "monthly" or a custom rule like
+    # "every 2 weeks on mon,thu until 2026-12-31" or "every 3 days for 10 times";
+    # raises ValueError with the message to show
+    text = " ".join((text or "").lower().split())
+    if text in FREQUENCIES:
+        return Recurrence(text)
+    match = _RULE.match(text)
+    if match is None:
+        raise ValueError("Use e.g. 'every 2 weeks on mon,thu until 2026-12-31' or 'every 3 days for 10 times'.")
+    interval, unit, days, until, count = match.groups()
+    weekdays = []
+    for name in re.split(r"[,\s]+", days or ""):
+        if not name:
+            continue
+        if name[:3] not in WEEKDAYS:
+            raise ValueError(f"Unknown weekday '{name}'.")
+        weekdays.append(WEEKDAYS.index(name[:3]))
+    if weekdays and unit != "week":
+        raise ValueError("Weekdays only apply to weekly rules.")
+    freq = {"day": "daily", "week": "weekly", "month": "monthly"}[unit]
+    return Recurrence(freq, interval or 1, weekdays, parse_date(until), count or 0)
+
+
+# ---------------- Series and occurrences ----------------
+def is_series(task):
+    return RECURRENCE_KEY in task.extra
+
+
+def is_occurrence(task):
+    return SERIES_KEY in task.extra
+
+
+def stored_apart(task):
+    # series definitions and deleted occurrences are stored but are not
+    # tasks anyone sees
+    return RECURRENCE_KEY in task.extra or bool(task.extra.get(SKIPPED_KEY))
+
+
+def rule_of(series):
+    return Recurrence.from_dict(series.extra[RECURRENCE_KEY])
+
+
+def occurrence_id(series_id, day):
+    return f"{series_id}@{format_date(day)}"
+
+
+def split_occurrence_id(task_id):
+    # (series id, date) for an occurrence id, else None
+    series_id, sep, day = (task_id or "").rpartition("@")
+    day = parse_date(day) if sep else None
+    return (series_id, day) if day is not None else None
+
+
+def occurrence(series, day, rule=None):
+    # the task for one occurrence, as the series describes it
+    rule = rule or rule_of(series)
+    reminder = None
+    if series.reminder_time is not None:
+        reminder = series.reminder_time + (day - series.deadline)
+    return Task(
+        title=series.title,
+        description=series.description,
+        deadline=day,
+        priority=series.priority,
+        reminder_time=reminder,
+        notified=rule.notified_through is not None and day <= rule.notified_through,
+        created_by=series.created_by,
+        created_at=series.created_at,
+        id=occurrence_id(series.id, day),
+        extra={SERIES_KEY: series.id, OCCURRENCE_KEY: format_date(day)},
+    )
+
+
+def expand(series, low, high):
+    # occurrence tasks of a series due in [low, high], generated lazily
+    if series.deadline is None:
+        return
+    rule = rule_of(series)
+    for day in rule.between(series.deadline, low, high):
+        yield occurrence(series, day, rule)
+
+
+def skip_record(task):
+    # what is stored for a deleted occurrence
+    series_id, day = split_occurrence_id(task.id)
+    return Task(title=task.title, created_by=task.created_by, id=task.id,
+                extra={SERIES_KEY: series_id, OCCURRENCE_KEY: format_date(day), SKIPPED_KEY: True})
+
+
+def notified_rule(series, day):
+    # the series' rule with day's reminder marked as fired, or None if it
+    # already was
+    rule = rule_of(series)
+    if rule.notified_through is not None and rule.notified_through >= day:
+        return None
+    rule.notified_through = day
+    return rule.to_dict()
+
+
+def make_series(task, rule):
+    # turns a task from the add form into a series starting on its deadline;
+    # every occurrence is reminded the day before at 09:00
+    task.extra[RECURRENCE_KEY] = rule.to_dict()
+    task.reminder_time = datetime.combine(task.deadline - timedelta(days=1), time(9, 0))
+    return task
+
+
+def window(today):
+    return today - timedelta(days=PAST_DAYS), today + timedelta(days=AHEAD_DAYS)
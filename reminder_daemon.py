@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import queue
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from background import roll_window, watch_store, write_metrics
+from models import format_datetime, parse_datetime
+from reminders import ReminderScheduler, reminder_note
+from storage import StorageError, atomic_write_json
+
+# Unix socket the daemon listens on; a GUI that finds nobody listening fires
+# its own reminders instead
+REMINDER_SOCKET = os.environ.get("TMS_REMINDER_SOCKET", "reminders.sock")
+QUEUE_FILE = "reminder_queue.json"
+# the daemon and the GUIs each hold the tasks in memory and write them back;
+# only a backend made for several writers (TMS_STORAGE=json, the shared
+# tasks.json) merges those writes and lets the daemon see the GUIs' edits
+NOT_SHARED = "The reminder daemon needs TMS_STORAGE=json, the only storage several processes can share."
+# acknowledged ids are remembered this long, so a reminder that fires again
+# after a crash (before its notified flag was saved) is not delivered twice
+SENT_KEEP_DAYS = 7
+
+
+def daemon_running(path=REMINDER_SOCKET):
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+class ReminderDaemon:
+    """Fires every user's reminders and pushes them to the GUIs connected
+    over the Unix socket.
+
+    Fired reminders wait in ``queued[user]`` (saved to QUEUE_FILE) until a
+    GUI session of that user acknowledges them, so reminders that fire while
+    nobody is logged in arrive at the next login. Each is sent to one
+    session of its user, the longest connected; if that session goes away
+    unacknowledged the next one gets it. ``sent`` keeps recently
+    acknowledged ids so nothing is queued twice.
+    """
+
+    def __init__(self, store, saver, queue_path=QUEUE_FILE):
+        self.store = store
+        self.saver = saver
+        self.queue_path = queue_path
+        self.queued = {}
+        self.sent = {}
+        # user -> writers in connection order, and writer -> ids sent to it
+        # and not yet acknowledged
+        self.sessions = {}
+        self.in_flight = {}
+        self.scheduler = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.queue_path):
+            return
+        with open(self.queue_path, "r") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return
+        self.queued = data.get("queued", {})
+        self.sent = data.get("sent", {})
+
+    def _save(self):
+        cutoff = datetime.now() - timedelta(days=SENT_KEEP_DAYS)
+        self.sent = {i: when for i, when in self.sent.items() if parse_datetime(when) >= cutoff}
+        atomic_write_json({"queued": self.queued, "sent": self.sent}, self.queue_path)
+
+    def start(self, loop):
+        self.scheduler = ReminderScheduler(self.store, "guest", lambda ms, fire: loop.call_later(ms / 1000, fire),
+                                           lambda handle: handle.cancel(), self.on_due)
+        self.scheduler.start()
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+
+    def on_due(self, tasks):
+        users = set()
+        for task in tasks:
+            note = reminder_note(task)
+            queued = self.queued.setdefault(note["user"], [])
+            if note["id"] in self.sent or any(n["id"] == note["id"] for n in queued):
+                continue
+            queued.append(note)
+            users.add(note["user"])
+        # saved before the tasks are marked: a crash in between fires them
+        # again, and the ids above catch that
+        self._save()
+        for task in tasks:
+            self.store.update(task.id, notified=True)
+        self.saver.schedule()
+        for user in users:
+            self._deliver(user)
+
+    def _deliver(self, user):
+        # what is queued for the user and not out yet goes to their first session
+        sessions = self.sessions.get(user)
+        if not sessions:
+            return
+        writer = sessions[0]
+        sent = self.in_flight[writer]
+        notes = [n for n in self.queued.get(user, ()) if n["id"] not in sent]
+        if not notes:
+            return
+        sent.update(n["id"] for n in notes)
+        writer.write(json.dumps({"reminders": notes}).encode("utf-8") + b"\n")
+
+    def _ack(self, user, writer, ids):
+        ids = set(ids)
+        queued = self.queued.get(user, [])
+        now = format_datetime(datetime.now())
+        for note in queued:
+            if note["id"] in ids:
+                self.sent[note["id"]] = now
+        self.queued[user] = [n for n in queued if n["id"] not in ids]
+        if not self.queued[user]:
+            del self.queued[user]
+        self.in_flight[writer] -= ids
+        self._save()
+
+    async def handle(self, reader, writer):
+        # newline-delimited JSON: {"hello": user} first, then {"ack": [ids]}
+        user = None
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    break
+                if user is None:
+                    user = message.get("hello")
+                    if not isinstance(user, str) or not user:
+                        break
+                    self.sessions.setdefault(user, []).append(writer)
+                    self.in_flight[writer] = set()
+                    self._deliver(user)
+                elif isinstance(message.get("ack"), list):
+                    self._ack(user, writer, message["ack"])
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if writer in self.in_flight:
+                del self.in_flight[writer]
+                self.sessions[user].remove(writer)
+                if not self.sessions[user]:
+                    del self.sessions[user]
+                # whatever it did not acknowledge goes to the user's next session
+                self._deliver(user)
+            writer.close()
+
+
+async def run_daemon(store, saver, path=REMINDER_SOCKET, queue_path=QUEUE_FILE):
+    if not store.shared:
+        raise StorageError(NOT_SHARED)
+    daemon = ReminderDaemon(store, saver, queue_path)
+    if os.path.exists(path):
+        # left behind by a daemon that did not shut down cleanly
+        os.remove(path)
+    server = await asyncio.start_unix_server(daemon.handle, path)
+    # same trust as tasks.json: only this account's processes connect
+    os.chmod(path, 0o600)
+    loop = asyncio.get_running_loop()
+    daemon.start(loop)
+    # the GUIs save to the shared tasks.json; their edits move reminders
+    background = [loop.create_task(write_metrics()), loop.create_task(watch_store(store)),
+                  loop.create_task(roll_window(store))]
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            for task in background:
+                task.cancel()
+            daemon.stop()
+            # lets the session handlers see the end of their streams and
+            # finish, rather than being cancelled mid-read
+            for writers in list(daemon.sessions.values()):
+                for writer in writers:
+                    writer.close()
+            await asyncio.sleep(0.1)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# ---------------- GUI side ----------------
+class ReminderClient:
+    """One GUI session's connection to the daemon.
+
+    A reader thread puts each batch the daemon pushes on ``inbox``; the Tk
+    loop collects them with take() and calls ack() once they are shown.
+    ``closed`` is set when the daemon goes away.
+    """
+
+    def __init__(self, sock, user):
+        self._sock = sock
+        self.inbox = queue.Queue()
+        self.closed = False
+        self._shown = set()
+        self._unacked = []
+        self._send({"hello": user})
+        threading.Thread(target=self._read, name="reminder-client", daemon=True).start()
+
+    @classmethod
+    def connect(cls, user, path=REMINDER_SOCKET):
+        # None when no daemon is listening
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return cls(sock, user)
+        except OSError:
+            sock.close()
+            return None
+
+    def _send(self, message):
+        self._sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+    def _read(self):
+        try:
+            with self._sock.makefile("r", encoding="utf-8") as f:
+                for line in f:
+                    self.inbox.put(json.loads(line).get("reminders", []))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.closed = True
+
+    def take(self):
+        # notes that arrived since the last call, each id once even if the
+        # daemon sends it again
+        notes = []
+        while True:
+            try:
+                batch = self.inbox.get_nowait()
+            except queue.Empty:
+                return notes
+            for note in batch:
+                self._unacked.append(note["id"])
+                if note["id"] not in self._shown:
+                    self._shown.add(note["id"])
+                    notes.append(note)
+
+    def ack(self):
+        if not self._unacked:
+            return
+        try:
+            self._send({"ack": self._unacked})
+        except OSError:
+            self.closed = True
+            return
+        self._unacked = []
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
@@ -0,0 +1,134 @@
+import heapq
+from datetime import datetime
+
+from metrics import REMINDER_SCAN, REMINDERS_FIRED
+from models import format_date, format_datetime
+from task_store import visible_to
+
+# longest single sleep; Tk timers do not follow wall-clock jumps and stop
+# counting while the machine is suspended, so wake up at least this often to
+# compare against the real clock and catch up on anything overdue
+MAX_SLEEP_MS = 5 * 60 * 1000
+
+
+def reminder_note(task):
+    # what a GUI shows for one fired reminder; the id names this task's
+    # reminder at this time, so moving the reminder makes a new one
+    return {
+        "id": f"{task.id}@{format_datetime(task.reminder_time)}",
+        "task_id": task.id,
+        "user": task.created_by or "guest",
+        "title": task.title,
+        "description": task.description,
+        "deadline": format_date(task.deadline),
+        "priority": task.priority.value,
+        "reminder_time": format_datetime(task.reminder_time),
+    }
+
+
+class ReminderScheduler:
+    """Fires reminders from a min-heap of (reminder_time, task_id).
+
+    The heap is kept current from TaskStore change events and a single timer
+    is armed for the earliest entry. Entries are invalidated lazily: an entry
+    only counts if it still matches ``_pending[task_id]``.
+
+    ``schedule(ms, callback)`` / ``cancel(handle)`` are ``root.after`` /
+    ``root.after_cancel`` in the GUI; ``on_due(tasks)`` receives every task
+    whose reminder has passed, in reminder order.
+    """
+
+    def __init__(self, store, user, schedule, cancel, on_due):
+        self.store = store
+        self.user = user
+        self._schedule = schedule
+        self._cancel = cancel
+        self.on_due = on_due
+        self._heap = []
+        self._pending = {}
+        self._timer = None
+        self._timer_at = None
+
+    def start(self):
+        self._rebuild()
+        self.store.subscribe(self._on_change)
+        self._arm()
+
+    def stop(self):
+        self.store.unsubscribe(self._on_change)
+        self._disarm()
+        self._heap = []
+        self._pending = {}
+
+    def _wants(self, task):
+        if not visible_to(task, self.user):
+            return None
+        if task.completed or task.notified:
+            return None
+        return task.reminder_time
+
+    def _rebuild(self):
+        with REMINDER_SCAN.time():
+            self._pending = {}
+            for t in self.store.with_status(False, self.user):
+                when = self._wants(t)
+                if when is not None:
+                    self._pending[t.id] = when
+            self._heap = [(when, task_id) for task_id, when in self._pending.items()]
+            heapq.heapify(self._heap)
+
+    def _on_change(self, op, task):
+        if op == "reload":
+            self._rebuild()
+        else:
+            when = None if op == "delete" else self._wants(task)
+            if when is None:
+                self._pending.pop(task.id, None)
+            elif self._pending.get(task.id) != when:
+                self._pending[task.id] = when
+                heapq.heappush(self._heap, (when, task.id))
+        self._arm()
+
+    def _next_due(self):
+        # drop entries made stale by edits or deletes
+        while self._heap:
+            when, task_id = self._heap[0]
+            if self._pending.get(task_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def _arm(self):
+        when = self._next_due()
+        if when is None:
+            self._disarm()
+            return
+        if self._timer is not None and self._timer_at == when:
+            # already armed for this entry
+            return
+        self._disarm()
+        delay = (when - datetime.now()).total_seconds() * 1000
+        delay = int(min(max(delay, 0), MAX_SLEEP_MS))
+        self._timer_at = when if delay < MAX_SLEEP_MS else None
+        self._timer = self._schedule(delay, self._fire)
+
+    def _disarm(self):
+        if self._timer is not None:
+            self._cancel(self._timer)
+        self._timer = None
+        self._timer_at = None
+
+    def _fire(self):
+        self._timer = None
+        self._timer_at = None
+        now = datetime.now()
+        due = []
+        with REMINDER_SCAN.time():
+            while self._next_due() is not None and self._heap[0][0] <= now:
+                task_id = heapq.heappop(self._heap)[1]
+                del self._pending[task_id]
+                due.append(self.store.get(task_id))
+        if due:
+            REMINDERS_FIRED.inc(len(due))
+            self.on_due(due)
+        self._arm()
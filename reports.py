@@ -0,0 +1,226 @@
+import csv
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from metrics import REPORT_SECONDS, REPORTS_WRITTEN
+from models import format_date, format_datetime
+from storage import atomic_write_json
+
+REPORTS_DIR = "reports"
+ROLLUP_FILE = os.path.join(REPORTS_DIR, "rollups.json")
+
+DETAIL_HEADER = ["Title", "Description", "Deadline", "Priority", "Progress", "Created At", "End Time"]
+
+
+def report_filename(user, year, month, reports_dir=REPORTS_DIR):
+    return os.path.join(reports_dir, f"report_{user}_{year}_{month:02d}.csv")
+
+
+def detail_row(task):
+    return [task.title, task.description, format_date(task.deadline), task.priority.value,
+            task.progress, format_datetime(task.created_at), format_datetime(task.end_time)]
+
+
+def average_completion(count, seconds):
+    if not count:
+        return ""
+    return str(timedelta(seconds=int(seconds / count)))
+
+
+def month_totals(completed):
+    # [tasks, those with a created_at, their summed completion seconds]
+    timed = 0
+    seconds = 0
+    for t in completed:
+        if t.created_at is not None and t.end_time is not None:
+            seconds += (t.end_time - t.created_at).total_seconds()
+            timed += 1
+    return [len(completed), timed, seconds]
+
+
+def summarize(user_tasks, completed):
+    # the numbers at the top of a monthly report
+    count, timed, seconds = month_totals(completed)
+    return {"total": len(user_tasks), "completed": count, "average": average_completion(timed, seconds)}
+
+
+def monthly_report(store, user, year, month):
+    # the summary and detail rows of one user's report for one month;
+    # archived tasks count towards the total, and those that ended in the
+    # month are listed after the current ones
+    user_tasks = store.for_user(user)
+    completed = store.completed_in_month(user, year, month)
+    archived = [t for t in completed if t.id not in store]
+    summary = summarize(user_tasks, completed)
+    summary["total"] += store.archive.count(user)
+    return summary, [detail_row(t) for t in user_tasks + archived]
+
+
+def write_report(filename, user, year, month, summary, rows):
+    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["User", user])
+        writer.writerow(["Year", year])
+        writer.writerow(["Month", month])
+        writer.writerow(["Total Tasks", summary["total"]])
+        writer.writerow(["Completed", summary["completed"]])
+        writer.writerow(["Pending", summary["total"] - summary["completed"]])
+        writer.writerow(["Average Completion Time", summary["average"]])
+        writer.writerow([])
+        writer.writerow(DETAIL_HEADER)
+        writer.writerows(rows)
+
+
+# ---------------- Rollups ----------------
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+class Rollups:
+    """What the last batch runs worked out, per (user, month).
+
+    ``months[user][YYYY-MM]`` is ``[completed, timed, seconds]``: tasks whose
+    end_time falls in the month, how many of those have a created_at, and
+    their summed completion time. ``written[user][YYYY-MM]`` is the user's
+    change stamp (see changelog.py) when that report file was written; the
+    file is stale once the stamp moves on. ``window`` is the recurrence
+    window the reports saw, since its occurrences are listed too.
+    """
+
+    def __init__(self):
+        self.months = {}
+        self.written = {}
+        self.window = None
+
+    @classmethod
+    def load(cls, path=ROLLUP_FILE):
+        rollups = cls()
+        if not os.path.exists(path):
+            return rollups
+        with open(path, "r") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return rollups
+        rollups.months = data.get("months", {})
+        rollups.written = data.get("written", {})
+        rollups.window = data.get("window")
+        return rollups
+
+    def save(self, path=ROLLUP_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write_json({"months": self.months, "written": self.written, "window": self.window}, path)
+
+    def stale(self, user, months, stamp, reports_dir=REPORTS_DIR):
+        # the months whose report is older than the user's last change
+        written = self.written.get(user, {})
+        return [(y, m) for y, m in months
+                if written.get(month_key(y, m), -1) < stamp or not os.path.exists(report_filename(user, y, m, reports_dir))]
+
+    def record(self, user, stamp, cells):
+        for key, cell in cells.items():
+            self.written.setdefault(user, {})[key] = stamp
+            if cell[0]:
+                self.months.setdefault(user, {})[key] = cell
+            else:
+                self.months.get(user, {}).pop(key, None)
+
+
+# ---------------- Batch reports ----------------
+# the fields of a task a report uses; far cheaper to send to a worker
+# process than the Task itself
+ReportTask = namedtuple("ReportTask", "title description deadline priority progress created_at end_time")
+
+
+def report_task(task):
+    return ReportTask(task.title, task.description, task.deadline, task.priority, task.progress,
+                      task.created_at, task.end_time)
+
+
+def month_range(start, end):
+    # inclusive range of (year, month) between two (year, month) pairs
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def _user_reports(user, months, tasks, archived, total, reports_dir):
+    # runs in a worker process: one user's numbers and files for the given
+    # months, from their current tasks and those archived in each month
+    cells = {}
+    written = []
+    rows = [detail_row(t) for t in tasks]
+    for year, month in months:
+        key = month_key(year, month)
+        completed = [t for t in tasks if t.end_time is not None and t.end_time.year == year
+                     and t.end_time.month == month] + archived[key]
+        cells[key] = month_totals(completed)
+        count, timed, seconds = cells[key]
+        summary = {"total": total, "completed": count, "average": average_completion(timed, seconds)}
+        filename = report_filename(user, year, month, reports_dir)
+        write_report(filename, user, year, month, summary, rows + [detail_row(t) for t in archived[key]])
+        written.append(filename)
+    return user, cells, written
+
+
+def generate_reports(store, start, end, users=None, workers=None, force=False,
+                     reports_dir=REPORTS_DIR, rollup_path=ROLLUP_FILE):
+    with REPORT_SECONDS.time():
+        written = _generate_reports(store, start, end, users, workers, force, reports_dir, rollup_path)
+    REPORTS_WRITTEN.inc(len(written))
+    return written
+
+
+def _generate_reports(store, start, end, users, workers, force, reports_dir, rollup_path):
+    # CSV reports for every user (or the given ones) and every month in
+    # [start, end]; a file is only rewritten when its user's tasks changed
+    # since it was written, or it is missing, unless force is set.
+    #
+    # The stamps are read before the tasks (store may be TaskStore(load=False)):
+    # an edit saved in between is then in the reports and also newer than the
+    # stamp they are recorded with, so at worst the next run redoes them. The
+    # other way round a report could keep the old data under the new stamp.
+    os.makedirs(reports_dir, exist_ok=True)
+    rollups = Rollups.load(rollup_path)
+    stamps = store.changes.stamps()
+    if store.loaded:
+        store.pull()
+    else:
+        store.reload()
+    window = [format_date(day) for day in store.window]
+    # occurrences moved in or out of every series' listing
+    moved = set() if rollups.window == window else {s.created_by or "" for s in store.series()}
+    if users:
+        # the ones not reported now are redone on a later run
+        store.changes.note(moved.difference(users))
+    months = list(month_range(start, end))
+    jobs = []
+    # users whose tasks have all been archived still get their reports
+    everyone = set(store.users()).union(*store.archive.counts().values())
+    for user in sorted(u for u in (users or everyone) if u):
+        stamp = stamps.get(user, 0)
+        todo = months if force or user in moved else rollups.stale(user, months, stamp, reports_dir)
+        if not todo:
+            continue
+        archived = {month_key(y, m): [report_task(t) for t in store.archive.completed_in_month(user, y, m)
+                                      if t.id not in store]
+                    for y, m in todo}
+        tasks = [report_task(t) for t in store.for_user(user)]
+        jobs.append((user, todo, tasks, archived, len(tasks) + store.archive.count(user)))
+    written = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_user_reports, *job, reports_dir) for job in jobs]
+            for future in futures:
+                user, cells, files = future.result()
+                rollups.record(user, stamps.get(user, 0), cells)
+                written.extend(files)
+    rollups.window = window
+    rollups.save(rollup_path)
+    return written
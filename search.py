@@ -0,0 +1,153 @@
+import bisect
+import re
+
+from storage import gc_paused
+from task_store import visible_to
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return set(_WORD.findall(text.lower())) if text else set()
+
+
+def task_tokens(task):
+    return tokenize(f"{task.title} {task.description}")
+
+
+class SearchIndex:
+    """Inverted index over task titles and descriptions.
+
+    ``postings[token]`` is the set of task ids containing the token and
+    ``vocabulary`` the distinct tokens in sorted order, so every token
+    starting with a query word is one bisect away. Kept current from
+    TaskStore change events; built on the first search rather than at
+    startup. A query matches tasks that have, for every word in it, some
+    token starting with that word.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.postings = {}
+        self.vocabulary = []
+        # id -> (title, description, tokens) last indexed, and id -> creation
+        # sequence so results come back in store order without a scan
+        self._docs = {}
+        self._seq = {}
+        self._next_seq = 0
+        self._built = False
+        store.subscribe(self._on_change)
+
+    def close(self):
+        self.store.unsubscribe(self._on_change)
+
+    def _build(self):
+        self.postings = {}
+        self.vocabulary = []
+        self._docs = {}
+        self._seq = {}
+        self._next_seq = 0
+        postings = self.postings
+        # a set per token adds up to a lot of allocations; the cyclic
+        # collector has nothing to find in them and would double the time
+        with gc_paused():
+            for task in self.store.all():
+                tokens = task_tokens(task)
+                self._docs[task.id] = (task.title, task.description, tokens)
+                self._seq[task.id] = self._next_seq
+                self._next_seq += 1
+                for token in tokens:
+                    ids = postings.get(token)
+                    if ids is None:
+                        ids = postings[token] = set()
+                    ids.add(task.id)
+        # sorted once here; single edits keep it sorted with insort
+        self.vocabulary = sorted(postings)
+        self._built = True
+
+    def _on_change(self, op, task):
+        if not self._built:
+            return
+        if op == "reload":
+            self._build()
+        elif op == "delete":
+            self._remove(task.id)
+            self._seq.pop(task.id, None)
+        elif op == "create" or task.id not in self._docs:
+            self._add(task)
+        else:
+            title, description, _ = self._docs[task.id]
+            if (title, description) != (task.title, task.description):
+                self._remove(task.id)
+                self._add(task)
+
+    def _add(self, task):
+        tokens = task_tokens(task)
+        self._docs[task.id] = (task.title, task.description, tokens)
+        if task.id not in self._seq:
+            self._seq[task.id] = self._next_seq
+            self._next_seq += 1
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            ids.add(task.id)
+
+    def _remove(self, task_id):
+        doc = self._docs.pop(task_id, None)
+        if doc is None:
+            return
+        for token in doc[2]:
+            ids = self.postings[token]
+            ids.discard(task_id)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def _prefix_ids(self, prefix):
+        ids = set()
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            ids |= self.postings[self.vocabulary[i]]
+            i += 1
+        return ids
+
+    def matching_ids(self, query):
+        # ids of tasks matching every word of the query, or None for a
+        # query with no words in it
+        if not self._built:
+            self._build()
+        words = sorted(tokenize(query), key=len, reverse=True)
+        if not words:
+            return None
+        # longest word first: it has the fewest prefix matches
+        found = self._prefix_ids(words[0])
+        for word in words[1:]:
+            if not found:
+                break
+            found &= self._prefix_ids(word)
+        return found
+
+    def search_archived(self, query, user):
+        # archived tasks the user may see that match the query, newest month
+        # first; the archive is not indexed, so this reads every month
+        words = tokenize(query)
+        found = []
+        for month in reversed(self.store.archive.months()):
+            for task in self.store.archive.for_user(user, [month]):
+                if task.id in self.store:
+                    continue
+                tokens = task_tokens(task)
+                if all(any(t.startswith(w) for t in tokens) for w in words):
+                    found.append(task)
+        return found
+
+    def search(self, query, user):
+        # tasks the user may see that match the query, in store order; an
+        # empty query gives the same list refresh_tasks shows
+        found = self.matching_ids(query)
+        if found is None:
+            return self.store.for_user(user)
+        tasks = [self.store.get(i) for i in sorted(found, key=self._seq.__getitem__)]
+        return [t for t in tasks if t is not None and visible_to(t, user)]
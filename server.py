@@ -0,0 +1,349 @@
+import asyncio
+import base64
+import json
+import mimetypes
+import os
+import zlib
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from background import roll_window, watch_store, write_metrics
+from models import DATE_FIELDS, DATETIME_FIELDS, Priority, new_task, parse_date, parse_datetime
+from recurrence import make_series, parse_rule
+from accounts import Sessions, UserDirectory, verify_async
+from search import SearchIndex
+from task_store import visible_to
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+INDEX_FILE = os.path.join(BASE_DIR, "templates", "index.html")
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+MAX_BODY_BYTES = 10 * 1024 * 1024
+EDITABLE_FIELDS = ("title", "description", "deadline", "priority", "progress", "completed",
+                   "end_time", "reminder_time")
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+           401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def task_changes(data):
+    # validated field changes from a JSON object, with the same follow-on
+    # rules as the GUI: completing sets progress and end time, reopening
+    # clears them
+    if not isinstance(data, dict):
+        raise HttpError(400, "Expected a JSON object.")
+    changes = {}
+    for name, value in data.items():
+        if name == "id":
+            continue
+        if name not in EDITABLE_FIELDS:
+            raise HttpError(400, f"Field '{name}' cannot be changed.")
+        if name in DATE_FIELDS or name in DATETIME_FIELDS:
+            parse = parse_date if name in DATE_FIELDS else parse_datetime
+            if value and parse(value) is None:
+                raise HttpError(400, f"Invalid {name}: {value!r}")
+            value = parse(value)
+        elif name == "priority":
+            if value not in [p.value for p in Priority]:
+                raise HttpError(400, "Priority must be High, Medium or Low.")
+        elif name == "progress":
+            if not isinstance(value, int) or not 0 <= value <= 100:
+                raise HttpError(400, "Progress must be an integer from 0 to 100.")
+        elif name == "completed":
+            value = bool(value)
+        changes[name] = value
+    if "progress" in changes:
+        changes.setdefault("completed", changes["progress"] == 100)
+    if changes.get("completed") is True:
+        changes.setdefault("progress", 100)
+        changes.setdefault("end_time", datetime.now())
+    elif changes.get("completed") is False:
+        changes.setdefault("end_time", None)
+        if changes.get("progress", 100) == 100:
+            changes["progress"] = 0
+    if "reminder_time" in changes:
+        changes["notified"] = False
+    return changes
+
+
+class ApiServer:
+    """HTTP/1.1 JSON API over a TaskStore, for static/app.js and scripts.
+
+    Runs on one asyncio loop and answers from the in-memory store; writes go
+    through a BackgroundSaver so a large save never stalls the loop. Requests authenticate with HTTP Basic against the user
+    table or with a token from POST /session; with ``allow_guest`` unauthenticated requests act as "guest", who
+    sees every task just like in the GUI. Task lists carry a per-user ETag
+    so pollers get 304s until something they can see changes.
+    """
+
+    def __init__(self, store, saver, allow_guest=False):
+        self.store = store
+        self.saver = saver
+        self.allow_guest = allow_guest
+        self.users = UserDirectory()
+        self.sessions = Sessions()
+        self.search = SearchIndex(store)
+        # the counters restart with the process; the nonce keeps an ETag
+        # from before a restart from matching
+        self._nonce = os.urandom(4).hex()
+        self._generation = 0
+        self._revisions = {}
+        self._all_revision = 0
+        store.subscribe(self._on_change)
+
+    def _on_change(self, op, task):
+        self._all_revision += 1
+        if task is None:
+            self._generation += 1
+            self._revisions.clear()
+        else:
+            self._revisions[task.created_by] = self._revisions.get(task.created_by, 0) + 1
+
+    def _etag(self, user, query):
+        rev = self._all_revision if user == "guest" else self._revisions.get(user, 0)
+        return f'W/"{self._nonce}.{self._generation}.{rev}.{zlib.crc32(query.encode("utf-8")):x}"'
+
+    # ---------------- HTTP plumbing ----------------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, 413, {"error": "Request body too large."}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    status, payload, extra = await self.dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status, payload, extra = e.status, {"error": e.message}, {}
+                    if e.status == 401:
+                        extra = {"WWW-Authenticate": 'Basic realm="Time Management System"'}
+                await self._send(writer, status, payload, extra, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, payload, extra=None, close=False):
+        headers = dict(extra or {})
+        if isinstance(payload, bytes):
+            body = payload
+        elif payload is None:
+            body = b""
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        headers["Content-Length"] = str(len(body))
+        if close:
+            headers["Connection"] = "close"
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def authenticate(self, headers):
+        # a session token, or Basic credentials checked on the KDF pool so
+        # the event loop keeps serving; credentials that passed once are
+        # remembered like a session
+        auth = headers.get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            user = self.sessions.user(auth[7:].strip())
+            if user is None:
+                raise HttpError(401, "Session expired; log in again.")
+            return user
+        if auth.lower().startswith("basic "):
+            try:
+                username, _, password = base64.b64decode(auth[6:]).decode("utf-8").partition(":")
+            except ValueError:
+                raise HttpError(401, "Invalid credentials.")
+            if self.sessions.verified(username, password, self.users.password_hash(username)):
+                return username
+            if not await asyncio.wrap_future(verify_async(self.users, username, password)):
+                raise HttpError(401, "Invalid credentials.")
+            # read again: a login can upgrade the hash
+            self.sessions.remember(username, password, self.users.password_hash(username))
+            return username
+        if self.allow_guest:
+            return "guest"
+        raise HttpError(401, "Login required.")
+
+    # ---------------- Routing ----------------
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if method == "GET" and not parts:
+            return 200, self._read_file(INDEX_FILE), {"Content-Type": "text/html; charset=utf-8"}
+        if method == "GET" and parts[0] == "static" and len(parts) == 2:
+            path = os.path.join(STATIC_DIR, os.path.basename(parts[1]))
+            ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            return 200, self._read_file(path), {"Content-Type": ctype}
+        if parts == ["session"]:
+            return await self.session(method, headers)
+        if not parts or parts[0] != "tasks":
+            raise HttpError(404, "Not found.")
+
+        user = await self.authenticate(headers)
+        data = None
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise HttpError(400, "Body is not valid JSON.")
+
+        if len(parts) == 1:
+            if method == "GET":
+                return self.list_tasks(user, url.query, headers)
+            if method == "POST":
+                return 201, self.create_tasks(user, [data])[0], {}
+        elif parts[1] == "bulk":
+            if not isinstance(data, list):
+                raise HttpError(400, "Expected a JSON array.")
+            if method == "POST":
+                return 201, self.create_tasks(user, data), {}
+            if method == "PATCH":
+                return 200, self.update_tasks(user, data), {}
+        elif len(parts) == 2:
+            task_id = parts[1]
+            if method == "GET":
+                return 200, self._owned(user, task_id).to_dict(), {}
+            if method == "PATCH":
+                return 200, self.update_tasks(user, [dict(data or {}, id=task_id)])[0], {}
+            if method == "DELETE":
+                self._owned(user, task_id)
+                self.store.delete(task_id)
+                self.saver.schedule()
+                return 204, None, {}
+        elif len(parts) == 3 and parts[2] == "complete" and method == "POST":
+            return 200, self.update_tasks(user, [{"id": parts[1], "completed": True}])[0], {}
+        raise HttpError(405, "Method not allowed.")
+
+    async def session(self, method, headers):
+        # POST with Basic credentials returns a token to send as
+        # "Authorization: Bearer <token>"; DELETE with the token ends it
+        if method == "POST":
+            user = await self.authenticate(headers)
+            return 201, {"token": self.sessions.create(user), "user": user, "expires_in": self.sessions.ttl}, {}
+        if method == "DELETE":
+            auth = headers.get("authorization", "")
+            if auth.lower().startswith("bearer "):
+                self.sessions.revoke(auth[7:].strip())
+            return 204, None, {}
+        raise HttpError(405, "Method not allowed.")
+
+    def _read_file(self, path):
+        if not os.path.isfile(path):
+            raise HttpError(404, "Not found.")
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _owned(self, user, task_id):
+        task = self.store.get(task_id)
+        if task is None or not visible_to(task, user):
+            # other users' tasks are reported as missing, not forbidden
+            raise HttpError(404, "Task not found.")
+        return task
+
+    # ---------------- Handlers ----------------
+    def list_tasks(self, user, query, headers):
+        etag = self._etag(user, query)
+        if headers.get("if-none-match") == etag:
+            return 304, None, {"ETag": etag}
+        params = parse_qs(query)
+        status = params.get("status", [None])[0]
+        priority = params.get("priority", [None])[0]
+        query = params.get("q", [""])[0]
+        try:
+            offset = max(0, int(params.get("offset", [0])[0]))
+            limit = min(MAX_PAGE_SIZE, max(0, int(params.get("limit", [DEFAULT_PAGE_SIZE])[0])))
+        except ValueError:
+            raise HttpError(400, "offset and limit must be integers.")
+        if status not in (None, "open", "completed"):
+            raise HttpError(400, "status must be open or completed.")
+        if query.strip():
+            tasks = self.search.search(query, user)
+            if status is not None:
+                tasks = [t for t in tasks if t.completed == (status == "completed")]
+        elif status is not None:
+            tasks = self.store.with_status(status == "completed", user)
+        else:
+            tasks = self.store.for_user(user)
+        if priority is not None:
+            tasks = [t for t in tasks if t.priority.value == priority]
+        page = [t.to_dict() for t in tasks[offset:offset + limit]]
+        return 200, page, {"ETag": etag, "X-Total-Count": str(len(tasks))}
+
+    def create_tasks(self, user, items):
+        tasks = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise HttpError(400, "Expected a JSON object.")
+            try:
+                task = new_task(item.get("title"), item.get("deadline"), item.get("priority", "Medium"),
+                                item.get("description", ""), user)
+                if item.get("repeat"):
+                    make_series(task, parse_rule(item["repeat"]))
+                tasks.append(task)
+            except ValueError as e:
+                raise HttpError(400, str(e))
+        # validate everything before touching the store so a bulk request
+        # is applied completely or not at all
+        for task in tasks:
+            self.store.add(task)
+        self.saver.schedule()
+        return [t.to_dict() for t in tasks]
+
+    def update_tasks(self, user, items):
+        planned = []
+        for item in items:
+            if not isinstance(item, dict) or "id" not in item:
+                raise HttpError(400, "Each update needs an id.")
+            self._owned(user, item["id"])
+            planned.append((item["id"], task_changes(item)))
+        for task_id, changes in planned:
+            self.store.update(task_id, **changes)
+        self.saver.schedule()
+        return [self.store.get(task_id).to_dict() for task_id, _ in planned]
+
+
+async def serve(store, saver, host="127.0.0.1", port=8000, allow_guest=False):
+    api = ApiServer(store, saver, allow_guest=allow_guest)
+    server = await asyncio.start_server(api.handle, host, port)
+    loop = asyncio.get_running_loop()
+    background = [loop.create_task(write_metrics()), loop.create_task(roll_window(store))]
+    if store.shared:
+        # other instances' edits reach the store's listeners, which bump the
+        # ETags of whoever can see them
+        background.append(loop.create_task(watch_store(store)))
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            for task in background:
+                task.cancel()
@@ -0,0 +1,185 @@
+import json
+import sqlite3
+
+from storage import TASK_FILE, USER_FILE, load_tasks, save_tasks, read_users_file
+
+DB_FILE = "tasks.db"
+
+# columns that get their own SQL column; anything else a task carries is kept
+# in the "extra" JSON column so no field is lost on a round trip
+TASK_COLUMNS = ("title", "description", "deadline", "priority", "completed", "progress",
+                "end_time", "reminder_time", "notified", "created_by", "created_at")
+BOOL_COLUMNS = ("completed", "notified")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    deadline TEXT NOT NULL DEFAULT '',
+    priority TEXT NOT NULL DEFAULT '',
+    completed INTEGER NOT NULL DEFAULT 0,
+    progress INTEGER NOT NULL DEFAULT 0,
+    end_time TEXT NOT NULL DEFAULT '',
+    reminder_time TEXT NOT NULL DEFAULT '',
+    notified INTEGER NOT NULL DEFAULT 0,
+    created_by TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_by ON tasks (created_by);
+-- reminders are scheduled from the loaded tasks (reminders.py)
+DROP INDEX IF EXISTS idx_tasks_reminder_time;
+CREATE INDEX IF NOT EXISTS idx_tasks_end_time ON tasks (end_time);
+CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks (deadline);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def connect(db_path=DB_FILE):
+    # the store's lock serializes use of the connection, which a
+    # BackgroundSaver commits from its own thread
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _task_params(task):
+    # task is the JSON layout of a task
+    params = {"id": task["id"]}
+    for col in TASK_COLUMNS:
+        value = task.get(col)
+        if col in BOOL_COLUMNS:
+            value = int(bool(value))
+        elif value is None and col != "created_by":
+            value = 0 if col == "progress" else ""
+        params[col] = value
+    extra = {k: v for k, v in task.items() if k != "id" and k not in TASK_COLUMNS}
+    params["extra"] = json.dumps(extra) if extra else "{}"
+    return params
+
+
+def _row_to_task(row):
+    task = {"id": row[0]}
+    for col, value in zip(TASK_COLUMNS, row[1:]):
+        task[col] = bool(value) if col in BOOL_COLUMNS else value
+    task.update(json.loads(row[-1]))
+    return task
+
+
+_SELECT = f"SELECT id, {', '.join(TASK_COLUMNS)}, extra FROM tasks"
+_INSERT = (f"INSERT OR REPLACE INTO tasks (id, {', '.join(TASK_COLUMNS)}, extra) "
+           f"VALUES (:id, {', '.join(':' + c for c in TASK_COLUMNS)}, :extra)")
+
+
+class SqliteTaskBackend:
+    """TaskStore backend writing each mutation through to SQLite.
+
+    Besides load/record/commit it answers the report queries from the
+    created_by/end_time indexes, which TaskStore uses in place of scanning
+    its own tasks.
+    """
+
+    incremental = True
+
+    def __init__(self, db_path=DB_FILE):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        # inserts are batched into one executemany; anything that reads or
+        # changes existing rows flushes them first
+        self._inserts = []
+
+    def _flush_inserts(self):
+        if self._inserts:
+            self.conn.executemany(_INSERT, self._inserts)
+            self._inserts = []
+
+    def load(self):
+        return [_row_to_task(r) for r in self.conn.execute(_SELECT + " ORDER BY rowid")]
+
+    def record(self, op, task, fields=None):
+        if op == "create":
+            self._inserts.append(_task_params(task.to_dict()))
+            return
+        self._flush_inserts()
+        if op == "delete":
+            self.conn.execute("DELETE FROM tasks WHERE id = ?", (task.id,))
+        else:
+            changes = task.field_dict(fields)
+            cols = [c for c in changes if c in TASK_COLUMNS]
+            if cols:
+                values = [int(bool(changes[c])) if c in BOOL_COLUMNS else changes[c] for c in cols]
+                self.conn.execute(f"UPDATE tasks SET {', '.join(c + ' = ?' for c in cols)} WHERE id = ?",
+                                  values + [task.id])
+            if any(c not in TASK_COLUMNS for c in changes):
+                self.conn.execute("UPDATE tasks SET extra = ? WHERE id = ?", (json.dumps(task.extra), task.id))
+
+    def commit(self, store):
+        self._flush_inserts()
+        self.conn.commit()
+
+    def append(self, tasks):
+        self._inserts.extend(_task_params(t.to_dict()) for t in tasks)
+        self.commit(None)
+
+    def rewrite(self, store):
+        self._inserts = []
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks")
+            self.conn.executemany(_INSERT, [_task_params(t) for t in store.to_list()])
+
+    def close(self):
+        self._flush_inserts()
+        self.conn.commit()
+        self.conn.close()
+
+    # ---------------- Indexed queries ----------------
+    # timestamps are stored as "YYYY-MM-DD HH:MM[:SS]" strings, which order
+    # the same way as the datetimes they spell, so plain string ranges work
+
+    def completed_in_month_ids(self, user, year, month):
+        self._flush_inserts()
+        start = f"{year:04d}-{month:02d}-01"
+        end = f"{year + 1:04d}-01-01" if month == 12 else f"{year:04d}-{month + 1:02d}-01"
+        sql = "SELECT id FROM tasks WHERE end_time >= ? AND end_time < ?"
+        params = [start, end]
+        if user != "guest":
+            sql += " AND created_by = ?"
+            params.append(user)
+        return [r[0] for r in self.conn.execute(sql + " ORDER BY rowid", params)]
+
+    # ---------------- Users ----------------
+    def load_users(self):
+        return {name: json.loads(data) for name, data in self.conn.execute("SELECT username, data FROM users")}
+
+    def save_users(self, users):
+        with self.conn:
+            self.conn.execute("DELETE FROM users")
+            self.conn.executemany("INSERT INTO users (username, data) VALUES (?, ?)",
+                                  [(name, json.dumps(data)) for name, data in users.items()])
+
+
+def migrate(task_file=TASK_FILE, user_file=USER_FILE, db_path=DB_FILE):
+    # one-shot import of the JSON files; re-running it replaces rows by id
+    from task_store import new_task_id
+
+    tasks = load_tasks(task_file)
+    users = read_users_file(user_file)
+    missing = [t for t in tasks if not t.get("id")]
+    for t in missing:
+        t["id"] = new_task_id()
+    if missing:
+        # keep the ids so a second run updates rows instead of duplicating them
+        save_tasks(tasks, task_file)
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(_INSERT, [_task_params(t) for t in tasks])
+        conn.executemany("INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+                         [(name, json.dumps(data)) for name, data in users.items()])
+    conn.close()
+    return len(tasks), len(users)
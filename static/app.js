@@ -16,7 +16,7 @@
                     tasksDiv.innerHTML = "<p>No tasks found!</p>";
                     return;
                 }
-                tasks.forEach((task, idx) => {
+                tasks.forEach(task => {
                     const taskEl = document.createElement("div");
                     taskEl.className = "task" + (task.completed ? " completed" : "");
                     taskEl.innerHTML = `
@@ -24,8 +24,8 @@
                             <strong>${task.title}</strong> | Deadline: ${task.deadline} | Priority: ${task.priority}
                         </span>
                         <span class="task-actions">
-                            <button onclick="completeTask(${idx})" ${task.completed ? "disabled" : ""}>Complete</button>
-                            <button onclick="deleteTask(${idx})">Delete</button>
+                            <button onclick="completeTask('${task.id}')" ${task.completed ? "disabled" : ""}>Complete</button>
+                            <button onclick="deleteTask('${task.id}')">Delete</button>
                         </span>
                     `;
                     tasksDiv.appendChild(taskEl);
@@ -54,13 +54,13 @@
         .catch(alert);
     };
 
-    window.completeTask = function(idx) {
-        fetch(`/tasks/${idx}/complete`, { method: "POST" })
+    window.completeTask = function(id) {
+        fetch(`/tasks/${id}/complete`, { method: "POST" })
             .then(() => fetchTasks());
     };
 
-    window.deleteTask = function(idx) {
-        fetch(`/tasks/${idx}`, { method: "DELETE" })
+    window.deleteTask = function(id) {
+        fetch(`/tasks/${id}`, { method: "DELETE" })
             .then(() => fetchTasks());
     };
 
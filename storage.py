@@ -0,0 +1,509 @@
+import gc
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import STORAGE_BYTES, STORAGE_LOAD, STORAGE_WRITE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+TASK_FILE = "tasks.json"
+USER_FILE = "users.json"
+
+# "json" rewrites tasks.json on every save, "journal" appends changes to
+# tasks.json.journal and folds them back into tasks.json in the background,
+# "sqlite" keeps tasks and users in tasks.db (see sqlite_store.py),
+# "columnar" rewrites the binary tasks.tmsc (see columnar.py)
+STORAGE_MODE = os.environ.get("TMS_STORAGE", "json")
+# the journal is folded into the snapshot once it passes this fraction of
+# the snapshot's size, and at least JOURNAL_COMPACT_BYTES
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+JOURNAL_COMPACT_RATIO = 0.25
+# BackgroundSaver: write this long after the last change, but no later than
+# SAVE_MAX_DELAY after the first unsaved one
+SAVE_DELAY = 0.5
+SAVE_MAX_DELAY = 3.0
+
+
+class StorageError(Exception):
+    pass
+
+
+def _atomic_write(data, path, mode):
+    # write to a temp file in the same directory and rename over the target,
+    # so a crash leaves either the old or the new file, never half of one
+    tmp = f"{path}.tmp"
+    with STORAGE_WRITE.time():
+        with open(tmp, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    STORAGE_BYTES.inc(len(data), file=os.path.basename(path))
+
+def atomic_write_text(text, path):
+    _atomic_write(text, path, "w")
+
+def atomic_write_bytes(data, path):
+    _atomic_write(data, path, "wb")
+
+def atomic_write_json(obj, path, indent=None):
+    atomic_write_text(json.dumps(obj, indent=indent), path)
+
+class FileLock:
+    """Exclusive lock on ``<path>.lock``, held by whichever app instance is
+    currently rewriting ``path``."""
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+def file_stat(path):
+    # cheap "has this file been rewritten" check; None when it does not exist
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+@contextmanager
+def gc_paused():
+    # for loops allocating many small objects with no cycles among them,
+    # where the cyclic collector only adds time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def load_tasks(path=TASK_FILE):
+    if not os.path.exists(path):
+        return []
+    with STORAGE_LOAD.time(), open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return []
+
+_SEPARATOR = re.compile(r"[\s,]*")
+# peek_tasks reads no further than this, so it costs the same for any file size
+PEEK_BYTES = 1024 * 1024
+
+def peek_tasks(path, user, limit):
+    # up to limit task dicts from the start of a tasks.json (the user's,
+    # unless guest), decoding one object at a time
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read(PEEK_BYTES)
+    decoder = json.JSONDecoder()
+    found = []
+    pos = _SEPARATOR.match(text, text.find("[") + 1).end()
+    try:
+        while len(found) < limit and pos < len(text) and text[pos] != "]":
+            data, pos = decoder.raw_decode(text, pos)
+            if user == "guest" or data.get("created_by") == user:
+                found.append(data)
+            pos = _SEPARATOR.match(text, pos).end()
+    except json.JSONDecodeError:
+        # the object cut off at PEEK_BYTES
+        pass
+    return found
+
+def save_tasks(tasks, path=TASK_FILE):
+    atomic_write_json(tasks, path, indent=4)
+
+def hash_pw(password):
+    # the unsalted hash users.json held before accounts.hash_password; only
+    # used to check (and then upgrade) those old entries
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+def read_users_file(path=USER_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+def load_users(path=USER_FILE):
+    if STORAGE_MODE == "sqlite":
+        from sqlite_store import SqliteTaskBackend
+        backend = SqliteTaskBackend()
+        try:
+            return backend.load_users()
+        finally:
+            backend.close()
+    return read_users_file(path)
+
+def users_stat(path=USER_FILE):
+    # changes whenever load_users could return something different
+    if STORAGE_MODE == "sqlite":
+        from sqlite_store import DB_FILE
+        return file_stat(DB_FILE), file_stat(DB_FILE + "-wal")
+    return file_stat(path)
+
+def save_users(users, path=USER_FILE):
+    if STORAGE_MODE == "sqlite":
+        from sqlite_store import SqliteTaskBackend
+        backend = SqliteTaskBackend()
+        try:
+            backend.save_users(users)
+        finally:
+            backend.close()
+        return
+    atomic_write_json(users, path, indent=4)
+
+
+# ---------------- Task backends ----------------
+# A backend is what TaskStore persists through:
+#   load()            -> list of task dicts
+#   record(op, task, fields=None)
+#                     called for every create/update/delete with the Task;
+#                     for updates, fields names what changed
+#   commit(store)     make everything recorded so far durable; may return a
+#                     function doing the slow part of the write, which
+#                     TaskStore calls after releasing its lock
+#   rewrite(store)    replace the stored state with the store's full contents
+#   close()
+# optionally append(tasks), writing new Tasks straight to the file for bulk
+# loads that do not keep them in memory (see TaskStore.append),
+# and says whether commit() costs the size of the change (incremental) or of
+# the whole dataset, so bulk writers know how often they can afford to commit.
+#
+# A backend whose file several app instances may share sets ``shared`` and
+# also provides lock() (a context manager held around read-merge-write),
+# stat() and write(tasks), which like commit() returns the slow part; see
+# TaskStore.save and sync.py.
+
+class JsonTaskFile:
+    incremental = False
+    shared = True
+
+    def __init__(self, path=TASK_FILE):
+        self.path = path
+
+    def load(self):
+        return load_tasks(self.path)
+
+    def peek(self, user, limit):
+        return peek_tasks(self.path, user, limit)
+
+    def lock(self):
+        return FileLock(self.path)
+
+    def stat(self):
+        return file_stat(self.path)
+
+    def record(self, op, task, fields=None):
+        pass
+
+    def commit(self, store):
+        return self.write(store.to_list())
+
+    def write(self, tasks):
+        # serialize while the store is locked, hit the disk after
+        text = json.dumps(tasks, indent=4)
+        return lambda: atomic_write_text(text, self.path)
+
+    def rewrite(self, store):
+        return self.commit(store)
+
+    def close(self):
+        pass
+
+
+class JournalTaskFile:
+    """tasks.json snapshot plus an append-only JSONL journal of mutations.
+
+    A commit only appends the changed records, so its cost is the size of the
+    change. Once the journal passes ``compact_ratio`` of the snapshot's size
+    (and at least ``compact_bytes``) it is rotated to ``.journal.old`` and a
+    thread replays it over the snapshot file and writes the result, so the
+    store is not involved; the old journal is removed once the new snapshot
+    has been renamed into place. Replaying the old journal over a newer
+    snapshot is harmless because every record sets absolute values.
+    """
+
+    incremental = True
+
+    def __init__(self, path=TASK_FILE, compact_bytes=JOURNAL_COMPACT_BYTES, compact_ratio=JOURNAL_COMPACT_RATIO):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.old_journal_path = path + ".journal.old"
+        self.compact_bytes = compact_bytes
+        self.compact_ratio = compact_ratio
+        self._pending = []
+        self._journal = None
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._compactor = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        self.close()
+        tasks = self._read_state((self.old_journal_path, self.journal_path))
+        self._snapshot_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._journal = open(self.journal_path, "a")
+        self._journal_size = self._journal.tell()
+        return tasks
+
+    def _read_state(self, journals):
+        tasks = {}
+        anonymous = []
+        for t in self._read_snapshot():
+            if t.get("id"):
+                tasks[t["id"]] = t
+            else:
+                anonymous.append(t)
+        for path in journals:
+            self._replay(path, tasks)
+        # snapshots written before ids existed keep their id-less tasks first;
+        # TaskStore gives them ids and asks for a rewrite
+        return anonymous + list(tasks.values())
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError as e:
+                # never treat a damaged snapshot as "no tasks", the next
+                # compaction would make that permanent
+                raise StorageError(f"{self.path} is corrupt: {e}") from e
+
+    def _replay(self, path, tasks):
+        if not os.path.exists(path):
+            return
+        good = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                except ValueError:
+                    # torn write from a crash; everything after it is lost
+                    break
+                op, task_id = rec["op"], rec["id"]
+                if op == "create":
+                    tasks[task_id] = rec["task"]
+                elif op == "update":
+                    if task_id in tasks:
+                        tasks[task_id].update(rec["changes"])
+                elif op == "delete":
+                    tasks.pop(task_id, None)
+                good += len(line)
+        if good < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def record(self, op, task, fields=None):
+        if op == "create":
+            rec = {"op": op, "id": task.id, "task": task.to_dict()}
+        elif op == "update":
+            rec = {"op": op, "id": task.id, "changes": task.field_dict(fields)}
+        else:
+            rec = {"op": op, "id": task.id}
+        self._pending.append(json.dumps(rec) + "\n")
+
+    def commit(self, store):
+        # join the records while the store is locked, write and fsync after
+        if not self._pending:
+            return None
+        data = "".join(self._pending)
+        self._pending = []
+        return lambda: self._finish(data)
+
+    def append(self, tasks):
+        # after anything recorded and not yet committed
+        self._pending.extend(json.dumps({"op": "create", "id": t.id, "task": t.to_dict()}) + "\n" for t in tasks)
+        finish = self.commit(None)
+        if finish is not None:
+            finish()
+
+    def _finish(self, data):
+        try:
+            self._append(data)
+        except Exception:
+            # kept for the next commit, ahead of what was recorded since
+            self._pending.insert(0, data)
+            raise
+
+    def _append(self, data):
+        with self._lock, STORAGE_WRITE.time():
+            try:
+                self._journal.write(data)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            except Exception:
+                self._reopen()
+                raise
+            self._journal_size += len(data)
+        STORAGE_BYTES.inc(len(data), file=os.path.basename(self.journal_path))
+        if self._journal_size >= max(self.compact_bytes, self._snapshot_size * self.compact_ratio):
+            self.compact()
+
+    def _reopen(self):
+        # cuts off whatever part of a failed append reached the journal
+        try:
+            self._journal.close()
+        except OSError:
+            pass
+        with open(self.journal_path, "r+b") as f:
+            f.truncate(self._journal_size)
+        self._journal = open(self.journal_path, "a")
+
+    def rewrite(self, store):
+        # the store differs from what the files say (e.g. ids were just
+        # assigned), so its own state becomes the snapshot
+        self._pending = []
+        self._rotate()
+        self._write_snapshot(json.dumps(store.to_list(), indent=4))
+
+    def compact(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._rotate()
+        self._compactor = threading.Thread(target=self._compact_files, name="journal-compactor", daemon=True)
+        self._compactor.start()
+
+    def _rotate(self):
+        # moves the journal aside as .journal.old, which the next snapshot covers
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self._journal.close()
+            if os.path.exists(self.old_journal_path):
+                # a previous compaction died before finishing; the snapshot
+                # about to be written covers both journals
+                with open(self.old_journal_path, "a") as old, open(self.journal_path) as cur:
+                    old.write(cur.read())
+                os.remove(self.journal_path)
+            elif os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.old_journal_path)
+            self._journal = open(self.journal_path, "a")
+            self._journal_size = 0
+
+    def _compact_files(self):
+        # only this thread touches the snapshot and the old journal until
+        # the next _rotate, which waits for it
+        self._write_snapshot(json.dumps(self._read_state((self.old_journal_path,)), indent=4))
+
+    def _write_snapshot(self, text):
+        atomic_write_text(text, self.path)
+        self._snapshot_size = len(text)
+        if os.path.exists(self.old_journal_path):
+            os.remove(self.old_journal_path)
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class BackgroundSaver:
+    """Saves a TaskStore on a writer thread, a short while after the last change.
+
+    ``schedule()`` is cheap and can be called after every mutation: changes
+    arriving within ``delay`` seconds of each other are written together,
+    but never later than ``max_delay`` after the first one. ``flush()``
+    writes synchronously and is what logout and shutdown call.
+    """
+
+    def __init__(self, store, delay=SAVE_DELAY, max_delay=SAVE_MAX_DELAY):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max_delay
+        self.error = None
+        self._cond = threading.Condition()
+        self._due = None
+        self._deadline = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="task-writer", daemon=True)
+        self._thread.start()
+
+    def schedule(self):
+        with self._cond:
+            now = time.monotonic()
+            if self._deadline is None:
+                self._deadline = now + self.max_delay
+            self._due = min(now + self.delay, self._deadline)
+            self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            self._due = self._deadline = None
+        self.store.save()
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and (self._due is None or self._due > time.monotonic()):
+                    timeout = None if self._due is None else self._due - time.monotonic()
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+                self._due = self._deadline = None
+            try:
+                self.store.save()
+                self.error = None
+            except Exception as e:
+                # the store stays dirty; try again after the next delay
+                self.error = e
+                self.schedule()
+
+
+def open_task_backend(mode=None, path=TASK_FILE):
+    mode = mode or STORAGE_MODE
+    if mode == "json":
+        return JsonTaskFile(path)
+    if mode == "journal":
+        return JournalTaskFile(path)
+    if mode == "sqlite":
+        from sqlite_store import SqliteTaskBackend
+        return SqliteTaskBackend()
+    if mode == "columnar":
+        from columnar import ColumnarTaskFile
+        return ColumnarTaskFile()
+    raise StorageError(f"Unknown storage mode: {mode}")
@@ -0,0 +1,97 @@
+# Merging for several app instances sharing one tasks.json. Each instance
+# remembers, for every task it changed since its last write, the task as it
+# was on disk before (the base) and which fields it changed; when the file
+# turns out to have been rewritten by someone else in the meantime, the two
+# versions are merged against that base instead of one overwriting the other.
+
+
+class Pending:
+    """A local change not yet written: ``op`` is create/update/delete,
+    ``base`` the task's JSON as last seen on disk (for a stored occurrence,
+    as expanded from its series), ``fields`` what changed."""
+
+    __slots__ = ("op", "base", "fields")
+
+    def __init__(self, op, base=None):
+        self.op = op
+        self.base = base
+        self.fields = set()
+
+
+class Conflict:
+    __slots__ = ("task_id", "title", "fields", "reason")
+
+    def __init__(self, task_id, title, fields=(), reason="edited"):
+        self.task_id = task_id
+        self.title = title
+        self.fields = tuple(sorted(fields))
+        self.reason = reason
+
+    def describe(self):
+        if self.reason == "deleted":
+            return f"'{self.title}' was deleted by someone else; your changes to it were dropped."
+        if self.reason == "edited-deleted":
+            return f"'{self.title}' was changed by someone else, so it was not deleted."
+        return f"'{self.title}' was changed by someone else at the same time; kept their {', '.join(self.fields)}."
+
+
+def merge_task(base, mine, theirs, fields):
+    # three-way merge of one task's JSON. Returns (merged, conflicting fields).
+    # Fields only one side changed take that side's value; when both sides
+    # changed a field to different values the other instance's value stays,
+    # since it is already on disk and may have been seen by others.
+    if theirs.get("version", 0) == base.get("version", 0):
+        return mine, ()
+    merged = dict(theirs)
+    conflicts = []
+    for name in fields:
+        if name == "version":
+            continue
+        if theirs.get(name) == base.get(name) or theirs.get(name) == mine.get(name):
+            merged[name] = mine.get(name)
+        else:
+            conflicts.append(name)
+    merged["version"] = max(theirs.get("version", 0), mine.get("version", 0)) + 1
+    return merged, conflicts
+
+
+def merge_snapshot(disk, mine, pending):
+    # merged file contents from the tasks on disk, this instance's tasks
+    # (id -> JSON) and its pending changes. Returns (tasks, conflicts).
+    merged = []
+    conflicts = []
+    seen = set()
+    for theirs in disk:
+        task_id = theirs.get("id")
+        if not task_id:
+            # written before ids existed; whoever loaded it first gave it an
+            # id and writes it back as a create
+            continue
+        change = pending.get(task_id)
+        seen.add(task_id)
+        if change is not None and change.op == "create" and change.base is not None:
+            # both instances stored the same occurrence of a recurring
+            # series: merge against the occurrence as it was expanded
+            task, fields = merge_task(change.base, mine[task_id], theirs, change.fields)
+            if fields:
+                conflicts.append(Conflict(task_id, theirs.get("title", ""), fields))
+            merged.append(task)
+        elif change is None or change.op == "create":
+            merged.append(theirs)
+        elif change.op == "update":
+            task, fields = merge_task(change.base, mine[task_id], theirs, change.fields)
+            if fields:
+                conflicts.append(Conflict(task_id, theirs.get("title", ""), fields))
+            merged.append(task)
+        elif theirs.get("version", 0) != change.base.get("version", 0):
+            # deleted here but edited there: keep their edit
+            conflicts.append(Conflict(task_id, theirs.get("title", ""), reason="edited-deleted"))
+            merged.append(theirs)
+    for task_id, change in pending.items():
+        if task_id in seen:
+            continue
+        if change.op == "create":
+            merged.append(mine[task_id])
+        elif change.op == "update":
+            conflicts.append(Conflict(task_id, mine[task_id].get("title", ""), reason="deleted"))
+    return merged, conflicts
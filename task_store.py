@@ -0,0 +1,691 @@
+import threading
+import uuid
+from datetime import date
+
+from metrics import STORE_SAVE
+import recurrence
+from archive import Archive, archive_cutoff, archive_dir
+from changelog import ChangeLog, changes_path
+from models import Task
+from storage import TASK_FILE, open_task_backend
+from sync import Conflict, Pending, merge_snapshot, merge_task
+
+
+def new_task_id():
+    return uuid.uuid4().hex[:12]
+
+
+def visible_to(task, user):
+    # guest can see (and modify) every task, everyone else only their own
+    return user == "guest" or task.created_by == user
+
+
+class TaskStore:
+    """In-memory task table loaded once from disk.
+
+    Tasks are addressed by a stable string ``id`` (also used as the Treeview
+    iid) and indexed by owner and completion status, so lookups and single
+    edits do not have to walk or re-parse the whole file.
+
+    When the backend is ``shared`` (tasks.json used by several instances at
+    once) every save runs under the backend's file lock and merges with what
+    the others wrote since (see sync.py), and ``pull()`` applies their
+    changes to this store task by task.
+
+    Recurring series (see recurrence.py) are stored as one record each and
+    kept out of the task indexes. Their occurrences inside ``window`` are
+    expanded into the store as ordinary tasks that are never written; the
+    first edit of one stores it as an override.
+
+    Tasks completed long ago can be moved to ``archive`` (see archive.py);
+    completed_in_month still finds them there.
+    """
+
+    def __init__(self, path=TASK_FILE, backend=None, load=True):
+        self.path = path
+        self.backend = backend or open_task_backend(path=path)
+        self.archive = Archive(archive_dir(path))
+        self.changes = ChangeLog(changes_path(path))
+        self._listeners = []
+        # mutations and the serializing part of a save hold lock; the disk
+        # write of a save only holds _save_lock, so a BackgroundSaver writing
+        # a large file never stalls an edit
+        self.lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self.shared = getattr(self.backend, "shared", False)
+        self.conflicts = []
+        self.window = recurrence.window(date.today())
+        self.loaded = False
+        self._loader = None
+        self._loaded = None
+        if load:
+            self.reload()
+        else:
+            self._install(self._empty(), loaded=False)
+
+    def reload(self):
+        self._install(self._read())
+
+    def _empty(self):
+        return {
+            "_tasks": {},
+            "_by_user": {},
+            "_by_status": {True: {}, False: {}},
+            # stored records that are not tasks (series, deleted
+            # occurrences), and the ids of occurrences expanded from a
+            # series but not stored
+            "_apart": {},
+            "_transient": set(),
+            "dirty": False,
+            "_needs_rewrite": False,
+            # id -> Pending for changes not yet written, and the stat of the
+            # file version the in-memory tasks reflect (shared backends only)
+            "_pending": {},
+            "synced_stat": None,
+        }
+
+    def _read(self):
+        # the backend's records parsed into fresh tables; touches nothing a
+        # listener can see, so it may run on another thread
+        tables = self._empty()
+        if self.shared:
+            tables["synced_stat"] = self.backend.stat()
+        tasks, apart = tables["_tasks"], tables["_apart"]
+        by_user, by_status = tables["_by_user"], tables["_by_status"]
+        for data in self.backend.load():
+            task = data if isinstance(data, Task) else Task.from_dict(data)
+            if not task.id or task.id in tasks or task.id in apart:
+                # tasks written before ids existed get one on first load
+                task.id = new_task_id()
+                tables["dirty"] = tables["_needs_rewrite"] = True
+                if self.shared:
+                    tables["_pending"][task.id] = Pending("create")
+            if recurrence.stored_apart(task):
+                apart[task.id] = task
+                continue
+            tasks[task.id] = task
+            # as _index does
+            by_user.setdefault(task.created_by, {})[task.id] = None
+            by_status[task.completed][task.id] = None
+        return tables
+
+    def _install(self, tables, loaded=True):
+        with self.lock:
+            for name, value in tables.items():
+                setattr(self, name, value)
+            for series in self.series():
+                self._expand(series, notify=False)
+            self.loaded = loaded
+        self._notify("reload", None)
+
+    # ---------------- Background loading ----------------
+    # load=False leaves the store empty; load_in_background() parses the
+    # backend on a thread and finish_loading(), called from the thread that
+    # owns the listeners (the Tk loop), puts the result in place
+    def load_in_background(self):
+        def run():
+            try:
+                self._loaded = self._read()
+            except Exception as e:  # re-raised by finish_loading
+                self._loaded = e
+        self._loaded = None
+        self._loader = threading.Thread(target=run, name="task-loader", daemon=True)
+        self._loader.start()
+
+    def finish_loading(self, wait=False):
+        # True once the tasks are in place
+        if self._loader is None:
+            return self.loaded
+        if wait:
+            self._loader.join()
+        elif self._loader.is_alive():
+            return False
+        self._loader = None
+        if isinstance(self._loaded, Exception):
+            raise self._loaded
+        tables, self._loaded = self._loaded, None
+        self._install(tables)
+        return True
+
+    def peek(self, user, limit):
+        # the first few of the user's tasks straight from the backend, to
+        # show while the rest loads; [] if the backend cannot do that
+        peek = getattr(self.backend, "peek", None)
+        if peek is None:
+            return []
+        tasks = [t if isinstance(t, Task) else Task.from_dict(t) for t in peek(user, limit)]
+        ids = {t.id for t in tasks}
+        if None in ids or "" in ids or len(ids) < len(tasks):
+            # a file from before ids existed: the load gives these rows new
+            # ids, so rows shown under the old ones could not be updated
+            return []
+        return tasks
+
+    # ---------------- Change listeners ----------------
+    # listener(op, task) runs after every mutation: op is "create", "update"
+    # or "delete" (with the removed task), or "reload" with task None
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, op, task):
+        if task is not None:
+            self.changes.mark(task.created_by)
+        for listener in list(self._listeners):
+            listener(op, task)
+
+    # ---------------- Indexes ----------------
+    def _index(self, task):
+        # dicts are used as insertion-ordered sets so file order is kept
+        self._by_user.setdefault(task.created_by, {})[task.id] = None
+        self._by_status[task.completed][task.id] = None
+
+    def _unindex(self, task):
+        owned = self._by_user.get(task.created_by)
+        if owned is not None:
+            owned.pop(task.id, None)
+            if not owned:
+                del self._by_user[task.created_by]
+        self._by_status[task.completed].pop(task.id, None)
+
+    def _reindex(self, task, owner, completed):
+        # moves only the entries that changed, so the task keeps its place
+        # in its owner's list when just the status flips
+        if task.created_by != owner:
+            owned = self._by_user[owner]
+            del owned[task.id]
+            if not owned:
+                del self._by_user[owner]
+            self._by_user.setdefault(task.created_by, {})[task.id] = None
+        if task.completed != completed:
+            del self._by_status[completed][task.id]
+            self._by_status[task.completed][task.id] = None
+
+    # ---------------- Queries ----------------
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def all(self):
+        return list(self._tasks.values())
+
+    def users(self):
+        return list(self._by_user)
+
+    def for_user(self, user, archived=False):
+        # archived=True adds the user's tasks moved to the archive, for
+        # readers that cover all history (export, analytics)
+        if user == "guest":
+            tasks = self.all()
+        else:
+            tasks = [self._tasks[i] for i in self._by_user.get(user, ())]
+        if archived:
+            tasks += [t for t in self.archive.for_user(user) if t.id not in self._tasks]
+        return tasks
+
+    def with_status(self, completed, user="guest"):
+        ids = self._by_status[bool(completed)]
+        if user == "guest":
+            return [self._tasks[i] for i in ids]
+        owned = self._by_user.get(user, {})
+        # walk whichever index is smaller
+        if len(owned) < len(ids):
+            return [self._tasks[i] for i in owned if i in ids]
+        return [self._tasks[i] for i in ids if i in owned]
+
+    def series(self, user="guest"):
+        return [t for t in self._apart.values() if recurrence.is_series(t) and visible_to(t, user)]
+
+    def is_transient(self, task_id):
+        return task_id in self._transient
+
+    def records(self):
+        # what the backend stores: every task but the unstored occurrences,
+        # then the series and deleted occurrences
+        tasks = self._tasks.values()
+        if self._transient:
+            tasks = [t for t in tasks if t.id not in self._transient]
+        return list(tasks) + list(self._apart.values())
+
+    def _record(self, task_id):
+        task = self._tasks.get(task_id)
+        return task if task is not None else self._apart[task_id]
+
+    def _backend_query(self, name, *args):
+        # backends with their own indexes (sqlite) answer some queries directly
+        query = getattr(self.backend, name, None)
+        if query is None:
+            return None
+        with self.lock:
+            return [self._tasks[i] for i in query(*args) if i in self._tasks]
+
+    def completed_in_month(self, user, year, month):
+        # tasks whose end_time falls in the given month, archived ones last
+        found = self._backend_query("completed_in_month_ids", user, year, month)
+        if found is None:
+            found = [t for t in self.for_user(user)
+                     if t.end_time is not None and t.end_time.year == year and t.end_time.month == month]
+        archived = self.archive.completed_in_month(user, year, month)
+        return found + [t for t in archived if t.id not in self._tasks]
+
+    # ---------------- Mutations ----------------
+    def _wait_loaded(self):
+        # a change made before a background load lands would be lost
+        if self._loader is not None:
+            self.finish_loading(wait=True)
+
+    def add(self, task):
+        if not isinstance(task, Task):
+            task = Task.from_dict(task)
+        self._wait_loaded()
+        with self.lock:
+            if not task.id or task.id in self._tasks or task.id in self._apart:
+                task.id = new_task_id()
+            if self.shared:
+                self._pending[task.id] = Pending("create")
+            self.backend.record("create", task)
+            self.dirty = True
+            if recurrence.is_series(task):
+                self._apart[task.id] = task
+                self._expand(task)
+            else:
+                self._tasks[task.id] = task
+                self._index(task)
+                self._notify("create", task)
+        return task.id
+
+    def update(self, task_id, **changes):
+        self._wait_loaded()
+        with self.lock:
+            changes.pop("id", None)
+            if task_id in self._transient:
+                if changes == {"notified": True}:
+                    return self._mark_notified(self._tasks[task_id])
+                self._store_transient(self._tasks[task_id])
+            if task_id in self._apart:
+                task = self._change(self._apart[task_id], changes)
+                if recurrence.is_series(task):
+                    self._collapse(task_id)
+                    self._expand(task)
+                return task
+            task = self._tasks[task_id]
+            owner, completed = task.created_by, task.completed
+            self._change(task, changes)
+            if task.created_by != owner or task.completed != completed:
+                self._reindex(task, owner, completed)
+            self._notify("update", task)
+        return task
+
+    def _change(self, task, changes):
+        if self.shared:
+            change = self._pending.get(task.id)
+            if change is None:
+                change = self._pending[task.id] = Pending("update", task.to_dict())
+            change.fields.update(changes)
+            changes["version"] = task.version + 1
+        for name, value in changes.items():
+            task.set(name, value)
+        self.backend.record("update", task, tuple(changes))
+        self.dirty = True
+        return task
+
+    def delete(self, task_id):
+        self._wait_loaded()
+        with self.lock:
+            if task_id in self._apart:
+                task = self._apart.pop(task_id)
+                self._forget(task)
+                if recurrence.is_series(task):
+                    self._collapse(task_id)
+                    for skip in [t for t in self._apart.values() if t.extra.get(recurrence.SERIES_KEY) == task_id]:
+                        del self._apart[skip.id]
+                        self._forget(skip)
+                return task
+            task = self._tasks.pop(task_id)
+            self._unindex(task)
+            series = recurrence.split_occurrence_id(task_id)
+            if task_id in self._transient:
+                # an occurrence that was never stored: store that it is gone
+                self._transient.discard(task_id)
+                skip = recurrence.skip_record(task)
+                self._apart[task_id] = skip
+                if self.shared:
+                    change = self._pending[task_id] = Pending("create", task.to_dict())
+                    change.fields.add(recurrence.SKIPPED_KEY)
+                self.backend.record("create", skip)
+                self.dirty = True
+            elif series is not None and series[0] in self._apart:
+                # an override becomes the record of the deleted occurrence
+                self._apart[task_id] = task
+                self._change(task, {recurrence.SKIPPED_KEY: True})
+            else:
+                self._forget(task)
+            self._notify("delete", task)
+        return task
+
+    # ---------------- Batches ----------------
+    # many tasks changed under one hold of the lock, so a save or a pull sees
+    # all of the batch or none of it; listeners still get one event per task.
+    # Every id is checked before anything changes.
+    def append(self, tasks):
+        # bulk loads: new tasks go straight to a backend that can append
+        # (journal, sqlite) and are not kept, so the store only sees them
+        # after a reload. Returns False, doing nothing, for other backends.
+        append = getattr(self.backend, "append", None)
+        if append is None or self.shared:
+            return False
+        self._wait_loaded()
+        with self._save_lock:
+            with self.lock:
+                for task in tasks:
+                    if not task.id or task.id in self._tasks or task.id in self._apart:
+                        task.id = new_task_id()
+                    self.changes.mark(task.created_by)
+                owners = self.changes.take()
+            try:
+                self.changes.note(owners)
+                with self.lock:
+                    append(tasks)
+                self.changes.note(owners)
+            except Exception:
+                with self.lock:
+                    self.changes.marked |= owners
+                raise
+        return True
+
+    def update_many(self, task_ids, **changes):
+        task_ids = list(dict.fromkeys(task_ids))
+        self._wait_loaded()
+        with self.lock:
+            self._check_ids(task_ids)
+            return [self.update(task_id, **changes) for task_id in task_ids]
+
+    def delete_many(self, task_ids):
+        task_ids = list(dict.fromkeys(task_ids))
+        self._wait_loaded()
+        with self.lock:
+            self._check_ids(task_ids)
+            return [self.delete(task_id) for task_id in task_ids]
+
+    def _check_ids(self, task_ids):
+        for task_id in task_ids:
+            if task_id not in self._tasks and task_id not in self._apart:
+                raise KeyError(task_id)
+
+    def _forget(self, task):
+        if self.shared:
+            change = self._pending.pop(task.id, None)
+            if change is None:
+                self._pending[task.id] = Pending("delete", task.to_dict())
+            elif change.op == "update":
+                self._pending[task.id] = Pending("delete", change.base)
+        self.backend.record("delete", task)
+        self.dirty = True
+
+    # ---------------- Recurring series ----------------
+    def _expand(self, series, notify=True):
+        # adds the series' occurrences inside the window that are not stored
+        low, high = self.window
+        for task in recurrence.expand(series, low, high):
+            if task.id in self._tasks or task.id in self._apart:
+                continue
+            self._tasks[task.id] = task
+            self._transient.add(task.id)
+            self._index(task)
+            if notify:
+                self._notify("create", task)
+
+    def _collapse(self, series_id=None, keep=None):
+        # drops unstored occurrences of one series (or of all), except those
+        # whose date is inside keep = (low, high)
+        for task_id in list(self._transient):
+            owner, day = recurrence.split_occurrence_id(task_id)
+            if series_id is not None and owner != series_id:
+                continue
+            if keep is not None and keep[0] <= day <= keep[1]:
+                continue
+            self._transient.discard(task_id)
+            task = self._tasks.pop(task_id)
+            self._unindex(task)
+            self._notify("delete", task)
+
+    def _store_transient(self, task):
+        # the first edit of an expanded occurrence stores it as an override
+        self._transient.discard(task.id)
+        if self.shared:
+            self._pending[task.id] = Pending("create", task.to_dict())
+        self.backend.record("create", task)
+        self.dirty = True
+
+    def _mark_notified(self, task):
+        # a reminder fired for an unstored occurrence: remember it on the
+        # series (one date) rather than storing every occurrence that fired
+        task.notified = True
+        series_id, day = recurrence.split_occurrence_id(task.id)
+        series = self._apart.get(series_id)
+        if series is not None:
+            rule = recurrence.notified_rule(series, day)
+            if rule is not None:
+                self._change(series, {recurrence.RECURRENCE_KEY: rule})
+        self._notify("update", task)
+        return task
+
+    def roll_window(self, today=None):
+        # moves the expanded window to today's; returns True if it moved
+        window = recurrence.window(today or date.today())
+        with self.lock:
+            if window == self.window:
+                return False
+            self.window = window
+            self._collapse(keep=window)
+            for series in self.series():
+                self._expand(series)
+        return True
+
+    # ---------------- Archive ----------------
+    def archive_completed(self, days, today=None):
+        # moves tasks completed before the cutoff into the archive; returns
+        # how many moved. Unlike delete, an archived occurrence leaves no
+        # skip record, so only those the series no longer expands move.
+        cutoff = archive_cutoff(days, today)
+        self._wait_loaded()
+        with self.lock:
+            moved = [t for t in self.with_status(True)
+                     if t.end_time is not None and t.end_time.date() < cutoff
+                     and t.id not in self._transient
+                     and not (recurrence.is_occurrence(t) and t.deadline >= self.window[0])]
+            if not moved:
+                return 0
+            # written first: a failed write leaves every task where it was
+            self.archive.add(moved)
+            for task in moved:
+                self.changes.mark(task.created_by)
+                del self._tasks[task.id]
+                self._unindex(task)
+                self._forget(task)
+        self._notify("reload", None)
+        return len(moved)
+
+    def to_list(self):
+        # the JSON layout of every stored record, in store order
+        return [t.to_dict() for t in self.records()]
+
+    def save(self):
+        with self._save_lock, STORE_SAVE.time():
+            # the owners of what is written get change stamps before and
+            # after the write (see changelog.py)
+            with self.lock:
+                owners = self.changes.take()
+            try:
+                self.changes.note(owners)
+                self._save()
+                self.changes.note(owners)
+            except Exception:
+                with self.lock:
+                    self.changes.marked |= owners
+                raise
+
+    def _save(self):
+        if not self.shared:
+            self._write()
+            return
+        with self.backend.lock():
+            stat = self.backend.stat()
+            # someone else rewrote the file since we last saw it
+            disk = None
+            if stat is not None and stat != self.synced_stat:
+                disk = self.backend.load()
+            if self._write(disk):
+                self.synced_stat = self.backend.stat()
+
+    def _write(self, disk=None):
+        # returns True when the file now holds exactly the in-memory tasks
+        with self.lock:
+            if not self.dirty:
+                return False
+            if disk is not None:
+                mine = {i: self._record(i).to_dict() for i, c in self._pending.items() if c.op != "delete"}
+                tasks, conflicts = merge_snapshot(disk, mine, self._pending)
+                self.conflicts.extend(conflicts)
+                finish = self.backend.write(tasks)
+            elif self._needs_rewrite:
+                finish = self.backend.rewrite(self)
+            else:
+                finish = self.backend.commit(self)
+            self._needs_rewrite = False
+            pending, self._pending = self._pending, {}
+            self.dirty = False
+        if finish is not None:
+            try:
+                finish()
+            except Exception:
+                with self.lock:
+                    self.dirty = True
+                    self._restore_pending(pending)
+                raise
+        return disk is None
+
+    def _restore_pending(self, pending):
+        # a write failed: put back what it was meant to carry, under any
+        # changes made since, keeping the older base
+        for task_id, old in pending.items():
+            new = self._pending.get(task_id)
+            if new is None:
+                self._pending[task_id] = old
+            elif old.op == "create":
+                if new.op == "delete":
+                    del self._pending[task_id]
+                else:
+                    self._pending[task_id] = old
+            else:
+                new.base = old.base
+                new.fields |= old.fields
+
+    # ---------------- Other instances ----------------
+    def pull(self):
+        # applies what other instances wrote since we last looked, notifying
+        # listeners per task; returns how many tasks changed. Cheap when the
+        # file has not changed, and skipped while a save is in progress.
+        if not self.shared or not self.loaded or not self._save_lock.acquire(blocking=False):
+            return 0
+        try:
+            stat = self.backend.stat()
+            if stat is None or stat == self.synced_stat:
+                return 0
+            disk = self.backend.load()
+            with self.lock:
+                changed = self._apply_remote(disk)
+                self.synced_stat = stat
+            return changed
+        finally:
+            self._save_lock.release()
+
+    def _apply_remote(self, disk):
+        changed = 0
+        seen = set()
+        # series whose occurrences have to be expanded again
+        touched = set()
+        for data in disk:
+            task_id = data.get("id")
+            if not task_id:
+                continue
+            seen.add(task_id)
+            task = self._tasks.get(task_id) or self._apart.get(task_id)
+            change = self._pending.get(task_id)
+            if change is not None:
+                if change.op != "update":
+                    continue
+                merged, fields = merge_task(change.base, task.to_dict(), data, change.fields)
+                if fields:
+                    self.conflicts.append(Conflict(task_id, data.get("title", ""), fields))
+                change.base = data
+                if merged.get("version", 0) != task.version:
+                    self._replace(task, merged, touched)
+                    changed += 1
+            elif task is None or task_id in self._transient or data.get("version", 0) != task.version:
+                self._replace(task, data, touched)
+                changed += 1
+        gone = [i for i in self._tasks if i not in seen and i not in self._transient]
+        gone += [i for i in self._apart if i not in seen]
+        for task_id in gone:
+            change = self._pending.get(task_id)
+            if change is not None:
+                if change.op == "create":
+                    continue
+                del self._pending[task_id]
+                self.conflicts.append(Conflict(task_id, self._record(task_id).title, reason="deleted"))
+            task = self._tasks.pop(task_id, None)
+            if task is not None:
+                self._unindex(task)
+                self._notify("delete", task)
+            else:
+                task = self._apart.pop(task_id)
+                touched.add(task.id if recurrence.is_series(task) else task.extra.get(recurrence.SERIES_KEY))
+            changed += 1
+        touched.discard(None)
+        for series_id in touched:
+            self._collapse(series_id)
+            series = self._apart.get(series_id)
+            if series is not None and recurrence.is_series(series):
+                self._expand(series)
+        return changed
+
+    def _replace(self, task, data, touched):
+        # puts another instance's version of a record in place of ours
+        new = Task.from_dict(data)
+        apart = recurrence.stored_apart(new)
+        if task is not None and task.id in self._tasks:
+            self._unindex(task)
+            self._transient.discard(task.id)
+            if apart:
+                del self._tasks[task.id]
+                self._notify("delete", task)
+        if apart:
+            self._apart[new.id] = new
+            touched.add(new.id if recurrence.is_series(new) else new.extra.get(recurrence.SERIES_KEY))
+            return
+        if self._apart.pop(new.id, None) is not None:
+            touched.add(new.extra.get(recurrence.SERIES_KEY))
+        op = "update" if new.id in self._tasks else "create"
+        self._tasks[new.id] = new
+        self._index(new)
+        self._notify(op, new)
+
+    def take_conflicts(self):
+        with self.lock:
+            conflicts, self.conflicts = self.conflicts, []
+        return conflicts
+
+    def close(self):
+        if self._loader is not None:
+            self._loader.join()
+        self.save()
+        self.backend.close()
@@ -0,0 +1,167 @@
+from datetime import date
+
+from metrics import TABLE_RENDER, TABLE_ROWS
+from models import Priority, format_date, format_datetime
+from recurrence import SERIES_KEY
+
+# above this many rows only the visible window is kept in the Treeview
+VIRTUAL_THRESHOLD = 2000
+
+
+def task_row(task, today):
+    # Treeview values and tag for one task; a deadline counts as overdue from
+    # the start of its day, as it always has. Occurrences of a recurring
+    # series are marked with ↻.
+    status = "✔" if task.completed else "❌"
+    title = "↻ " + task.title if SERIES_KEY in task.extra else task.title
+    values = (title, format_date(task.deadline), task.priority.value, status,
+              task.progress, format_datetime(task.end_time), format_datetime(task.reminder_time))
+    tags = ()
+    if task.completed:
+        tags = ("completed",)
+    elif task.priority is Priority.HIGH:
+        tags = ("high",)
+    if not task.completed and task.deadline is not None and task.deadline <= today:
+        tags = ("overdue",)
+    return values, tags
+
+
+class TaskTable:
+    """Keeps a Treeview in sync with a list of tasks by diffing.
+
+    Only rows that were added, removed, reordered or changed are touched. When
+    the list is longer than ``VIRTUAL_THRESHOLD`` the table switches to a
+    virtual view: the Treeview holds just the rows that fit on screen and the
+    scrollbar is driven by ``yview`` instead of the widget's own scrolling.
+    """
+
+    def __init__(self, tree, scrollbar, rowheight=28):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.rowheight = rowheight
+        self._rows = {}
+        self._order = []
+        self._tasks = []
+        self.virtual = False
+        self.offset = 0
+        self.window = 30
+        tree.tag_configure("completed", foreground="gray")
+        tree.tag_configure("high", background="#ffebee")
+        tree.tag_configure("overdue", background="#ffccbc")
+        tree.bind("<Configure>", self._on_resize, add="+")
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(seq, self._on_wheel, add="+")
+        tree.bind("<Down>", self._on_key, add="+")
+        tree.bind("<Up>", self._on_key, add="+")
+        self._use_native_scroll()
+
+    def render(self, tasks):
+        self._tasks = tasks
+        virtual = len(tasks) > VIRTUAL_THRESHOLD
+        if virtual != self.virtual:
+            self.virtual = virtual
+            if virtual:
+                self.scrollbar.configure(command=self.yview)
+                self.tree.configure(yscrollcommand="")
+            else:
+                self._use_native_scroll()
+        if virtual:
+            self.offset = max(0, min(self.offset, len(tasks) - self.window))
+            shown = tasks[self.offset:self.offset + self.window]
+        else:
+            self.offset = 0
+            shown = tasks
+        with TABLE_RENDER.time():
+            today = date.today()
+            self._sync([(t.id,) + task_row(t, today) for t in shown])
+            if virtual:
+                self._update_scrollbar()
+
+    def _use_native_scroll(self):
+        self.scrollbar.configure(command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+    def _sync(self, rows):
+        tree = self.tree
+        wanted = {row[0] for row in rows}
+        deleted = moved = inserted = updated = 0
+        for iid in self._order:
+            if iid not in wanted:
+                tree.delete(iid)
+                del self._rows[iid]
+                deleted += 1
+        kept = [iid for iid in self._order if iid in wanted]
+        kept_wanted = [row[0] for row in rows if row[0] in self._rows]
+        if kept != kept_wanted:
+            # rows were reordered; move the surviving ones into place first
+            for pos, iid in enumerate(kept_wanted):
+                tree.move(iid, "", pos)
+            moved = len(kept_wanted)
+        for pos, (iid, values, tags) in enumerate(rows):
+            old = self._rows.get(iid)
+            if old is None:
+                tree.insert("", pos, iid=iid, values=values, tags=tags)
+                inserted += 1
+            elif old != (values, tags):
+                tree.item(iid, values=values, tags=tags)
+                updated += 1
+            self._rows[iid] = (values, tags)
+        self._order = [row[0] for row in rows]
+        for op, n in (("delete", deleted), ("move", moved), ("insert", inserted), ("update", updated)):
+            if n:
+                TABLE_ROWS.inc(n, op=op)
+
+    # ---------------- Virtual scrolling ----------------
+    def yview(self, *args):
+        if not self.virtual or not args:
+            return
+        total = len(self._tasks)
+        if args[0] == "moveto":
+            offset = int(float(args[1]) * total)
+        else:
+            step = int(args[1])
+            offset = self.offset + (step * self.window if args[2] == "pages" else step)
+        self.scroll_to(offset)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self._tasks) - self.window))
+        if offset != self.offset:
+            self.offset = offset
+            self.render(self._tasks)
+
+    def _update_scrollbar(self):
+        total = max(len(self._tasks), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.window) / total))
+
+    def _on_resize(self, event):
+        # one row's worth of height goes to the headings
+        window = max(1, int(self.tree.winfo_height()) // self.rowheight - 1)
+        if window != self.window:
+            self.window = window
+            if self.virtual:
+                self.render(self._tasks)
+
+    def _on_wheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+    def _on_key(self, event):
+        # keep arrow-key navigation going past the edges of the window
+        if not self.virtual or not self._order:
+            return None
+        selected = self.tree.selection()
+        if not selected:
+            return None
+        if event.keysym == "Down" and selected[-1] == self._order[-1]:
+            self.scroll_to(self.offset + 1)
+        elif event.keysym == "Up" and selected[0] == self._order[0]:
+            self.scroll_to(self.offset - 1)
+        else:
+            return None
+        # the default binding then moves the focus onto the row just scrolled in
+        return None
@@ -0,0 +1,43 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import accounts
+from accounts import Sessions, UserDirectory, hash_password
+
+
+class RememberedCredentialsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "users.json")
+        self._n, accounts.SCRYPT_N = accounts.SCRYPT_N, 2 ** 4
+        self.users = UserDirectory(self.path)
+        self.users.put("bob", {"password": hash_password("old")})
+        self.sessions = Sessions()
+        self.assertTrue(self.users.authenticate("bob", "old"))
+        self.sessions.remember("bob", "old", self.users.password_hash("bob"))
+
+    def tearDown(self):
+        accounts.SCRYPT_N = self._n
+        shutil.rmtree(self.dir)
+
+    def verified(self, password):
+        return self.sessions.verified("bob", password, self.users.password_hash("bob"))
+
+    def test_remembered_until_the_password_changes(self):
+        self.assertTrue(self.verified("old"))
+        self.assertFalse(self.verified("new"))
+        # changed by another process
+        UserDirectory(self.path).put("bob", {"password": hash_password("new")})
+        self.assertFalse(self.verified("old"))
+
+    def test_forgotten_when_the_user_is_deleted(self):
+        with open(self.path, "w") as f:
+            json.dump({}, f)
+        self.assertFalse(self.verified("old"))
+
+
+if __name__ == "__main__":
+    unittest.main()
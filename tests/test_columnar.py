@@ -0,0 +1,45 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from columnar import columnar_to_json, json_to_columnar
+
+FULL = {
+    "title": "Write report", "description": "Q3", "deadline": "2026-03-01", "priority": "High",
+    "completed": True, "progress": 100, "end_time": "2026-02-27 17:30:00",
+    "reminder_time": "2026-02-28 09:00:00", "notified": True, "created_by": "bob",
+    "created_at": "2026-02-01 08:00:00", "id": "a1", "version": 3,
+}
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def round_trip(self, records):
+        src, tmsc, dst = (os.path.join(self.dir, name) for name in ("in.json", "tasks.tmsc", "out.json"))
+        with open(src, "w") as f:
+            json.dump(records, f)
+        json_to_columnar(src, tmsc)
+        columnar_to_json(tmsc, dst)
+        with open(dst) as f:
+            return json.load(f)
+
+    def test_records_come_back_unchanged(self):
+        records = [
+            FULL,
+            dict(FULL, id="a2", progress=300),
+            dict(FULL, id="a3", progress=-5, completed=False),
+            dict(FULL, id="a4", progress="lots", deadline="26/10/2025", colour="red"),
+            {k: v for k, v in FULL.items() if k not in ("id", "version")},
+        ]
+        self.assertEqual(self.round_trip(records), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from models import Task
+from storage import JournalTaskFile
+from task_store import TaskStore
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "tasks.json")
+        with open(self.path, "w") as f:
+            f.write("[]")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, **options):
+        return TaskStore(self.path, backend=JournalTaskFile(self.path, **options))
+
+    def titles(self, store):
+        return sorted((t.title, t.progress) for t in store.all())
+
+    def fill(self, store):
+        for title in ("a", "b", "c"):
+            store.add(Task(title=title, created_by="bob"))
+        store.save()
+        ids = {t.title: t.id for t in store.all()}
+        store.update(ids["a"], progress=40)
+        store.delete(ids["b"])
+        store.save()
+
+    def test_replay_restores_creates_updates_and_deletes(self):
+        store = self.open()
+        self.fill(store)
+        expected = self.titles(store)
+        store.close()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), [])
+        self.assertEqual(self.titles(self.open()), expected)
+
+    def test_torn_last_record_is_dropped(self):
+        store = self.open()
+        self.fill(store)
+        store.close()
+        journal = self.path + ".journal"
+        size = os.path.getsize(journal)
+        with open(journal, "a") as f:
+            f.write('{"op": "create", "id": "x", "task": {"title": "torn"')
+        self.assertEqual(self.titles(self.open()), [("a", 40), ("c", 0)])
+        self.assertEqual(os.path.getsize(journal), size)
+
+    def test_compaction_folds_the_journal_into_the_snapshot(self):
+        store = self.open(compact_bytes=0, compact_ratio=0)
+        self.fill(store)
+        store.close()
+        # records that came while a compaction ran may still be in the journal
+        with open(self.path) as f:
+            self.assertTrue(json.load(f))
+        self.assertFalse(os.path.exists(self.path + ".journal.old"))
+        self.assertEqual(self.titles(self.open()), [("a", 40), ("c", 0)])
+
+    def test_old_journal_from_an_interrupted_compaction_is_replayed(self):
+        store = self.open()
+        self.fill(store)
+        store.close()
+        os.replace(self.path + ".journal", self.path + ".journal.old")
+        store = self.open()
+        store.add(Task(title="d", created_by="bob"))
+        store.close()
+        self.assertEqual(self.titles(self.open()), [("a", 40), ("c", 0), ("d", 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
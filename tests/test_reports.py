@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from models import Task
+from reports import generate_reports, report_filename
+from storage import JsonTaskFile
+from task_store import TaskStore
+
+MONTH = (2026, 1)
+
+
+class StaleReportTest(unittest.TestCase):
+    """Edits saved while a report run is reading must not be lost for good."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "tasks.json")
+        self.reports_dir = os.path.join(self.dir, "reports")
+        with open(self.path, "w") as f:
+            f.write("[]")
+        self.writer = self.open()
+        self.writer.add(Task(title="v0", created_by="bob", completed=True, progress=100,
+                             created_at=datetime(2026, 1, 2), end_time=datetime(2026, 1, 5)))
+        (task,) = self.writer.all()
+        self.task_id = task.id
+        self.writer.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, load=True):
+        return TaskStore(self.path, backend=JsonTaskFile(self.path), load=load)
+
+    def edit(self, title):
+        self.writer.update(self.task_id, title=title)
+        self.writer.save()
+
+    def run_reports(self, store=None):
+        if store is None:
+            store = self.open(load=False)
+        return generate_reports(store, MONTH, MONTH, workers=1, reports_dir=self.reports_dir,
+                                rollup_path=os.path.join(self.reports_dir, "rollups.json"))
+
+    def report(self):
+        with open(report_filename("bob", *MONTH, self.reports_dir), encoding="utf-8") as f:
+            return f.read()
+
+    def test_edit_saved_after_the_tasks_are_read_is_picked_up_next_run(self):
+        self.run_reports()
+        self.edit("v1")
+        store = self.open(load=False)
+        load = store.reload
+
+        def reload():
+            load()
+            self.edit("v2")
+        store.reload = reload
+        self.run_reports(store)
+        self.assertIn("v1", self.report())
+        self.assertEqual(len(self.run_reports()), 1)
+        self.assertIn("v2", self.report())
+        self.assertEqual(self.run_reports(), [])
+
+    def test_edit_saved_before_the_tasks_are_read_is_reported_next_run(self):
+        self.run_reports()
+        store = self.open(load=False)
+        load = store.reload
+
+        def reload():
+            self.edit("v1")
+            load()
+        store.reload = reload
+        # the stamps were read before the edit, so the report counts as up
+        # to date this run even though the edit is in the tasks read
+        self.assertEqual(self.run_reports(store), [])
+        self.assertEqual(len(self.run_reports()), 1)
+        self.assertIn("v1", self.report())
+        self.assertEqual(self.run_reports(), [])
+
+    def test_unchanged_reports_are_not_rewritten(self):
+        self.assertEqual(len(self.run_reports()), 1)
+        self.assertEqual(self.run_reports(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
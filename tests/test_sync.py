@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from models import Task
+from storage import JsonTaskFile
+from sync import Pending, merge_snapshot, merge_task
+from task_store import TaskStore
+
+
+def record(task_id, version=1, **fields):
+    data = {"id": task_id, "title": "t", "description": "", "progress": 0, "version": version}
+    data.update(fields)
+    return data
+
+
+def pending(op, base=None, fields=()):
+    change = Pending(op, base)
+    change.fields = set(fields)
+    return change
+
+
+class MergeTaskTest(unittest.TestCase):
+    def test_unchanged_on_disk_keeps_mine(self):
+        base = record("a")
+        mine = record("a", 2, title="mine")
+        merged, conflicts = merge_task(base, mine, record("a"), {"title"})
+        self.assertEqual(merged, mine)
+        self.assertEqual(conflicts, ())
+
+    def test_different_fields_are_combined(self):
+        base = record("a")
+        mine = record("a", 2, title="mine")
+        theirs = record("a", 2, description="theirs")
+        merged, conflicts = merge_task(base, mine, theirs, {"title", "version"})
+        self.assertEqual(merged["title"], "mine")
+        self.assertEqual(merged["description"], "theirs")
+        self.assertEqual(merged["version"], 3)
+        self.assertEqual(conflicts, [])
+
+    def test_same_field_keeps_theirs(self):
+        base = record("a")
+        merged, conflicts = merge_task(base, record("a", 2, title="mine"), record("a", 2, title="theirs"), {"title"})
+        self.assertEqual(merged["title"], "theirs")
+        self.assertEqual(conflicts, ["title"])
+
+    def test_same_value_is_not_a_conflict(self):
+        base = record("a")
+        merged, conflicts = merge_task(base, record("a", 2, title="x"), record("a", 2, title="x"), {"title"})
+        self.assertEqual(merged["title"], "x")
+        self.assertEqual(conflicts, [])
+
+
+class MergeSnapshotTest(unittest.TestCase):
+    def test_delete_of_an_edited_task_keeps_the_edit(self):
+        disk = [record("a", 2, title="edited")]
+        tasks, conflicts = merge_snapshot(disk, {}, {"a": pending("delete", record("a"))})
+        self.assertEqual(tasks, disk)
+        self.assertEqual([c.reason for c in conflicts], ["edited-deleted"])
+
+    def test_delete_of_an_unchanged_task_goes_through(self):
+        tasks, conflicts = merge_snapshot([record("a")], {}, {"a": pending("delete", record("a"))})
+        self.assertEqual(tasks, [])
+        self.assertEqual(conflicts, [])
+
+    def test_edit_of_a_deleted_task_is_dropped(self):
+        mine = {"a": record("a", 2, title="mine")}
+        tasks, conflicts = merge_snapshot([], mine, {"a": pending("update", record("a"), {"title"})})
+        self.assertEqual(tasks, [])
+        self.assertEqual([c.reason for c in conflicts], ["deleted"])
+
+    def test_creates_and_untouched_tasks_are_kept(self):
+        theirs = record("b")
+        mine = {"a": record("a")}
+        tasks, conflicts = merge_snapshot([theirs], mine, {"a": pending("create")})
+        self.assertEqual(tasks, [theirs, mine["a"]])
+        self.assertEqual(conflicts, [])
+
+
+class SharedFileTest(unittest.TestCase):
+    """Two stores on one tasks.json, as two app instances would be."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "tasks.json")
+        with open(self.path, "w") as f:
+            f.write("[]")
+        self.first = self.open()
+        self.first.add(Task(title="report", created_by="bob"))
+        (task,) = self.first.all()
+        self.task_id = task.id
+        self.first.save()
+        self.second = self.open()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self):
+        return TaskStore(self.path, backend=JsonTaskFile(self.path))
+
+    def records(self, store):
+        return sorted((t.id, t.title, t.description, t.progress) for t in store.all())
+
+    def converge(self):
+        for store in (self.first, self.second):
+            store.save()
+        for store in (self.first, self.second):
+            store.pull()
+        self.assertEqual(self.records(self.first), self.records(self.second))
+
+    def test_edits_to_different_fields_both_survive(self):
+        self.first.update(self.task_id, title="weekly report")
+        self.second.update(self.task_id, progress=50)
+        self.converge()
+        task = self.first.get(self.task_id)
+        self.assertEqual((task.title, task.progress), ("weekly report", 50))
+        self.assertEqual(self.first.take_conflicts() + self.second.take_conflicts(), [])
+
+    def test_same_field_keeps_the_first_save(self):
+        self.first.update(self.task_id, title="first")
+        self.second.update(self.task_id, title="second")
+        self.converge()
+        self.assertEqual(self.second.get(self.task_id).title, "first")
+        conflicts = self.second.take_conflicts()
+        self.assertEqual([c.fields for c in conflicts], [("title",)])
+
+    def test_delete_loses_to_a_concurrent_edit(self):
+        self.second.update(self.task_id, progress=30)
+        self.second.save()
+        self.first.delete(self.task_id)
+        self.converge()
+        self.assertEqual(self.first.get(self.task_id).progress, 30)
+        self.assertEqual([c.reason for c in self.first.take_conflicts()], ["edited-deleted"])
+
+    def test_edit_of_a_task_deleted_elsewhere_is_dropped(self):
+        self.first.delete(self.task_id)
+        self.first.save()
+        self.second.update(self.task_id, progress=30)
+        self.converge()
+        self.assertEqual(len(self.first), 0)
+        self.assertEqual([c.reason for c in self.second.take_conflicts()], ["deleted"])
+
+    def test_creates_from_both_sides_are_kept(self):
+        self.first.add(Task(title="a", created_by="bob"))
+        self.second.add(Task(title="b", created_by="bob"))
+        self.converge()
+        self.assertEqual(sorted(t.title for t in self.first.all()), ["a", "b", "report"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from storage import JournalTaskFile, JsonTaskFile
+from task_store import TaskStore
+from transfer import import_tasks
+
+GOOD = {"title": "ok", "deadline": "2026-03-01", "created_by": "bob"}
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "tasks.json")
+        with open(self.path, "w") as f:
+            f.write("[]")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def import_lines(self, records, backend=JsonTaskFile, batch_size=100):
+        source = os.path.join(self.dir, "in.jsonl")
+        with open(source, "w") as f:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+        store = TaskStore(self.path, backend=backend(self.path))
+        errors = []
+        result = import_tasks(store, source, batch_size=batch_size, errors=errors)
+        store.close()
+        return result, errors
+
+    def stored(self, backend=JsonTaskFile):
+        store = TaskStore(self.path, backend=backend(self.path))
+        tasks = sorted((t.id or "", t.title) for t in store.all())
+        store.close()
+        return tasks
+
+    def test_wrongly_typed_values_skip_the_line(self):
+        bad = [dict(GOOD, title=5), dict(GOOD, progress=[1]), dict(GOOD, priority=["High"]),
+               dict(GOOD, deadline=20260301), dict(GOOD, created_by={"name": "bob"}), dict(GOOD, end_time=1)]
+        (imported, skipped), errors = self.import_lines(bad + [GOOD])
+        self.assertEqual((imported, skipped), (1, len(bad)))
+        self.assertEqual(len(errors), len(bad))
+        self.assertTrue(errors[0].endswith(":1: invalid title 5, expected text"))
+        self.assertEqual([title for _, title in self.stored()], ["ok"])
+
+    def test_repeated_id_replaces_the_earlier_record(self):
+        for backend in (JsonTaskFile, JournalTaskFile):
+            with self.subTest(backend=backend.__name__):
+                with open(self.path, "w") as f:
+                    f.write("[]")
+                records = [dict(GOOD, id="a", title="first"), dict(GOOD, title="other"), dict(GOOD, id="a", title="second")]
+                (imported, skipped), _ = self.import_lines(records, backend)
+                self.assertEqual((imported, skipped), (3, 0))
+                tasks = self.stored(backend)
+                self.assertEqual(len(tasks), 2)
+                self.assertIn(("a", "second"), tasks)
+
+
+if __name__ == "__main__":
+    unittest.main()
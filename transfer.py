@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+from datetime import date, datetime
+
+from models import FIELDS, Priority, Task, default_reminder, parse_datetime
+
+EXPORT_COLUMNS = ("id",) + FIELDS
+IMPORT_BATCH_SIZE = 5000
+PRIORITY_VALUES = frozenset(p.value for p in Priority)
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path}; pass csv or jsonl explicitly.")
+
+
+# ---------------- Reading ----------------
+def read_records(path, fmt):
+    # yields (raw, decode) pairs one at a time; decoding happens in the
+    # caller so a bad line can be reported and skipped
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield row, None
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield line, json.loads
+
+
+def _strict_date(value):
+    # exactly YYYY-MM-DD, as the add form requires
+    if len(value) != 10 or value[4] != "-" or value[7] != "-":
+        raise ValueError
+    return date.fromisoformat(value)
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "✔")
+
+
+def _text(record, name):
+    # a JSONL line can hold any JSON type where a string belongs
+    value = record.get(name)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"invalid {name} {value!r}, expected text")
+    return value
+
+
+def record_to_task(record, default_user, now):
+    # validates one imported record with the same rules as add_task and fills
+    # in the same defaults; raises ValueError with a readable message
+    title = _text(record, "title").strip()
+    deadline = _text(record, "deadline").strip()
+    if not title or not deadline:
+        raise ValueError("title and deadline are required")
+    try:
+        dl_date = _strict_date(deadline)
+    except ValueError:
+        raise ValueError(f"invalid deadline {deadline!r}, use YYYY-MM-DD")
+    priority = _text(record, "priority") or Priority.MEDIUM.value
+    if priority not in PRIORITY_VALUES:
+        raise ValueError(f"invalid priority {priority!r}")
+    times = {}
+    for name in ("end_time", "reminder_time", "created_at"):
+        value = _text(record, name)
+        times[name] = parse_datetime(value)
+        if value and times[name] is None:
+            raise ValueError(f"invalid {name} {value!r}")
+    try:
+        progress = int(record.get("progress") or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid progress {record.get('progress')!r}")
+    completed = _flag(record.get("completed") or False)
+    if completed:
+        progress = 100
+    return Task(
+        title=title,
+        description=_text(record, "description"),
+        deadline=dl_date,
+        priority=Priority(priority),
+        completed=completed,
+        progress=max(0, min(progress, 100)),
+        end_time=times["end_time"],
+        reminder_time=times["reminder_time"] or default_reminder(dl_date, now),
+        notified=_flag(record.get("notified") or False),
+        created_by=_text(record, "created_by") or default_user,
+        created_at=times["created_at"] or now,
+        id=_text(record, "id") or None,
+    )
+
+
+def import_tasks(store, path, fmt=None, default_user="guest", batch_size=IMPORT_BATCH_SIZE, errors=None):
+    # streams records into the store in batches of batch_size. With a
+    # backend that can append (journal, sqlite) new tasks are written and
+    # let go batch by batch, so memory stays flat however long the file;
+    # otherwise they are added to the store and the JSON file is written
+    # once at the end. Returns (imported, skipped); skipped lines are
+    # appended to errors.
+    fmt = detect_format(path, fmt)
+    now = datetime.now().replace(microsecond=0)
+    incremental = getattr(store.backend, "incremental", False)
+    imported = skipped = 0
+    batch = []
+    for lineno, (raw, decode) in enumerate(read_records(path, fmt), start=2 if fmt == "csv" else 1):
+        try:
+            record = decode(raw) if decode else raw
+            if not isinstance(record, dict):
+                raise ValueError("expected an object")
+            task = record_to_task(record, default_user, now)
+        except ValueError as e:
+            skipped += 1
+            if errors is not None:
+                errors.append(f"{path}:{lineno}: {e}")
+            continue
+        if task.id and task.id in store:
+            # re-importing an export updates the existing tasks in place
+            store.update(task.id, **{name: getattr(task, name) for name in FIELDS})
+        else:
+            # a task appended earlier in this file is not in the store; its
+            # id repeated further down replaces it, as an update would
+            batch.append(task)
+        imported += 1
+        if imported % batch_size == 0:
+            _add_batch(store, batch)
+            batch = []
+            if incremental:
+                store.save()
+    _add_batch(store, batch)
+    store.save()
+    return imported, skipped
+
+
+def _add_batch(store, tasks):
+    if not tasks or store.append(tasks):
+        return
+    for task in tasks:
+        if task.id and task.id in store:
+            # repeated within the batch
+            store.update(task.id, **{name: getattr(task, name) for name in FIELDS})
+        else:
+            store.add(task)
+
+
+# ---------------- Writing ----------------
+def _export_values(task):
+    # to_dict, so a stored value that does not parse is exported as it is
+    data = task.to_dict()
+    return {name: data.get(name) for name in EXPORT_COLUMNS}
+
+
+def export_tasks(tasks, path, fmt=None):
+    # writes an iterable of tasks row by row; returns how many were written
+    fmt = detect_format(path, fmt)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for task in tasks:
+                writer.writerow(_export_values(task))
+                count += 1
+        else:
+            for task in tasks:
+                f.write(json.dumps(_export_values(task)) + "\n")
+                count += 1
+    return count
@@ -0,0 +1,191 @@
+import bisect
+from datetime import date, datetime, timedelta
+
+from models import Priority
+from task_store import visible_to
+
+PRIORITY_RANK = {Priority.HIGH: 0, Priority.MEDIUM: 1, Priority.LOW: 2}
+
+# sortable Treeview columns and the key each sorts by; unset dates sort last
+SORT_KEYS = {
+    "Deadline": lambda t: (t.deadline or date.max,),
+    "Priority": lambda t: (PRIORITY_RANK[t.priority],),
+    "Progress": lambda t: (t.progress,),
+    "Reminder": lambda t: (t.reminder_time or datetime.max,),
+}
+
+VIEW_NAMES = ("All tasks", "Due this week", "Overdue", "High priority open")
+# listed after VIEW_NAMES; its tasks come from the archive, not from an index
+ARCHIVED_VIEW = "Archived"
+
+# a user owning less than this share of all tasks gets their own list
+# filtered and sorted directly; above it, walking the global index is cheaper
+OWN_SORT_SHARE = 0.5
+
+
+class SortedIndex:
+    """Entries ``key + (seq, id)`` kept sorted with bisect.
+
+    ``seq`` is the task's position in the store, so equal keys keep store
+    order. A change removes the task's old entry and inserts the new one;
+    the list is never re-sorted. ``include`` limits the index to some tasks.
+    """
+
+    def __init__(self, key, include=None):
+        self.key = key
+        self.include = include
+        self.entries = []
+        self.entry = {}
+        self.built = False
+
+    def build(self, tasks, seqs):
+        self.built = True
+        self.entry = {t.id: self.key(t) + (seqs[t.id], t.id)
+                       for t in tasks if self.include is None or self.include(t)}
+        self.entries = sorted(self.entry.values())
+
+    def discard(self, task_id):
+        entry = self.entry.pop(task_id, None)
+        if entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def put(self, task, seq):
+        entry = None
+        if self.include is None or self.include(task):
+            entry = self.key(task) + (seq, task.id)
+        old = self.entry.get(task.id)
+        if old == entry:
+            return
+        self.discard(task.id)
+        if entry is not None:
+            self.entry[task.id] = entry
+            bisect.insort(self.entries, entry)
+
+    def ids(self, start=0, stop=None, reverse=False):
+        # ids between two positions of the index (as found by bisect)
+        entries = self.entries[start:stop]
+        if reverse:
+            entries = reversed(entries)
+        return [e[-1] for e in entries]
+
+    def position(self, key):
+        return bisect.bisect_left(self.entries, key)
+
+
+def _open(task):
+    return not task.completed
+
+
+def week_end(today):
+    # the Sunday ending today's week
+    return today + timedelta(days=6 - today.weekday())
+
+
+class TaskViews:
+    """Click-to-sort orders and saved views over a TaskStore.
+
+    One SortedIndex per sortable column, plus open tasks by deadline (for
+    "Overdue" and "Due this week") and by priority then deadline (for "High
+    priority open"), each updated in place from store change events. A view
+    is a range of its index. Each index is built the first time it is used.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.columns = {name: SortedIndex(key) for name, key in SORT_KEYS.items()}
+        self.open_by_deadline = SortedIndex(SORT_KEYS["Deadline"], _open)
+        self.open_by_priority = SortedIndex(lambda t: (PRIORITY_RANK[t.priority], t.deadline or date.max), _open)
+        self._indexes = list(self.columns.values()) + [self.open_by_deadline, self.open_by_priority]
+        self._seq = None
+        self._next_seq = 0
+        store.subscribe(self._on_change)
+
+    def close(self):
+        self.store.unsubscribe(self._on_change)
+
+    def _number(self):
+        tasks = self.store.all()
+        self._seq = {t.id: i for i, t in enumerate(tasks)}
+        self._next_seq = len(tasks)
+
+    def _ready(self, index):
+        if not index.built:
+            index.build(self.store.all(), self._seq)
+        return index
+
+    def _on_change(self, op, task):
+        if self._seq is None:
+            return
+        if op == "reload":
+            self._number()
+            for index in self._indexes:
+                index.built = False
+        elif op == "delete":
+            for index in self._indexes:
+                if index.built:
+                    index.discard(task.id)
+            self._seq.pop(task.id, None)
+        else:
+            seq = self._seq.get(task.id)
+            if seq is None:
+                seq = self._seq[task.id] = self._next_seq
+                self._next_seq += 1
+            for index in self._indexes:
+                if index.built:
+                    index.put(task, seq)
+
+    # ---------------- Queries ----------------
+    def _view_range(self, view, today):
+        # (index, low key, high key) bounding a view, or None for all tasks
+        if view == "Overdue":
+            # same rule as the overdue row colour: due today counts
+            return self._ready(self.open_by_deadline), (), (today + timedelta(days=1),)
+        if view == "Due this week":
+            return self._ready(self.open_by_deadline), (today,), (week_end(today) + timedelta(days=1),)
+        if view == "High priority open":
+            return self._ready(self.open_by_priority), (), (PRIORITY_RANK[Priority.MEDIUM],)
+        return None
+
+    def tasks(self, user, view=None, sort=None, reverse=False, only=None, today=None):
+        # the user's tasks in a view, ordered by a column (or the view's own
+        # order, or store order); only, if given, is a set of ids to keep,
+        # e.g. search matches
+        if self._seq is None:
+            self._number()
+        rng = self._view_range(view, today or date.today())
+        if rng is None and sort is None and only is None:
+            return self.store.for_user(user)
+        get = self.store.get
+        if only is not None:
+            tasks = self._in_view([get(i) for i in only], rng)
+        elif user != "guest" and len(self.store.for_user(user)) < OWN_SORT_SHARE * len(self.store):
+            tasks = self._in_view(self.store.for_user(user), rng)
+        elif rng is not None:
+            index, low, high = rng
+            tasks = [get(i) for i in index.ids(index.position(low), index.position(high))]
+        else:
+            ids = self._ready(self.columns[sort]).ids(reverse=reverse)
+            return self._visible([get(i) for i in ids], user)
+        # few enough tasks (a view, a search, one user's) to sort directly
+        tasks = self._visible(tasks, user)
+        if sort is not None:
+            tasks.sort(key=SORT_KEYS[sort], reverse=reverse)
+        return tasks
+
+    def _visible(self, tasks, user):
+        if user == "guest":
+            return [t for t in tasks if t is not None]
+        return [t for t in tasks if t is not None and visible_to(t, user)]
+
+    def _in_view(self, tasks, rng):
+        # the given tasks that are in the view, in the view's order (store
+        # order when there is no view)
+        if rng is None:
+            seq = self._seq
+            return sorted((t for t in tasks if t is not None), key=lambda t: seq.get(t.id, 0))
+        index, low, high = rng
+        entries = index.entry
+        found = [(entries[t.id], t) for t in tasks
+                 if t is not None and t.id in entries and low <= entries[t.id] < high]
+        found.sort(key=lambda pair: pair[0])
+        return [t for _, t in found]